@@ -1,222 +1,87 @@
 import pandas as pd
-import re
-from datetime import datetime
+from fars_dates import parse_dates, known_hours, unknown_hour_keys, convert_dates, CONVERTED_FORMATS, FORMAT_NAMES
+from hour_imputation import HourHistogram, WEEKEND_LEVELS, DEFAULT_HOUR
 
 # Load your CSV file
 file_path = '/content/FARS_combined_2013_2023.csv'  # Replace with your actual file path
-df = pd.read_csv(file_path)
-
-# Print original row count
-original_row_count = len(df)
-print(f"Original dataset has {original_row_count} rows")
-
-# Function to convert the incorrect date format to the correct one
-def convert_date_format(row):
-    date_str = row['crash_date']
-
-    # Check if the date is already in the correct format (either 24-hour or AM/PM format)
-    if re.match(r'^\d{4}-\d{2}-\d{2} \d{2}:00:00$', str(date_str)) or re.match(r'^\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:00:00 [AP]M$', str(date_str)):
-        return date_str
-
-    try:
-        # Format 1: YYYY-Month-DD h:00am/pm-h:59am/pm:SS
-        pattern1 = r'(\d{4})-(\w+)-(\d+) (\d+):00(am|pm)-\d+:59(am|pm):?\d*'
-        match = re.match(pattern1, str(date_str))
-
-        if match:
-            year = match.group(1)
-            month_name = match.group(2)
-            day = match.group(3).zfill(2)  # Ensure day is two digits
-            hour = int(match.group(4))
-            am_pm = match.group(5)
-
-            # Convert month name to number
-            month_dict = {
-                'January': '01', 'February': '02', 'March': '03', 'April': '04',
-                'May': '05', 'June': '06', 'July': '07', 'August': '08',
-                'September': '09', 'October': '10', 'November': '11', 'December': '12'
-            }
-            month = month_dict.get(month_name, '01')
-
-            # Convert hour to 24-hour format first
-            if am_pm.lower() == 'pm' and hour < 12:
-                hour += 12
-            elif am_pm.lower() == 'am' and hour == 12:
-                hour = 0
-
-            # Convert to AM/PM format
-            if hour == 0:
-                formatted_hour = 12
-                formatted_am_pm = "AM"
-            elif hour < 12:
-                formatted_hour = hour
-                formatted_am_pm = "AM"
-            elif hour == 12:
-                formatted_hour = 12
-                formatted_am_pm = "PM"
-            else:
-                formatted_hour = hour - 12
-                formatted_am_pm = "PM"
-
-            formatted_date = f"{int(month)}/{day}/{year}  {formatted_hour}:00:00 {formatted_am_pm}"
-            return formatted_date
-
-        # Format 2: YYYY-Month-DD Unknown Hours:Unknown Minutes
-        pattern2 = r'(\d{4})-(\w+)-(\d+) Unknown Hours:Unknown Minutes'
-        match = re.match(pattern2, str(date_str))
-
-        if match:
-            year = match.group(1)
-            month_name = match.group(2)
-            day = int(match.group(3))
-
-            # Convert month name to number
-            month_dict = {
-                'January': '01', 'February': '02', 'March': '03', 'April': '04',
-                'May': '05', 'June': '06', 'July': '07', 'August': '08',
-                'September': '09', 'October': '10', 'November': '11', 'December': '12'
-            }
-            month = month_dict.get(month_name, '01')
-
-            # Create a date object to determine if it's a weekday or weekend
-            date_obj = datetime(int(year), int(month), day)
-            weekday = date_obj.weekday()
-
-            # Assign hour based on weekday (0-4) or weekend (5-6)
-            hour = weekday_median_hour if weekday < 5 else weekend_median_hour
-
-            # Convert to AM/PM format
-            if hour == 0:
-                formatted_hour = 12
-                formatted_am_pm = "AM"
-            elif hour < 12:
-                formatted_hour = hour
-                formatted_am_pm = "AM"
-            elif hour == 12:
-                formatted_hour = 12
-                formatted_am_pm = "PM"
-            else:
-                formatted_hour = hour - 12
-                formatted_am_pm = "PM"
-
-            formatted_date = f"{int(month)}/{day:02d}/{year}  {formatted_hour}:00:00 {formatted_am_pm}"
-            return formatted_date
-        else:
-            # If neither pattern matches, return the original string
-            print(f"No pattern matched for: {date_str}")
-            return date_str
-    except Exception as e:
-        print(f"Error converting date: {date_str}, Error: {e}")
-        return date_str
-
-# First pass: Calculate median hours for weekdays and weekends
-# Initially process the data that already has correct format and the ones with am/pm format
-known_hours = []
-weekday_hours = []
-weekend_hours = []
-
-for idx, row in df.iterrows():
-    date_str = str(row['crash_date'])
-
-    # Already correct format (24-hour)
-    pattern_correct = r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):00:00'
-    match = re.match(pattern_correct, date_str)
-    if match:
-        year, month, day, hour = match.groups()
-        hour = int(hour)
-
-        # Convert to AM/PM format for consistency with our final output
-        if hour == 0:
-            formatted_hour = 12
-            am_pm = "AM"
-        elif hour < 12:
-            formatted_hour = hour
-            am_pm = "AM"
-        elif hour == 12:
-            formatted_hour = 12
-            am_pm = "PM"
-        else:
-            formatted_hour = hour - 12
-            am_pm = "PM"
-
-        formatted_date = f"{int(month)}/{int(day)}/{year}  {formatted_hour}:00:00 {am_pm}"
-
-        date_obj = datetime(int(year), int(month), int(day))
-        weekday = date_obj.weekday()
-        known_hours.append((weekday, hour))
-        if weekday < 5:  # Monday-Friday
-            weekday_hours.append(hour)
-        else:  # Saturday-Sunday
-            weekend_hours.append(hour)
-        continue
-
-    # am/pm format
-    pattern_ampm = r'(\d{4})-(\w+)-(\d+) (\d+):00(am|pm)-\d+:59(am|pm):?\d*'
-    match = re.match(pattern_ampm, date_str)
-    if match:
-        year = match.group(1)
-        month_name = match.group(2)
-        day = int(match.group(3))
-        hour = int(match.group(4))
-        am_pm = match.group(5)
-
-        # Convert month name to number
-        month_dict = {
-            'January': '01', 'February': '02', 'March': '03', 'April': '04',
-            'May': '05', 'June': '06', 'July': '07', 'August': '08',
-            'September': '09', 'October': '10', 'November': '11', 'December': '12'
-        }
-        month = month_dict.get(month_name, '01')
-
-        # Convert hour to 24-hour format
-        if am_pm.lower() == 'pm' and hour < 12:
-            hour += 12
-        elif am_pm.lower() == 'am' and hour == 12:
-            hour = 0
-
-        date_obj = datetime(int(year), int(month), day)
-        weekday = date_obj.weekday()
-        known_hours.append((weekday, hour))
-        if weekday < 5:  # Monday-Friday
-            weekday_hours.append(hour)
-        else:  # Saturday-Sunday
-            weekend_hours.append(hour)
-
-# Calculate median hours (defaulting to 12 if no data)
-weekday_median_hour = int(pd.Series(weekday_hours).median()) if weekday_hours else 12
-weekend_median_hour = int(pd.Series(weekend_hours).median()) if weekend_hours else 12
-
-print(f"Calculated median hour for weekdays: {weekday_median_hour}:00")
-print(f"Calculated median hour for weekends: {weekend_median_hour}:00")
-
-# Second pass: Apply conversion to all rows after index 148043
-if 'crash_date' in df.columns:
-    # Make a copy of the slice to work with
-    df_slice = df.loc[148043:].copy()
-
-    # Apply the conversion and show examples
-    print("Converting dates - showing first 5 examples of conversion:")
-    for i, (idx, row) in enumerate(df_slice.head(5).iterrows()):
-        original = row['crash_date']
-        df_slice.at[idx, 'crash_date'] = convert_date_format(row)
-        print(f"  {i+1}. Original: {original} → Converted: {df_slice.at[idx, 'crash_date']}")
-
-    # Apply the conversion to all rows in the slice
-    df_slice['crash_date'] = df_slice.apply(convert_date_format, axis=1)
-
-    # Update the original dataframe with the converted values
-    df.loc[148043:, 'crash_date'] = df_slice['crash_date']
+output_path = 'corrected_dataset.csv'
+
+# STREAMING = True reads the file twice in CHUNK_ROWS chunks (median hours, then
+# conversion) instead of loading it, so a file of any size can be cleaned
+STREAMING = False
+CHUNK_ROWS = 500_000
+# Unknown hours are imputed with the weekday / weekend median hour; import
+# hour_imputation.STATE_MONTH_LEVELS and use it here for a state x month x
+# day-of-week median instead
+IMPUTATION_LEVELS = WEEKEND_LEVELS
+
+if STREAMING:
+    read_chunks = lambda: pd.read_csv(file_path, chunksize=CHUNK_ROWS)
+else:
+    df = pd.read_csv(file_path)
+    read_chunks = lambda: [df]
+
+# Columns of the file the imputation keys need besides the date parts (e.g. state)
+date_parts = {'year', 'month', 'day', 'weekday', 'weekend'}
+key_columns = sorted({column for level in IMPUTATION_LEVELS for column in level} - date_parts)
+
+# The date parsing and conversion is vectorized in fars_dates.py
+# (test_fars_dates.py checks it against the original row-by-row version)
+
+# First pass: count the known hours (24-hour format and the am/pm ranges) into
+# a 24-bucket histogram per imputation key, and each crash_date layout
+original_row_count = 0
+format_counts = pd.Series(0, index=list(FORMAT_NAMES))
+histogram = HourHistogram(IMPUTATION_LEVELS)
+if 'crash_date' in pd.read_csv(file_path, nrows=0).columns:
+    for chunk in read_chunks():
+        original_row_count += len(chunk)
+        dates = parse_dates(chunk['crash_date'])
+        format_counts = format_counts.add(pd.Series(dates.formats).value_counts(), fill_value=0)
+        histogram.update(known_hours(dates).join(chunk[key_columns]))
+
+    # Print original row count
+    print(f"Original dataset has {original_row_count} rows")
+    print("crash_date formats:")
+    for code, count in format_counts.items():
+        print(f"  {FORMAT_NAMES[code]}: {int(count)} rows")
+
+    # The last imputation level is the weekday / weekend one
+    medians = histogram.medians()
+    weekday_median_hour = int(medians.get(False, DEFAULT_HOUR))
+    weekend_median_hour = int(medians.get(True, DEFAULT_HOUR))
+    print(f"Calculated median hour for weekdays: {weekday_median_hour}:00")
+    print(f"Calculated median hour for weekends: {weekend_median_hour}:00")
+
+    # Second pass: Convert every row whose format needs it, wherever it is in the file
+    new_row_count = 0
+    for i, chunk in enumerate(read_chunks()):
+        dates = parse_dates(chunk['crash_date'])
+        needs_conversion = pd.Series(dates.formats, index=chunk.index).isin(CONVERTED_FORMATS)
+        keys = unknown_hour_keys(dates).join(chunk[key_columns])
+        hours = pd.Series(histogram.impute(keys), index=keys.index)
+
+        # Rows of the other layouts come back unchanged
+        converted = convert_dates(dates, weekday_median_hour, weekend_median_hour, hours=hours)
+
+        # Show examples
+        if i == 0:
+            print("Converting dates - showing first 5 examples of conversion:")
+            examples = zip(chunk.loc[needs_conversion, 'crash_date'].head(5), converted[needs_conversion].head(5))
+            for j, (before, after) in enumerate(examples):
+                print(f"  {j+1}. Original: {before} → Converted: {after}")
+
+        # Update the chunk with the converted values and save it
+        chunk['crash_date'] = converted
+        chunk.to_csv(output_path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+        new_row_count += len(chunk)
 
     # Print the new row count to verify no rows were lost
-    new_row_count = len(df)
     print(f"New dataset has {new_row_count} rows")
 
     if original_row_count != new_row_count:
         print(f"WARNING: Row count changed! Original: {original_row_count}, New: {new_row_count}")
+
+    print("Date format correction complete!")
 else:
     print("Error: 'crash_date' column not found in the dataset")
-
-# Save the corrected dataframe back to CSV
-df.to_csv('corrected_dataset.csv', index=False)
-
-print("Date format correction complete!")
@@ -4,18 +4,24 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
 
+DATA_PATH = '/content/FARS_combined__cleaned_2013_2023.csv'  # Adjust path as needed
+
+# STREAMING = True for when the combined CSV does not fit in memory: it is read in
+# CHUNK_ROWS chunks and a logistic regression is fitted incrementally (SGD with
+# partial_fit) instead of the random forest on the full table.
+STREAMING = False
+CHUNK_ROWS = 200_000
+EPOCHS = 3
+MODEL_NAME = 'SGD Logistic Regression' if STREAMING else 'Random Forest'
+
 # -------------------------------
 # 1. Load and preprocess data
 # -------------------------------
-df = pd.read_csv('/content/FARS_combined__cleaned_2013_2023.csv')  # Adjust path as needed
-
-# Convert crash_date to datetime if not already
-df['crash_date'] = pd.to_datetime(df['crash_date'], errors='coerce')
-
-# Map severity_level if it's still string-based
 severity_mapping = {
     "Property Damage Only": 0,
     "Fatal": 1,
@@ -25,8 +31,6 @@ severity_mapping = {
     "Unknown if Injured": 9,
     "Injury – Unknown Severity": 8
 }
-if df['severity_level'].dtype == 'object':
-    df['severity_level'] = df['severity_level'].map(severity_mapping).fillna(9)
 
 # -------------------------------
 # 2. Select features and target
@@ -39,35 +43,83 @@ features = [
 
 target = 'opioid_flag'
 
-# Drop missing values from relevant columns
-df_model = df[features + [target]].dropna()
+def model_rows(df):
+    # Map severity_level if it's still string-based
+    if not pd.api.types.is_numeric_dtype(df['severity_level']):
+        df['severity_level'] = df['severity_level'].map(severity_mapping).fillna(9)
+    # Drop missing values from relevant columns
+    return df[features + [target]].dropna()
 
-X = df_model[features]
-y = df_model[target]
+def chunk_splits():
+    # Same chunks and the same seeded train/test draw on every pass over the file
+    rng = np.random.default_rng(42)
+    for chunk in pd.read_csv(DATA_PATH, usecols=features + [target], chunksize=CHUNK_ROWS):
+        chunk = model_rows(chunk)
+        X, y = chunk[features].to_numpy(dtype=float), chunk[target].to_numpy(dtype=int)
+        test = rng.random(len(y)) < 0.3
+        yield X[~test], y[~test], X[test], y[test]
 
-# -------------------------------
-# 3. Train-test split
-# -------------------------------
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.3, stratify=y, random_state=42
-)
+if not STREAMING:
+    df = pd.read_csv(DATA_PATH)
 
-# -------------------------------
-# 4. Train Random Forest (balanced)
-# -------------------------------
-rf_model = RandomForestClassifier(
-    n_estimators=200,
-    max_depth=10,
-    class_weight='balanced',
-    random_state=42
-)
-rf_model.fit(X_train, y_train)
+    # Convert crash_date to datetime if not already
+    df['crash_date'] = pd.to_datetime(df['crash_date'], errors='coerce')
 
-# -------------------------------
-# 5. Predict and Evaluate
-# -------------------------------
-y_pred = rf_model.predict(X_test)
-y_proba = rf_model.predict_proba(X_test)[:, 1]
+    df_model = model_rows(df)
+
+    X = df_model[features]
+    y = df_model[target]
+
+    # -------------------------------
+    # 3. Train-test split
+    # -------------------------------
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.3, stratify=y, random_state=42
+    )
+
+    # -------------------------------
+    # 4. Train Random Forest (balanced)
+    # -------------------------------
+    rf_model = RandomForestClassifier(
+        n_estimators=200,
+        max_depth=10,
+        class_weight='balanced',
+        random_state=42
+    )
+    rf_model.fit(X_train, y_train)
+
+    # -------------------------------
+    # 5. Predict and Evaluate
+    # -------------------------------
+    y_pred = rf_model.predict(X_test)
+    y_proba = rf_model.predict_proba(X_test)[:, 1]
+else:
+    # -------------------------------
+    # 3-4. Streamed fit (balanced): one pass for the scaler and class counts, then EPOCHS of partial_fit
+    # -------------------------------
+    scaler = StandardScaler()
+    class_counts = np.zeros(2)
+    for X_train, y_train, _, _ in chunk_splits():
+        scaler.partial_fit(X_train)
+        class_counts += np.bincount(y_train, minlength=2)
+    # partial_fit cannot use class_weight='balanced', so pass the same n / (2 * n_class) weights
+    class_weight = {0: class_counts.sum() / (2 * class_counts[0]), 1: class_counts.sum() / (2 * class_counts[1])}
+
+    sgd_model = SGDClassifier(loss='log_loss', class_weight=class_weight, average=True, random_state=42)
+    for epoch in range(EPOCHS):
+        for X_train, y_train, _, _ in chunk_splits():
+            sgd_model.partial_fit(scaler.transform(X_train), y_train, classes=np.array([0, 1]))
+
+    # -------------------------------
+    # 5. Predict and Evaluate (only the test labels and scores are kept)
+    # -------------------------------
+    y_test, y_pred, y_proba = [], [], []
+    for _, _, X_test, y in chunk_splits():
+        X_test = scaler.transform(X_test)
+        y_test.append(y)
+        y_pred.append(sgd_model.predict(X_test))
+        y_proba.append(sgd_model.predict_proba(X_test)[:, 1])
+    y_test, y_pred, y_proba = np.concatenate(y_test), np.concatenate(y_pred), np.concatenate(y_proba)
 
 print("Classification Report:")
 print(classification_report(y_test, y_pred, digits=4))
@@ -80,7 +132,7 @@ plt.figure(figsize=(6, 5))
 sns.heatmap(cm, annot=True, fmt="d", cmap="Blues", cbar=True, linewidths=0.5)
 plt.xlabel('Predicted')
 plt.ylabel('Actual')
-plt.title('Confusion Matrix (Random Forest - Opioid Prediction)')
+plt.title(f'Confusion Matrix ({MODEL_NAME} - Opioid Prediction)')
 plt.xticks(ticks=[0.5, 1.5], labels=["No Opioid", "Opioid"], rotation=0)
 plt.yticks(ticks=[0.5, 1.5], labels=["No Opioid", "Opioid"], rotation=0)
 plt.tight_layout()
@@ -97,7 +149,7 @@ plt.plot(fpr, tpr, label=f'ROC Curve (AUC = {auc_score:.4f})', color='darkorange
 plt.plot([0, 1], [0, 1], linestyle='--', color='gray')
 plt.xlabel('False Positive Rate')
 plt.ylabel('True Positive Rate')
-plt.title('ROC Curve - Random Forest (Opioid Involvement)')
+plt.title(f'ROC Curve - {MODEL_NAME} (Opioid Involvement)')
 plt.legend()
 plt.grid(True)
 plt.tight_layout()
@@ -0,0 +1,64 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Opioid / any-drug classification of the FARS DRUGRES*NAME fields.
+# The original check was any(keyword in x ...) over the ' | '-joined, lowercased
+# drug names of every person row. Here each keyword set is compiled once into a
+# single alternation regex, and only the distinct drug names are searched (FARS
+# has a few hundred): the three columns are factorized together, the distinct
+# names classified, and the flags mapped back to the rows through the codes.
+#
+# No keyword contains ' | ', so "the joined names contain a keyword" is the same
+# as "one of the names contains it", and the flags match the original exactly
+# (test_drug_classifier.py checks against it).
+
+DRUG_COLUMNS = ['DRUGRES1NAME', 'DRUGRES2NAME', 'DRUGRES3NAME']
+
+# Expanded list of opioid identifiers
+OPIOID_KEYWORDS = [
+    'opioid', 'heroin', 'fentanyl', 'morphine', 'oxycodone', 'hydrocodone',
+    'methadone', 'codeine', 'tramadol', 'buprenorphine', 'oxymorphone',
+    'hydromorphone', 'tapentadol', 'meperidine', 'alfentanil', 'sufentanil',
+    'naloxone', 'carfentanil', 'dihydrocodeine', 'etorphine', 'levorphanol'
+]
+
+# Drug presence values that mean "none"
+NO_DRUG_VALUES = [
+    'test not given', 'reported as unknown if tested for drugs',
+    'other drug (specify:)', 'not reported', 'tested for drugs',
+    'drugs detected, type unknown/positive', 'no (drugs not involved)'
+]
+
+def keyword_pattern(keywords):
+    """One compiled regex matching any of the keywords as a literal substring."""
+    return re.compile('|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)))
+
+OPIOID_PATTERN = keyword_pattern(OPIOID_KEYWORDS)
+NO_DRUG_PATTERN = keyword_pattern(NO_DRUG_VALUES)
+
+def distinct_names(drugs):
+    """(codes, names): (rows x columns) codes into the lowercased distinct drug names.
+
+    Missing values are the name 'nan', as astype(str) wrote them before pandas 3.
+    """
+    values = drugs.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(values.ravel(order='F'))
+    names = pd.Series(uniques, dtype=object).astype(str).str.lower()
+    names = pd.concat([names, pd.Series(['nan'])], ignore_index=True)
+    # Missing values (code -1) point at the trailing 'nan'
+    return np.where(codes < 0, len(uniques), codes).reshape(values.shape, order='F'), names
+
+def matches_any(codes, names, pattern):
+    """True for every row where one of its drug names matches the pattern."""
+    found = names.str.contains(pattern).to_numpy(dtype=bool)
+    return found[codes].any(axis=1)
+
+def classify_drugs(drugs, opioid_pattern=OPIOID_PATTERN, no_drug_pattern=NO_DRUG_PATTERN):
+    """opioid_flag and any_drug_flag (0/1) of every row of the DRUGRES*NAME columns."""
+    codes, names = distinct_names(drugs)
+    return pd.DataFrame({
+        'opioid_flag': matches_any(codes, names, opioid_pattern).astype(np.int64),
+        'any_drug_flag': (~matches_any(codes, names, no_drug_pattern)).astype(np.int64),
+    }, index=drugs.index)
@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from hour_imputation import HourHistogram, HOURS, DEFAULT_HOUR, WEEKEND_LEVELS
+
+# Vectorized crash_date normalization for Cleaning_FARS.py.
+# Produces exactly what the original script does row by row (its iterrows median
+# pass and convert_date_format; test_fars_dates.py checks against both), but for
+# the whole column at once:
+#   - the column is factorized once (person rows repeat their crash's date) and
+#     one RE2 pass (pyarrow.compute.extract_regex) over the distinct values gives
+#     each its layout code and date fields; everything below works per distinct
+#     value and is mapped back to rows through the codes
+#   - month names go through a categorical lookup instead of a dict per row
+#   - weekdays come from datetime64 day numbers instead of a datetime per row
+#   - the 24h -> AM/PM remapping is np.where over the hour array
+#   - the median hours come from hour histograms (hour_imputation.py), so they can
+#     also be accumulated chunk by chunk
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+# -------------------------------
+# 1. Vectorized building blocks
+# -------------------------------
+def month_numbers(names):
+    """Month number of each month name; unknown names become 1, like month_dict.get(name, '01')."""
+    codes = pd.Index(MONTHS).get_indexer(np.asarray(names, dtype=object))
+    return np.where(codes < 0, 1, codes + 1)
+
+def to_24h(hour, am_pm):
+    """h am/pm -> 0-23 (12am -> 0, 1pm-11pm -> +12); other hours pass through unchanged."""
+    pm = am_pm == 'pm'
+    return np.where(pm & (hour < 12), hour + 12, np.where(~pm & (hour == 12), 0, hour))
+
+def ampm_parts(hour24):
+    """(12-hour clock hour, 'AM'/'PM') for each 24-hour value."""
+    hour12 = np.where(hour24 == 0, 12, np.where(hour24 > 12, hour24 - 12, hour24))
+    return hour12, np.where(hour24 < 12, 'AM', 'PM')
+
+def weekday_of(year, month, day):
+    """(weekday with Monday=0, valid) for integer arrays; invalid dates are those datetime() rejects."""
+    year, month, day = (np.asarray(a, dtype=np.float64) for a in (year, month, day))
+    ok = (year >= 1) & (year <= 9999) & (month >= 1) & (month <= 12) & (day >= 1)
+    months = np.where(ok, (year - 1970) * 12 + (month - 1), 0).astype(np.int64)
+    start = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    end = (months + 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    valid = ok & (day <= end - start)
+    days = start + np.where(valid, day, 1).astype(np.int64) - 1
+    # 1970-01-01 was a Thursday
+    return (days + 3) % 7, valid
+
+def _join(*parts):
+    """Concatenate string arrays (and str constants) element-wise."""
+    joined = None
+    for part in parts:
+        if not isinstance(part, str):
+            part = pd.Series(np.asarray(part), dtype=object).astype(str).to_numpy(dtype=object)
+        joined = part if joined is None else joined + part
+    return joined
+
+# -------------------------------
+# 2. Format detection and parsing
+# -------------------------------
+# crash_date layout of each row, as a small integer code
+FORMAT_OTHER = 0          # none of the layouts below (left unchanged)
+FORMAT_24H = 1            # YYYY-MM-DD HH:00:00
+FORMAT_AMPM = 2           # M/D/YYYY  h:00:00 AM, already converted
+FORMAT_HOUR_RANGE = 3     # YYYY-Month-DD h:00am-h:59am:SS
+FORMAT_UNKNOWN_HOURS = 4  # YYYY-Month-DD Unknown Hours:Unknown Minutes
+FORMAT_NAMES = {FORMAT_OTHER: 'other', FORMAT_24H: '24-hour', FORMAT_AMPM: 'AM/PM',
+                FORMAT_HOUR_RANGE: 'hour range', FORMAT_UNKNOWN_HOURS: 'unknown hours'}
+# The only layouts convert_date_format rewrites
+CONVERTED_FORMATS = [FORMAT_HOUR_RANGE, FORMAT_UNKNOWN_HOURS]
+
+# One alternation with a group set per layout, in the order convert_date_format tries them
+# (RE2 syntax; a group the matching branch does not use comes back as "").
+# A 24-hour prefix is enough: with trailing text the row is still left unchanged
+# and its hour still counts towards the medians.
+LAYOUTS = (r'^(?:(?P<y24>\d{4})-(?P<m24>\d{2})-(?P<d24>\d{2}) (?P<h24>\d{2}):00:00'
+           r'|(?P<ampm>\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:00:00 [AP]M$)'
+           r'|(?P<yr>\d{4})-(?P<mr>\w+)-(?P<dr>\d+) (?P<hr>\d+):00(?P<ar>am|pm)-\d+:59(?:am|pm)'
+           r'|(?P<yu>\d{4})-(?P<mu>\w+)-(?P<du>\d+) Unknown Hours:Unknown Minutes)')
+
+class ParsedDates:
+    """A crash_date column factorized once, with the layout and date fields of each distinct value.
+
+    Per distinct value: layout (FORMAT_* code), year / month / day as numbers, the
+    year and day text as written, hour (0-23, -1 if unknown), weekday, and valid
+    (the day exists). formats holds the layout of every row.
+    """
+
+    def __init__(self, dates):
+        self.dates = pd.Series(dates)
+        self.codes, values = pd.factorize(self.dates)
+        self.values = np.asarray(values, dtype=object)
+        text = pd.Series(self.values, dtype=object).astype(str).to_numpy(dtype=object)
+        fields = pc.extract_regex(pa.array(text, type=pa.string()), LAYOUTS)
+        # Each layout's groups are "" on the other layouts' values, so they can be joined across layouts
+        group = lambda *names: pc.binary_join_element_wise(*(fields.field(name) for name in names), '')
+        number = lambda values: pc.cast(pc.if_else(pc.equal(values, ''), pa.scalar(None, pa.string()), values), pa.float64()).to_numpy(zero_copy_only=False)
+        strings = lambda values: values.to_numpy(zero_copy_only=False)
+
+        self.layout = np.select([strings(group(name)) != '' for name in ('y24', 'ampm', 'yr', 'yu')],
+                                [FORMAT_24H, FORMAT_AMPM, FORMAT_HOUR_RANGE, FORMAT_UNKNOWN_HOURS], FORMAT_OTHER).astype(np.int8)
+        is_24h, is_range = self.layout == FORMAT_24H, self.layout == FORMAT_HOUR_RANGE
+        self.year_text, self.day_text = strings(group('y24', 'yr', 'yu')), strings(group('d24', 'dr', 'du'))
+        self.year, self.day = number(group('y24', 'yr', 'yu')), number(group('d24', 'dr', 'du'))
+        self.month = np.where(is_24h, number(group('m24')), month_numbers(strings(group('mr', 'mu'))))
+        self.hour = np.select([is_24h, is_range], [number(group('h24')), to_24h(number(group('hr')), strings(group('ar')))], -1).astype(np.int64)
+        self.weekday, self.valid = weekday_of(self.year, self.month, self.day)
+        # Missing dates (code -1) are FORMAT_OTHER
+        self.formats = self.rows(self.layout, FORMAT_OTHER)
+
+    def rows(self, values, missing):
+        """Per-distinct values spread to every row, missing where the row's date is missing."""
+        return np.append(values, np.asarray(missing, dtype=np.asarray(values).dtype))[self.codes]
+
+    def day_parts(self, layouts):
+        """year, month, day, weekday, weekend and hour of the rows of the given layouts with a real day.
+
+        Indexed by the rows' labels in dates, so other columns (e.g. state) can be joined on.
+        """
+        parts = pd.DataFrame({'year': self.year, 'month': self.month, 'day': self.day, 'weekday': self.weekday,
+                              'weekend': self.weekday >= 5, 'hour': self.hour})
+        keep = self.rows(np.isin(self.layout, layouts) & self.valid, False)
+        return parts.iloc[self.codes[keep]].set_index(self.dates.index[keep])
+
+def parse_dates(dates):
+    """ParsedDates of a crash_date column; a ParsedDates is returned as is, so callers can parse once."""
+    return dates if isinstance(dates, ParsedDates) else ParsedDates(dates)
+
+# -------------------------------
+# 3. Median hours (first pass)
+# -------------------------------
+def known_hours(dates):
+    """Date parts and hour of every row whose hour is known: 24-hour rows and h:00am-h:59pm ranges."""
+    return parse_dates(dates).day_parts([FORMAT_24H, FORMAT_HOUR_RANGE])
+
+def unknown_hour_keys(dates):
+    """Date parts of every Unknown Hours row with a real day, i.e. the rows whose hour gets imputed."""
+    return parse_dates(dates).day_parts([FORMAT_UNKNOWN_HOURS])
+
+def median_hours(dates):
+    """(weekday_median_hour, weekend_median_hour), defaulting to 12 when there are no known hours."""
+    medians = HourHistogram(WEEKEND_LEVELS).update(known_hours(dates)).medians()
+    return int(medians.get(False, DEFAULT_HOUR)), int(medians.get(True, DEFAULT_HOUR))
+
+# -------------------------------
+# 4. Date conversion (second pass)
+# -------------------------------
+def _ampm_dates(parsed, which, day_text, hour24):
+    hour12, suffix = ampm_parts(hour24)
+    return _join(parsed.month[which].astype(np.int64), '/', pd.Series(day_text, dtype=object).str.zfill(2).to_numpy(dtype=object),
+                 '/', parsed.year_text[which], '  ', hour12, ':00:00 ', suffix)
+
+def _hour_range_dates(parsed, which):
+    # convert_date_format keeps the day as written (zero-padded) and never checks that it exists
+    return _ampm_dates(parsed, which, parsed.day_text[which], parsed.hour[which])
+
+def _unknown_hour_dates(parsed, which, hour24):
+    return _ampm_dates(parsed, which, parsed.day[which].astype(np.int64).astype(str), hour24)
+
+def convert_dates(dates, weekday_median_hour, weekend_median_hour, verbose=True, hours=None):
+    """Vectorized convert_date_format over a crash_date column (or its ParsedDates); returns a new object Series.
+
+    Only the distinct values whose layout is in CONVERTED_FORMATS are rewritten,
+    wherever their rows sit in the file. Unknown Hours rows whose day does not
+    exist are left unchanged. hours (per row, aligned on dates' index) overrides
+    the weekday / weekend medians for the Unknown Hours rows, e.g. from
+    HourHistogram.impute.
+    """
+    parsed = parse_dates(dates)
+    converted = parsed.values.copy()
+    ranges = parsed.layout == FORMAT_HOUR_RANGE
+    converted[ranges] = _hour_range_dates(parsed, ranges)
+    unknown = (parsed.layout == FORMAT_UNKNOWN_HOURS) & parsed.valid
+    medians = np.where(parsed.weekday < 5, weekday_median_hour, weekend_median_hour)
+    converted[unknown] = _unknown_hour_dates(parsed, unknown, medians[unknown])
+
+    result = parsed.dates.to_numpy(dtype=object, copy=True)
+    dated = parsed.codes >= 0
+    result[dated] = converted[parsed.codes[dated]]
+    if hours is not None:
+        # Distinct (date, hour) pairs: the same date can get different hours in different states
+        row_hours = pd.Series(hours).reindex(parsed.dates.index).fillna(-1).to_numpy(np.int64)
+        rows = np.flatnonzero(parsed.rows(unknown, False) & (row_hours >= 0))
+        pairs, distinct_pairs = pd.factorize(parsed.codes[rows] * HOURS + row_hours[rows])
+        result[rows] = _unknown_hour_dates(parsed, distinct_pairs // HOURS, distinct_pairs % HOURS)[pairs]
+
+    if verbose:
+        unmatched = parsed.formats == FORMAT_OTHER
+        if unmatched.any():
+            print(f"No pattern matched for {int(unmatched.sum())} dates, e.g. {list(parsed.dates[unmatched].unique()[:3])}")
+        invalid = int(parsed.rows((parsed.layout == FORMAT_UNKNOWN_HOURS) & ~parsed.valid, False).sum())
+        if invalid:
+            print(f"Error converting {invalid} dates with a day that does not exist")
+    return pd.Series(result, index=parsed.dates.index, name=parsed.dates.name, dtype=object)
@@ -0,0 +1,124 @@
+import re
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from drug_classifier import DRUG_COLUMNS, classify_drugs
+
+# Vectorized harmonization of the merged FARS person files for Merging_FARS.py.
+# Derives the same columns the original script did with row-wise apply and
+# per-element lambdas (test_fars_harmonize.py checks against it), as column operations:
+#   - driver_age / driver_sex / the young and mature driver flags are boolean masks and np.select
+#   - injuries is one comparison
+#   - the opioid / any-drug flags classify the distinct drug names once (drug_classifier.py)
+# and harmonizes any number of years in one call: each file's year comes from its
+# YEAR column, or from the year in its file name.
+#
+#   python fars_harmonize.py merged_fars_data_2013.csv ... -o FARS_combined_2013_2023.csv
+
+DRIVER = 'Driver of a Motor Vehicle In-Transport'
+# Injury level mapping
+SEVERITY_MAP = {
+    0: 'Property Damage Only',
+    1: 'Fatal',
+    2: 'Suspected Serious Injury',
+    3: 'Suspected Minor Injury',
+    4: 'Possible Injury',
+    8: 'Injury – Unknown Severity',
+    9: 'Unknown if Injured'
+}
+
+ALCOHOL_MAP = {
+    'Yes (Alcohol Involved)': 1,
+    'No (Alcohol Not Involved)': 0,
+    'Unknown (Police Reported)': None
+}
+
+RENAMES = {
+    'STATE': 'state',
+    'COUNTY': 'county_fips',
+    'FATALS': 'fatalities'
+}
+
+FINAL_COLUMNS = [
+    'ST_CASE', 'VEH_NO', 'PER_NO', 'VE_FORMS',
+    'state', 'crash_date', 'county_fips', 'fatalities', 'injuries',
+    'severity_level', 'opioid_flag', 'any_drug_flag', 'alcohol_flag',
+    'young_driver_flag', 'mature_driver_flag', 'driver_age', 'driver_sex',
+    'RACE', 'RACENAME'
+]
+
+# -------------------------------
+# 1. Derived columns
+# -------------------------------
+def _text(values):
+    """values as strings, missing ones as 'nan' (what astype(str) gave before pandas 3)."""
+    return values.astype(object).fillna('nan').astype(str)
+
+def harmonize(df, year):
+    """The harmonized columns (FINAL_COLUMNS) of one merged FARS frame.
+
+    year is a scalar or a per-row array / Series; it becomes the YEAR column.
+    """
+    df = df.copy()
+    df['YEAR'] = year
+    df['crash_date'] = (
+        _text(df['YEAR']) + '-' +
+        _text(df['MONTHNAME']) + '-' +
+        _text(df['DAYNAME']) + ' ' +
+        _text(df['HOURNAME']) + ':' +
+        _text(df['MINUTENAME'])
+    )
+
+    df['severity_level'] = df['INJ_SEV'].map(SEVERITY_MAP)
+    df[['opioid_flag', 'any_drug_flag']] = classify_drugs(df[DRUG_COLUMNS])
+    df['alcohol_flag'] = df['DRINKINGNAME'].map(ALCOHOL_MAP)
+
+    # Comparisons with a missing age are False, so unknown ages get 0 like before
+    age = df['AGE']
+    df['young_driver_flag'] = (age < 21).astype(np.int64)
+    df['mature_driver_flag'] = (age >= 65).astype(np.int64)
+
+    is_driver = (df['PER_TYPNAME'] == DRIVER).to_numpy(dtype=bool, na_value=False)
+    sex = df['SEXNAME']
+    df['driver_age'] = age.where(is_driver)
+    df['driver_sex'] = np.select([is_driver & (sex == 'Male').to_numpy(dtype=bool, na_value=False),
+                                  is_driver & (sex == 'Female').to_numpy(dtype=bool, na_value=False)],
+                                 [0, 1], default=np.nan)
+
+    # Missing severity counts as injured, as before
+    df['injuries'] = (df['severity_level'] != 'Property Damage Only').astype(np.int64)
+
+    return df.rename(columns=RENAMES)[FINAL_COLUMNS]
+
+# -------------------------------
+# 2. Multiple years
+# -------------------------------
+def file_year(path):
+    """The year in a file name such as merged_fars_data_2017.csv."""
+    match = re.search(r'(?<!\d)(19|20)\d{2}(?!\d)', str(path))
+    if match is None:
+        raise ValueError(f"No year in file name {path}; add a YEAR column to it")
+    return int(match.group())
+
+def harmonize_files(paths):
+    """Every merged FARS file harmonized and stacked, each with its own year."""
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path, low_memory=False)
+        year = df['YEAR'] if 'YEAR' in df.columns else file_year(path)
+        frames.append(harmonize(df, year))
+    return pd.concat(frames, ignore_index=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harmonize merged FARS person files.")
+    parser.add_argument('paths', nargs='*', help="merged FARS CSVs, one per year")
+    parser.add_argument('-o', '--output', default='FARS_combined.csv')
+    args = parser.parse_args()
+
+    if args.paths:
+        harmonize_files(args.paths).to_csv(args.output, index=False)
+        print(f"Saved harmonized FARS data from {len(args.paths)} files to: {args.output}")
+    else:
+        parser.print_help()
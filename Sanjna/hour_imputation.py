@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# Median-hour imputation for the crash_date rows whose hour is unknown.
+# Known hours are counted into a 24-bucket histogram per imputation key, so the
+# medians come out of one pass over any number of chunks, in memory bounded by
+# the number of keys rather than the number of rows. They equal what
+# int(pd.Series(hours).median()) gives: the two middle hours are read off the
+# cumulative counts, averaged and truncated.
+#
+# Keys can be finer than weekday / weekend (e.g. state x month x day of week) at
+# the same cost; a key with too few known hours falls back to the next level.
+
+HOURS = 24
+DEFAULT_HOUR = 12
+
+# Imputation levels, finest first; the last one is used whatever its counts
+WEEKEND_LEVELS = [['weekend']]
+STATE_MONTH_LEVELS = [['state', 'month', 'weekday'], ['weekend']]
+# Known hours a key needs before its own median is used (all levels but the last)
+MIN_KNOWN_HOURS = 20
+
+def histogram_medians(counts):
+    """Median hour of every row of a (keys x 24) count matrix, -1 where a row is empty."""
+    cum = np.asarray(counts, dtype=np.int64).cumsum(axis=1)
+    n = cum[:, -1]
+    # The k-th smallest hour (0-based) is the number of buckets whose cumulative count is <= k
+    low = (cum <= ((n - 1) // 2)[:, None]).sum(axis=1)
+    high = (cum <= (n // 2)[:, None]).sum(axis=1)
+    return np.where(n > 0, (low + high) // 2, -1)
+
+class HourHistogram:
+    """Known-hour counts per key of every imputation level, updated chunk by chunk."""
+
+    def __init__(self, levels=WEEKEND_LEVELS, min_known_hours=MIN_KNOWN_HOURS):
+        self.levels = [list(level) for level in levels]
+        self.min_known_hours = min_known_hours
+        self.counts = [None] * len(self.levels)
+
+    def update(self, hours):
+        """hours: one row per known hour, with an 'hour' column (0-23) and every level's key columns."""
+        if not len(hours):
+            return self
+        for i, level in enumerate(self.levels):
+            counts = (hours.groupby(level + ['hour'], observed=True).size()
+                      .unstack('hour', fill_value=0)
+                      .reindex(columns=range(HOURS), fill_value=0))
+            if self.counts[i] is not None:
+                counts = self.counts[i].add(counts, fill_value=0).astype(np.int64)
+            self.counts[i] = counts
+        return self
+
+    def medians(self, level=-1):
+        """Median hour per key of one level (the coarsest by default)."""
+        counts = self.counts[level]
+        if counts is None:
+            return pd.Series(dtype=np.int64, name='hour')
+        return pd.Series(histogram_medians(counts), index=counts.index, name='hour')
+
+    def impute(self, keys, default=DEFAULT_HOUR):
+        """Hour for every row of keys (a frame with the levels' key columns), from the finest level with enough known hours."""
+        hour = np.full(len(keys), -1, dtype=np.int64)
+        last = len(self.levels) - 1
+        for i, (level, counts) in enumerate(zip(self.levels, self.counts)):
+            if counts is None:
+                continue
+            if i < last:
+                counts = counts[counts.sum(axis=1) >= self.min_known_hours]
+            medians = pd.Series(histogram_medians(counts), index=counts.index)
+            index = pd.MultiIndex.from_frame(keys[level]) if len(level) > 1 else pd.Index(keys[level[0]])
+            found = medians.reindex(index).to_numpy()
+            fill = (hour < 0) & ~np.isnan(found)
+            hour[fill] = found[fill]
+        return np.where(hour < 0, default, hour)
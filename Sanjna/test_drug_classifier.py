@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from drug_classifier import DRUG_COLUMNS, OPIOID_KEYWORDS, NO_DRUG_VALUES, classify_drugs
+from test_fars_harmonize import synthetic_persons
+
+# Regression check for drug_classifier.py against the original row-wise flags.
+#
+#   python -m pytest test_drug_classifier.py
+
+# -------------------------------
+# Legacy reference
+# -------------------------------
+def classify_drugs_legacy(drugs):
+    """The original row-wise flags over the joined drug names."""
+    all_names = drugs.fillna('nan').astype(str).agg(' | '.join, axis=1).str.lower()
+    return pd.DataFrame({
+        'opioid_flag': all_names.apply(lambda x: 1 if any(op in x for op in OPIOID_KEYWORDS) else 0),
+        'any_drug_flag': all_names.apply(lambda x: 0 if any(ndv in x for ndv in NO_DRUG_VALUES) else 1),
+    }, index=drugs.index)
+
+# -------------------------------
+# Tests
+# -------------------------------
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_legacy(seed):
+    drugs = synthetic_persons(20000, seed)[DRUG_COLUMNS]
+    pd.testing.assert_frame_equal(classify_drugs(drugs), classify_drugs_legacy(drugs))
+
+def test_edge_cases():
+    drugs = pd.DataFrame({
+        'DRUGRES1NAME': ['FENTANYL', None, 'Test Not Given', 'Oxycodone', np.nan, 'Cocaine'],
+        'DRUGRES2NAME': [None, None, 'Heroin', 'Not Reported', 'Codeine', 'Delta 9'],
+        'DRUGRES3NAME': [None, None, None, None, 'naloxone', 'Other Drug (Specify:)'],
+    }, index=[10, 11, 12, 13, 14, 15])
+    pd.testing.assert_frame_equal(classify_drugs(drugs), classify_drugs_legacy(drugs))
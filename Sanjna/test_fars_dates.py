@@ -0,0 +1,270 @@
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fars_dates import MONTHS, _join, ampm_parts, convert_dates, median_hours, parse_dates
+
+# Regression check for fars_dates.py: the vectorized median hours and date
+# conversion against the original row-by-row passes of Cleaning_FARS.py, on every
+# layout the FARS files use plus the corner cases in EDGE_CASES.
+#
+#   python -m pytest test_fars_dates.py
+
+# -------------------------------
+# 1. Legacy reference
+# -------------------------------
+def convert_date_format_legacy(row, weekday_median_hour=12, weekend_median_hour=12):
+    """The original row-wise convert_date_format from Cleaning_FARS.py, with the medians as arguments and without its per-row prints."""
+    date_str = row['crash_date']
+
+    # Check if the date is already in the correct format (either 24-hour or AM/PM format)
+    if re.match(r'^\d{4}-\d{2}-\d{2} \d{2}:00:00$', str(date_str)) or re.match(r'^\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:00:00 [AP]M$', str(date_str)):
+        return date_str
+
+    try:
+        # Format 1: YYYY-Month-DD h:00am/pm-h:59am/pm:SS
+        pattern1 = r'(\d{4})-(\w+)-(\d+) (\d+):00(am|pm)-\d+:59(am|pm):?\d*'
+        match = re.match(pattern1, str(date_str))
+
+        if match:
+            year = match.group(1)
+            month_name = match.group(2)
+            day = match.group(3).zfill(2)  # Ensure day is two digits
+            hour = int(match.group(4))
+            am_pm = match.group(5)
+
+            # Convert month name to number
+            month_dict = {
+                'January': '01', 'February': '02', 'March': '03', 'April': '04',
+                'May': '05', 'June': '06', 'July': '07', 'August': '08',
+                'September': '09', 'October': '10', 'November': '11', 'December': '12'
+            }
+            month = month_dict.get(month_name, '01')
+
+            # Convert hour to 24-hour format first
+            if am_pm.lower() == 'pm' and hour < 12:
+                hour += 12
+            elif am_pm.lower() == 'am' and hour == 12:
+                hour = 0
+
+            # Convert to AM/PM format
+            if hour == 0:
+                formatted_hour = 12
+                formatted_am_pm = "AM"
+            elif hour < 12:
+                formatted_hour = hour
+                formatted_am_pm = "AM"
+            elif hour == 12:
+                formatted_hour = 12
+                formatted_am_pm = "PM"
+            else:
+                formatted_hour = hour - 12
+                formatted_am_pm = "PM"
+
+            formatted_date = f"{int(month)}/{day}/{year}  {formatted_hour}:00:00 {formatted_am_pm}"
+            return formatted_date
+
+        # Format 2: YYYY-Month-DD Unknown Hours:Unknown Minutes
+        pattern2 = r'(\d{4})-(\w+)-(\d+) Unknown Hours:Unknown Minutes'
+        match = re.match(pattern2, str(date_str))
+
+        if match:
+            year = match.group(1)
+            month_name = match.group(2)
+            day = int(match.group(3))
+
+            # Convert month name to number
+            month_dict = {
+                'January': '01', 'February': '02', 'March': '03', 'April': '04',
+                'May': '05', 'June': '06', 'July': '07', 'August': '08',
+                'September': '09', 'October': '10', 'November': '11', 'December': '12'
+            }
+            month = month_dict.get(month_name, '01')
+
+            # Create a date object to determine if it's a weekday or weekend
+            date_obj = datetime(int(year), int(month), day)
+            weekday = date_obj.weekday()
+
+            # Assign hour based on weekday (0-4) or weekend (5-6)
+            hour = weekday_median_hour if weekday < 5 else weekend_median_hour
+
+            # Convert to AM/PM format
+            if hour == 0:
+                formatted_hour = 12
+                formatted_am_pm = "AM"
+            elif hour < 12:
+                formatted_hour = hour
+                formatted_am_pm = "AM"
+            elif hour == 12:
+                formatted_hour = 12
+                formatted_am_pm = "PM"
+            else:
+                formatted_hour = hour - 12
+                formatted_am_pm = "PM"
+
+            formatted_date = f"{int(month)}/{day:02d}/{year}  {formatted_hour}:00:00 {formatted_am_pm}"
+            return formatted_date
+        else:
+            # If neither pattern matches, return the original string
+            return date_str
+    except Exception:
+        return date_str
+
+def median_hours_legacy(frame):
+    """The original first pass of Cleaning_FARS.py: (weekday_median_hour, weekend_median_hour) from an iterrows loop.
+
+    The original stopped with a ValueError on a day that does not exist; such rows
+    are skipped here, as median_hours skips them.
+    """
+    known_hours = []
+    weekday_hours = []
+    weekend_hours = []
+
+    for idx, row in frame.iterrows():
+        date_str = str(row['crash_date'])
+
+        # Already correct format (24-hour)
+        pattern_correct = r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):00:00'
+        match = re.match(pattern_correct, date_str)
+        if match:
+            year, month, day, hour = match.groups()
+            hour = int(hour)
+
+            try:
+                date_obj = datetime(int(year), int(month), int(day))
+            except ValueError:
+                continue
+            weekday = date_obj.weekday()
+            known_hours.append((weekday, hour))
+            if weekday < 5:  # Monday-Friday
+                weekday_hours.append(hour)
+            else:  # Saturday-Sunday
+                weekend_hours.append(hour)
+            continue
+
+        # am/pm format
+        pattern_ampm = r'(\d{4})-(\w+)-(\d+) (\d+):00(am|pm)-\d+:59(am|pm):?\d*'
+        match = re.match(pattern_ampm, date_str)
+        if match:
+            year = match.group(1)
+            month_name = match.group(2)
+            day = int(match.group(3))
+            hour = int(match.group(4))
+            am_pm = match.group(5)
+
+            # Convert month name to number
+            month_dict = {
+                'January': '01', 'February': '02', 'March': '03', 'April': '04',
+                'May': '05', 'June': '06', 'July': '07', 'August': '08',
+                'September': '09', 'October': '10', 'November': '11', 'December': '12'
+            }
+            month = month_dict.get(month_name, '01')
+
+            # Convert hour to 24-hour format
+            if am_pm.lower() == 'pm' and hour < 12:
+                hour += 12
+            elif am_pm.lower() == 'am' and hour == 12:
+                hour = 0
+
+            try:
+                date_obj = datetime(int(year), int(month), day)
+            except ValueError:
+                continue
+            weekday = date_obj.weekday()
+            known_hours.append((weekday, hour))
+            if weekday < 5:  # Monday-Friday
+                weekday_hours.append(hour)
+            else:  # Saturday-Sunday
+                weekend_hours.append(hour)
+
+    # Calculate median hours (defaulting to 12 if no data)
+    weekday_median_hour = int(pd.Series(weekday_hours).median()) if weekday_hours else 12
+    weekend_median_hour = int(pd.Series(weekend_hours).median()) if weekend_hours else 12
+    return weekday_median_hour, weekend_median_hour
+
+# -------------------------------
+# 2. Synthetic dates
+# -------------------------------
+def synthetic_dates(n_rows, seed=0, persons_per_crash=2.5):
+    """crash_date strings in every layout the FARS files use, plus a few malformed ones.
+
+    Like the person-level FARS table, every crash's date repeats once per person row.
+    """
+    rng = np.random.default_rng(seed)
+    n_crashes = max(1, int(n_rows / persons_per_crash))
+    crash_of_row = np.sort(rng.integers(0, n_crashes, n_rows))
+    n_rows = n_crashes
+    year = rng.integers(2013, 2024, n_rows).astype(str)
+    month = rng.integers(1, 13, n_rows)
+    day = rng.integers(1, 32, n_rows)  # includes impossible days such as February 31
+    hour = rng.integers(0, 24, n_rows)
+    hour12, suffix = ampm_parts(hour)
+    month_name = np.array(MONTHS + ['Unknown'])[np.where(rng.random(n_rows) < 0.01, 12, month - 1)]
+    layouts = [
+        _join(year, '-', pd.Series(month).astype(str).str.zfill(2).to_numpy(), '-', pd.Series(np.minimum(day, 28)).astype(str).str.zfill(2).to_numpy(), ' ', pd.Series(hour).astype(str).str.zfill(2).to_numpy(), ':00:00'),
+        _join(month, '/', day, '/', year, '  ', hour12, ':00:00 ', suffix),
+        _join(year, '-', month_name, '-', day, ' ', hour12, ':00', np.char.lower(suffix.astype(str)), '-', hour12, ':59', np.char.lower(suffix.astype(str)), ':00'),
+        _join(year, '-', month_name, '-', day, ' Unknown Hours:Unknown Minutes'),
+        np.array(['Unknown', '2015-Jan-3 Not Reported'], dtype=object)[rng.integers(0, 2, n_rows)],
+    ]
+    choice = rng.choice(len(layouts), n_rows, p=[0.15, 0.05, 0.6, 0.19, 0.01])
+    dates = np.select([choice == i for i in range(len(layouts))], layouts, default=None)
+    dates[rng.random(n_rows) < 0.001] = np.nan
+    return pd.Series(dates[crash_of_row], dtype=object, name='crash_date')
+
+# Layouts and corner cases synthetic_dates does not draw, checked on every run
+EDGE_CASES = [
+    '2016-February-29 Unknown Hours:Unknown Minutes',   # leap day
+    '2015-February-29 Unknown Hours:Unknown Minutes',   # no such day: left unchanged
+    '2015-march-5 Unknown Hours:Unknown Minutes',       # month names are case-sensitive (-> January)
+    '2015-Sept-5 3:00pm-3:59pm:00',
+    '2015-March-005 3:00pm-3:59pm',
+    '2015-March-5 12:00am-12:59am:00',
+    '2015-March-5 12:00pm-12:59pm',
+    '2015-March-5 13:00pm-1:59pm',
+    '2015-April-31 9:00am-9:59am',                      # the hour-range format never checks the day
+    '2015-03-05 23:00:00',
+    '2015-03-05 07:00:00 extra',
+    '2015-02-30 07:00:00',
+    '3/5/2015  3:00:00 PM',
+    '3/5/2015 3:00:00 PM ',
+    'Unknown',
+    '',
+    None,
+    np.nan,
+]
+
+# -------------------------------
+# 3. Tests
+# -------------------------------
+SAMPLE_ROWS = 20000
+
+def sample_dates(seed):
+    return pd.concat([synthetic_dates(SAMPLE_ROWS, seed), pd.Series(EDGE_CASES, dtype=object, name='crash_date')], ignore_index=True)
+
+def assert_same_dates(expected, actual):
+    mismatch = ~((expected == actual) | (expected.isna() & actual.isna()))
+    examples = pd.DataFrame({'legacy': expected, 'vectorized': actual})[mismatch].head()
+    assert not mismatch.any(), f"{int(mismatch.sum())} rows differ, e.g.\n{examples}"
+
+@pytest.mark.parametrize('hours', [(12, 12), (15, 14), (0, 23)])
+def test_edge_cases(hours):
+    frame = pd.DataFrame({'crash_date': pd.Series(EDGE_CASES, dtype=object)})
+    expected = frame.apply(convert_date_format_legacy, axis=1, args=hours)
+    assert_same_dates(expected, convert_dates(frame['crash_date'], *hours, verbose=False))
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_median_hours(seed):
+    dates = sample_dates(seed)
+    assert median_hours(dates) == median_hours_legacy(pd.DataFrame({'crash_date': dates}))
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_convert_dates(seed):
+    frame = pd.DataFrame({'crash_date': sample_dates(seed)})
+    parsed = parse_dates(frame['crash_date'])
+    for hours in [(15, 14), median_hours(parsed)]:
+        expected = frame.apply(convert_date_format_legacy, axis=1, args=hours)
+        assert_same_dates(expected, convert_dates(parsed, *hours, verbose=False))
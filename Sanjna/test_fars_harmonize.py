@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from drug_classifier import DRUG_COLUMNS, OPIOID_KEYWORDS, NO_DRUG_VALUES
+from fars_harmonize import ALCOHOL_MAP, DRIVER, FINAL_COLUMNS, RENAMES, SEVERITY_MAP, file_year, harmonize
+
+# Regression check for fars_harmonize.py: harmonize must write the same CSV text
+# as the original row-wise steps of Merging_FARS.py.
+#
+#   python -m pytest test_fars_harmonize.py
+
+# -------------------------------
+# 1. Legacy reference
+# -------------------------------
+def harmonize_legacy(df, year_value):
+    """The original Merging_FARS.py steps, row by row.
+
+    The only change is fillna('nan') before astype(str), which keeps the
+    pre-pandas-3 text for missing drug names (pandas 3 leaves them missing and
+    the join fails).
+    """
+    df = df.copy()
+    drug_cols = DRUG_COLUMNS
+    df['DRUG_ALL_NAMES'] = df[drug_cols].fillna('nan').astype(str).agg(' | '.join, axis=1).str.lower()
+    opioid_keywords, no_drug_values = OPIOID_KEYWORDS, NO_DRUG_VALUES
+
+    df['YEAR'] = year_value
+    df['crash_date'] = (
+        df['YEAR'].astype(str) + '-' +
+        df['MONTHNAME'].astype(str) + '-' +
+        df['DAYNAME'].astype(str) + ' ' +
+        df['HOURNAME'].astype(str) + ':' +
+        df['MINUTENAME'].astype(str)
+    )
+    df['severity_level'] = df['INJ_SEV'].map(SEVERITY_MAP)
+    df['opioid_flag'] = df['DRUG_ALL_NAMES'].apply(
+        lambda x: 1 if any(op in x for op in opioid_keywords) else 0
+    )
+    df['any_drug_flag'] = df['DRUG_ALL_NAMES'].apply(
+        lambda x: 0 if any(ndv in x for ndv in no_drug_values) else 1
+    )
+    df['alcohol_flag'] = df['DRINKINGNAME'].map(ALCOHOL_MAP)
+    df['young_driver_flag'] = df['AGE'].apply(lambda x: 1 if pd.notna(x) and x < 21 else 0)
+    df['mature_driver_flag'] = df['AGE'].apply(lambda x: 1 if pd.notna(x) and x >= 65 else 0)
+    df['driver_age'] = df.apply(
+        lambda row: row['AGE'] if row['PER_TYPNAME'] == 'Driver of a Motor Vehicle In-Transport' else None, axis=1
+    )
+    df['driver_sex'] = df.apply(
+        lambda row: 0 if row['PER_TYPNAME'] == 'Driver of a Motor Vehicle In-Transport' and row['SEXNAME'] == 'Male'
+        else 1 if row['PER_TYPNAME'] == 'Driver of a Motor Vehicle In-Transport' and row['SEXNAME'] == 'Female'
+        else None,
+        axis=1
+    )
+    df['injuries'] = df['severity_level'].apply(lambda x: 0 if x == 'Property Damage Only' else 1)
+    df.rename(columns=RENAMES, inplace=True)
+    return df[FINAL_COLUMNS]
+
+# -------------------------------
+# 2. Synthetic person rows
+# -------------------------------
+def synthetic_persons(n_rows, seed=0):
+    """Merged FARS person rows with the columns the harmonizer reads."""
+    rng = np.random.default_rng(seed)
+    drugs = np.array(['Test Not Given', 'Not Reported', 'Tested For Drugs, Results Unknown',
+                      'No (Drugs Not Involved)', 'Fentanyl', 'Morphine', 'Oxycodone', 'Cannabinoid',
+                      'Delta 9', 'Amphetamine', 'Cocaine', 'Methadone', 'Hydrocodone', 'Other Drug (Specify:)',
+                      'Drugs Detected, Type Unknown/Positive', 'Reported as Unknown if Tested for Drugs',
+                      'Alprazolam', 'Diazepam', 'Heroin', 'Tramadol', None], dtype=object)
+    person_types = np.array([DRIVER, 'Passenger of a Motor Vehicle In-Transport', 'Pedestrian', 'Bicyclist'], dtype=object)
+    hours = np.array([f"{h % 12 or 12}:00{'am' if h < 12 else 'pm'}-{h % 12 or 12}:59{'am' if h < 12 else 'pm'}" for h in range(24)]
+                     + ['Unknown Hours'], dtype=object)
+    age = rng.integers(0, 100, n_rows).astype(float)
+    age[rng.random(n_rows) < 0.02] = np.nan
+    age[rng.random(n_rows) < 0.02] = 998
+    df = pd.DataFrame({
+        'ST_CASE': rng.integers(10001, 569999, n_rows),
+        'VEH_NO': rng.integers(0, 4, n_rows),
+        'PER_NO': rng.integers(1, 6, n_rows),
+        'VE_FORMS': rng.integers(1, 5, n_rows),
+        'STATE': rng.integers(1, 57, n_rows),
+        'COUNTY': rng.integers(1, 200, n_rows),
+        'FATALS': rng.integers(1, 4, n_rows),
+        'MONTHNAME': np.array(['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+                               'September', 'October', 'November', 'December'])[rng.integers(0, 12, n_rows)],
+        'DAYNAME': rng.integers(1, 32, n_rows),
+        'HOURNAME': hours[rng.integers(0, len(hours), n_rows)],
+        'MINUTENAME': rng.integers(0, 60, n_rows),
+        'INJ_SEV': rng.choice([0, 1, 2, 3, 4, 5, 8, 9], n_rows),
+        'DRINKINGNAME': rng.choice(list(ALCOHOL_MAP) + ['Not Reported'], n_rows),
+        'AGE': age,
+        'PER_TYPNAME': person_types[rng.choice(len(person_types), n_rows, p=[0.6, 0.3, 0.07, 0.03])],
+        'SEXNAME': rng.choice(['Male', 'Female', 'Not Reported'], n_rows, p=[0.6, 0.38, 0.02]),
+        'RACE': rng.integers(1, 10, n_rows),
+        'RACENAME': rng.choice(['White', 'Black', 'Asian', 'Not a Fatality (not Applicable)'], n_rows),
+    })
+    for column in DRUG_COLUMNS:
+        df[column] = drugs[rng.choice(len(drugs), n_rows)]
+    return df
+
+# -------------------------------
+# 3. Tests
+# -------------------------------
+def assert_same_csv(expected, actual):
+    expected, actual = expected.to_csv(index=False), actual.to_csv(index=False)
+    for i, (e, a) in enumerate(zip(expected.splitlines(), actual.splitlines())):
+        assert e == a, f"line {i} differs:\n  legacy:     {e}\n  vectorized: {a}"
+    assert len(expected) == len(actual), "outputs differ in length"
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_legacy(seed):
+    df = synthetic_persons(20000, seed)
+    assert_same_csv(harmonize_legacy(df, 2017), harmonize(df, 2017))
+
+def test_year_per_row():
+    # Stacked years harmonize like each year on its own
+    df = synthetic_persons(2000)
+    years = np.where(np.arange(len(df)) < 1000, 2016, 2017)
+    expected = pd.concat([harmonize_legacy(df.iloc[:1000], 2016), harmonize_legacy(df.iloc[1000:], 2017)])
+    assert_same_csv(expected, harmonize(df, years))
+
+def test_file_year():
+    assert file_year('merged_fars_data_2017.csv') == 2017
+    with pytest.raises(ValueError):
+        file_year('merged_fars_data.csv')
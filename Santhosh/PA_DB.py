@@ -1,6 +1,9 @@
 import os
 import pandas as pd
 from sqlalchemy import create_engine, text
+from cache import load_dataset
+from schema import probe_schema, merge_read_kwargs
+from loader import MAX_WORKERS, bulk_load_csv, stream_merge, parquet_is_fresh, load_tables_parallel, print_throughput_report
 
 # ========== MYSQL CONFIG ==========
 MYSQL_CONFIG = {
@@ -29,49 +32,45 @@ def create_database():
         conn.execute(text(f"CREATE DATABASE {DB_NAME}"))
     engine.dispose()
 
-def connect_database():
+def connect_database(pool_size=5):
     url = f"mysql+pymysql://{MYSQL_CONFIG['user']}:{MYSQL_CONFIG['password']}@{MYSQL_CONFIG['host']}:{MYSQL_CONFIG['port']}/{DB_NAME}"
-    engine = create_engine(url, pool_recycle=3600, future=True)
+    # local_infile lets the loader use LOAD DATA LOCAL INFILE
+    engine = create_engine(url, pool_recycle=3600, future=True, pool_size=pool_size, connect_args={'local_infile': True})
     return engine
 
 # ========== UTILITY FUNCTIONS ==========
-def load_dataset(file_path, **read_kwargs):
-    if file_path.endswith(".csv"):
-        return pd.read_csv(file_path, **read_kwargs, low_memory=False)
-    elif file_path.endswith(".xlsx"):
-        return pd.read_excel(file_path, **read_kwargs)
-    elif file_path.endswith(".txt"):
-        return pd.read_csv(file_path, delimiter="|", **read_kwargs, encoding='ISO-8859-1', low_memory=False)
-    else:
-        raise ValueError(f"Unsupported file format for {file_path}")
-
 def check_column_consistency(file_list, table_name):
-    base_cols = None
-    for file in file_list:
-        df = load_dataset(file)
-        cols = set(df.columns)
-        if base_cols is None:
-            base_cols = cols
-        else:
-            if cols != base_cols:
-                raise ValueError(f"Column mismatch detected in {table_name}: {file}")
+    # Only headers and a small sample are read here; the returned read kwargs let
+    # the merge parse each file exactly once with consistent dtypes.
+    schemas = [probe_schema(file) for file in file_list]
+    read_kwargs = merge_read_kwargs(schemas, table_name)
     print(f"All {table_name} files have consistent columns.")
+    return schemas, read_kwargs
 
 # ========== TRANSFORMATIONS ==========
-def merge_pa_files():
+def merge_pa_files(streaming=True, output_format='csv'):
     table_types = ["CRASH", "PERSON", "VEHICLE", "FLAG"]
     for table in table_types:
         folder = os.path.join(DATA_DIR, "")
-        files = sorted([os.path.join(folder, f) for f in os.listdir(folder) if f.startswith(table) and f.endswith(".csv")])
+        # Skip a previous merged output so reruns don't read the file being written
+        files = sorted([os.path.join(folder, f) for f in os.listdir(folder) if f.startswith(table) and f.endswith(".csv") and not f.startswith(f"{table}_2013-22")])
         if not files:
             print(f"No files found for {table}.")
             continue
 
         # Check column consistency first
-        check_column_consistency(files, table)
+        schemas, read_kwargs = check_column_consistency(files, table)
+
+        if streaming:
+            extension = "parquet" if output_format == 'parquet' else "csv"
+            merged_filename = os.path.join(folder, f"{table}_2013-22.{extension}")
+            print(f"Streaming {len(files)} files for {table}...")
+            rows = stream_merge(files, merged_filename, schemas[0], read_kwargs, output_format=output_format)
+            print(f"Merged {table} with {rows} rows saved to {merged_filename}")
+            continue
 
         # Merge files
-        dfs = [load_dataset(file) for file in files]
+        dfs = [load_dataset(file, **read_kwargs) for file in files]
         print(f"Merging {len(dfs)} files for {table}...")
         merged = pd.concat(dfs, ignore_index=True)
         print(f"Merged {table} with {len(merged)} rows.")
@@ -83,49 +82,30 @@ def merge_pa_files():
 
 # ========== LOAD FILES ==========
 def load_and_insert_csv(engine, table_name, file_path, if_exists='append', delimiter=','):
-    df = pd.read_csv(file_path, delimiter=delimiter, low_memory=False)
-    df.to_sql(table_name, con=engine, if_exists=if_exists, index=False, chunksize=10000)
-
-def load_all_pa_data():
-    engine = connect_database()
-
-    # 1. Load CRASH_2013-2022
-    crash_files = [f for f in os.listdir(DATA_DIR) if f.startswith("CRASH_2013-22") and f.endswith(".csv")]
-    print(f"Found {len(crash_files)} crash files.")
-    crash_table_created = False
-    for file in crash_files:
-        print(f"Loading {file} into crash table...")
-        load_and_insert_csv(engine, 'crash', os.path.join(DATA_DIR, file), if_exists='replace' if not crash_table_created else 'append')
-        crash_table_created = True
-
-    # 2. Load FLAG
-    flag_files = [f for f in os.listdir(DATA_DIR) if f.startswith("FLAG_2013-22") and f.endswith(".csv")]
-    flag_table_created = False
-    for file in flag_files:
-        print(f"Loading {file} into flag table...")
-        load_and_insert_csv(engine, 'flag', os.path.join(DATA_DIR, file), if_exists='replace' if not flag_table_created else 'append')
-        flag_table_created = True
-
-    # 3. Load PERSON
-    person_files = [f for f in os.listdir(DATA_DIR) if f.startswith("PERSON_2013-22") and f.endswith(".csv")]
-    person_table_created = False
-    for file in person_files:
-        print(f"Loading {file} into person table...")
-        load_and_insert_csv(engine, 'person', os.path.join(DATA_DIR, file), if_exists='replace' if not person_table_created else 'append')
-        person_table_created = True
-
-    # 4. Load VEHICLE
-    vehicle_files = [f for f in os.listdir(DATA_DIR) if f.startswith("VEHICLE_2013-22") and f.endswith(".csv")]
-    vehicle_table_created = False
-    for file in vehicle_files:
-        print(f"Loading {file} into vehicle table...")
-        load_and_insert_csv(engine, 'vehicle', os.path.join(DATA_DIR, file), if_exists='replace' if not vehicle_table_created else 'append')
-        vehicle_table_created = True
-
-    # 5. Load COUNTY_FIPS
-    print(f"Loading COUNTY_FIPS.csv into county_fips table...")
-    load_and_insert_csv(engine, 'county_fips', os.path.join(DATA_DIR, 'COUNTY_FIPS.csv'), if_exists='replace', delimiter='|')
+    return bulk_load_csv(engine, table_name, file_path, if_exists=if_exists, delimiter=delimiter)
+
+def pa_table_sources(years=None):
+    sources = {}
+    for table, prefix in [('crash', 'CRASH_2013-22'), ('flag', 'FLAG_2013-22'), ('person', 'PERSON_2013-22'), ('vehicle', 'VEHICLE_2013-22')]:
+        # Prefer the year-partitioned Parquet merge when present so whole years can be skipped
+        # (unless the merged CSV was written after it)
+        parquet_dir = os.path.join(DATA_DIR, f"{prefix}.parquet")
+        files = sorted(os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.startswith(prefix) and f.endswith(".csv"))
+        if parquet_is_fresh(parquet_dir, files):
+            sources[table] = {'parquet': parquet_dir, 'years': years}
+            continue
+        sources[table] = {'files': files, 'delimiter': ','}
+    sources['county_fips'] = {'files': [os.path.join(DATA_DIR, 'COUNTY_FIPS.csv')], 'delimiter': '|'}
+    return sources
+
+def load_all_pa_data(max_workers=MAX_WORKERS, years=None):
+    engine = connect_database(pool_size=max_workers)
+
+    # crash, flag, person, vehicle and county_fips don't depend on each other
+    sources = pa_table_sources(years)
+    stats, _ = load_tables_parallel(engine, sources, max_workers=max_workers)
 
+    print_throughput_report(stats)
     print("All files loaded successfully into MySQL.")
 
 # ========== MAIN ==========
@@ -1,6 +1,9 @@
 import os
 import pandas as pd
 from sqlalchemy import create_engine, text
+from cache import load_dataset
+from schema import probe_schema, merge_read_kwargs
+from loader import MAX_WORKERS, bulk_load_csv, stream_merge, parquet_is_fresh, load_tables_parallel, print_throughput_report
 import re
 
 # ========== MYSQL CONFIG ==========
@@ -30,36 +33,23 @@ def create_database():
         conn.execute(text(f"CREATE DATABASE {DB_NAME}"))
     engine.dispose()
 
-def connect_database():
+def connect_database(pool_size=5):
     url = f"mysql+pymysql://{MYSQL_CONFIG['user']}:{MYSQL_CONFIG['password']}@{MYSQL_CONFIG['host']}:{MYSQL_CONFIG['port']}/{DB_NAME}"
-    engine = create_engine(url, pool_recycle=3600, future=True)
+    # local_infile lets the loader use LOAD DATA LOCAL INFILE
+    engine = create_engine(url, pool_recycle=3600, future=True, pool_size=pool_size, connect_args={'local_infile': True})
     return engine
 
 # ========== UTILITY FUNCTIONS ==========
-def load_dataset(file_path, **read_kwargs):
-    if file_path.endswith(".csv"):
-        return pd.read_csv(file_path, **read_kwargs, low_memory=False)
-    elif file_path.endswith(".xlsx"):
-        return pd.read_excel(file_path, **read_kwargs)
-    elif file_path.endswith(".txt"):
-        return pd.read_csv(file_path, delimiter="|", **read_kwargs, encoding='ISO-8859-1', low_memory=False)
-    else:
-        raise ValueError(f"Unsupported file format for {file_path}")
-
 def check_column_consistency(file_list, table_name):
-    base_cols = None
-    for file in file_list:
-        df = load_dataset(file)
-        cols = set(df.columns)
-        if base_cols is None:
-            base_cols = cols
-        else:
-            if cols != base_cols:
-                raise ValueError(f"Column mismatch detected in {table_name}: {file}")
+    # Only headers and a small sample are read here; the returned read kwargs let
+    # the merge parse each file exactly once with consistent dtypes.
+    schemas = [probe_schema(file) for file in file_list]
+    read_kwargs = merge_read_kwargs(schemas, table_name)
     print(f"All {table_name} files have consistent columns.")
+    return schemas, read_kwargs
 
 # ========== TRANSFORMATIONS ==========
-def merge_sc_files():
+def merge_sc_files(streaming=True, output_format='csv'):
     crash_files = sorted([os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if re.match(r"Statewide 20(1[3-9]|2[0-2])\.xlsx$", f)])
     unit_files = sorted([os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.endswith("UNITS.xlsx")])
     print(f"Found {len(crash_files)} crash files and {len(unit_files)} unit files.")
@@ -68,43 +58,51 @@ def merge_sc_files():
         raise ValueError("No SC files found for merging.")
 
     # Check column consistency
-    check_column_consistency(crash_files, "SC Statewide")
-    check_column_consistency(unit_files, "SC Statewide UNIT")
+    crash_schemas, crash_kwargs = check_column_consistency(crash_files, "SC Statewide")
+    unit_schemas, unit_kwargs = check_column_consistency(unit_files, "SC Statewide UNIT")
+
+    if streaming:
+        extension = "parquet" if output_format == 'parquet' else "csv"
+        stream_merge(crash_files, os.path.join(DATA_DIR, f"Statewide_2013-22.{extension}"), crash_schemas[0], crash_kwargs, output_format=output_format)
+        print("Merged Statewide crash data saved.")
+        stream_merge(unit_files, os.path.join(DATA_DIR, f"Statewide_Unit_2013-22.{extension}"), unit_schemas[0], unit_kwargs, output_format=output_format)
+        print("Merged Statewide unit data saved.")
+        return
 
     # Merge crash files
-    crash_dfs = [load_dataset(file) for file in crash_files]
+    crash_dfs = [load_dataset(file, **crash_kwargs) for file in crash_files]
     crash_merged = pd.concat(crash_dfs, ignore_index=True)
     crash_merged.to_csv(os.path.join(DATA_DIR, "Statewide_2013-22.csv"), index=False)
     print("Merged Statewide crash data saved.")
 
     # Merge unit files
-    unit_dfs = [load_dataset(file) for file in unit_files]
+    unit_dfs = [load_dataset(file, **unit_kwargs) for file in unit_files]
     unit_merged = pd.concat(unit_dfs, ignore_index=True)
     unit_merged.to_csv(os.path.join(DATA_DIR, "Statewide_Unit_2013-22.csv"), index=False)
     print("Merged Statewide unit data saved.")
 
 # ========== LOAD SC DATA ==========
 def load_and_insert_csv(engine, table_name, file_path, if_exists='append', delimiter=','):
-    df = pd.read_csv(file_path, delimiter=delimiter, low_memory=False)
-    df.to_sql(table_name, con=engine, if_exists=if_exists, index=False, chunksize=10000)
-
-def load_all_sc_data():
-    engine = connect_database()
-
-    # Load Statewide crash data
-    crash_file = os.path.join(DATA_DIR, "Statewide_2013-22.csv")
-    print("Loading Statewide_2013-22.csv into statewide table...")
-    load_and_insert_csv(engine, 'statewide', crash_file, if_exists='replace')
+    return bulk_load_csv(engine, table_name, file_path, if_exists=if_exists, delimiter=delimiter)
+
+def sc_table_sources(years=None):
+    sources = {}
+    for table, stem in [('statewide', "Statewide_2013-22"), ('statewide_unit', "Statewide_Unit_2013-22")]:
+        parquet_dir = os.path.join(DATA_DIR, f"{stem}.parquet")
+        csv_path = os.path.join(DATA_DIR, f"{stem}.csv")
+        if parquet_is_fresh(parquet_dir, [csv_path]):
+            sources[table] = {'parquet': parquet_dir, 'years': years}
+        else:
+            sources[table] = {'files': [csv_path], 'delimiter': ','}
+    sources['county_fips'] = {'files': [os.path.join(DATA_DIR, 'COUNTY_FIPS.csv')], 'delimiter': '|'}
+    return sources
 
-    # Load Statewide unit data
-    unit_file = os.path.join(DATA_DIR, "Statewide_Unit_2013-22.csv")
-    print("Loading Statewide_Unit_2013-22.csv into statewide_unit table...")
-    load_and_insert_csv(engine, 'statewide_unit', unit_file, if_exists='replace')
+def load_all_sc_data(max_workers=MAX_WORKERS, years=None):
+    engine = connect_database(pool_size=max_workers)
 
-    # Load Fips
-    print(f"Loading COUNTY_FIPS.csv into county_fips table...")
-    load_and_insert_csv(engine, 'county_fips', os.path.join(DATA_DIR, 'COUNTY_FIPS.csv'), if_exists='replace', delimiter='|')
+    stats, _ = load_tables_parallel(engine, sc_table_sources(years), max_workers=max_workers)
 
+    print_throughput_report(stats)
     print("All SC files loaded successfully into MySQL.")
 
 # ========== MAIN ==========
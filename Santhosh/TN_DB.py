@@ -1,6 +1,7 @@
 import os
-import pandas as pd
 from sqlalchemy import create_engine, text
+from schema import probe_schema, merge_read_kwargs
+from loader import MAX_WORKERS, bulk_load_csv, load_tables_parallel, print_throughput_report
 
 # ========== MYSQL CONFIG ==========
 MYSQL_CONFIG = {
@@ -29,75 +30,47 @@ def create_database():
         conn.execute(text(f"CREATE DATABASE {DB_NAME}"))
     engine.dispose()
 
-def connect_database():
+def connect_database(pool_size=5):
     url = f"mysql+pymysql://{MYSQL_CONFIG['user']}:{MYSQL_CONFIG['password']}@{MYSQL_CONFIG['host']}:{MYSQL_CONFIG['port']}/{DB_NAME}"
-    engine = create_engine(url, pool_recycle=3600, future=True)
+    # local_infile lets the loader use LOAD DATA LOCAL INFILE
+    engine = create_engine(url, pool_recycle=3600, future=True, pool_size=pool_size, connect_args={'local_infile': True})
     return engine
 
 # ========== UTILITY FUNCTIONS ==========
-def load_dataset(file_path, **read_kwargs):
-    if file_path.endswith(".csv"):
-        return pd.read_csv(file_path, **read_kwargs, low_memory=False)
-    elif file_path.endswith(".xlsx"):
-        return pd.read_excel(file_path, **read_kwargs)
-    elif file_path.endswith(".txt"):
-        return pd.read_csv(file_path, delimiter="|", **read_kwargs, encoding='ISO-8859-1', low_memory=False)
-    else:
-        raise ValueError(f"Unsupported file format for {file_path}")
-
 def check_column_consistency(file_list, table_name):
-    base_cols = None
-    for file in file_list:
-        df = load_dataset(file)
-        cols = set(df.columns)
-        if base_cols is None:
-            base_cols = cols
-        else:
-            if cols != base_cols:
-                raise ValueError(f"Column mismatch detected in {table_name}: {file}")
+    # Only headers and a small sample are read here; the returned read kwargs let
+    # the merge parse each file exactly once with consistent dtypes.
+    schemas = [probe_schema(file) for file in file_list]
+    read_kwargs = merge_read_kwargs(schemas, table_name)
     print(f"All {table_name} files have consistent columns.")
+    return schemas, read_kwargs
 
 # ========== LOAD FILES ==========
 def load_and_insert_csv(engine, table_name, file_path, if_exists='append', delimiter=','):
-    df = pd.read_csv(file_path, delimiter=delimiter, encoding='ISO-8859-1', low_memory=False)
-    df.to_sql(table_name, con=engine, if_exists=if_exists, index=False, chunksize=10000)
-
-def load_all_tn_data():
-    engine = connect_database()
-
-    # Load vwCollision.txt
-    collision_file = os.path.join(DATA_DIR, "vwCollision.txt")
-    print("Loading vwCollision.txt into collision table...")
-    load_and_insert_csv(engine, 'collision', collision_file, if_exists='replace', delimiter='|')
-
-    # Load vwPerson.txt
-    person_file = os.path.join(DATA_DIR, "vwPerson.txt")
-    print("Loading vwPerson.txt into person table...")
-    load_and_insert_csv(engine, 'person', person_file, if_exists='replace', delimiter='|')
-
-    # Load vwPersonDrug.txt
-    person_drug_file = os.path.join(DATA_DIR, "vwPersonDrug.txt")
-    print("Loading vwPersonDrug.txt into person_drug table...")
-    load_and_insert_csv(engine, 'person_drug', person_drug_file, if_exists='replace', delimiter='|')
-
-    # Load vwUnit.txt
-    unit_file = os.path.join(DATA_DIR, "vwUnit.txt")
-    print("Loading vwUnit.txt into unit table...")
-    load_and_insert_csv(engine, 'unit', unit_file, if_exists='replace', delimiter='|')
-
-    # Load vwPersonDetail.txt
-    person_detail_file = os.path.join(DATA_DIR, "vwPersonDetail.txt")
-    print("Loading vwPersonDetail.txt into person_detail table...")
-    load_and_insert_csv(engine, 'person_detail', person_detail_file, if_exists='replace', delimiter='|')
-
-    # Load COUNTY_FIPS.csv
-    county_fips_file = os.path.join(DATA_DIR, "COUNTY_FIPS.csv")
-    print("Loading COUNTY_FIPS.csv into county_fips table...")
-    load_and_insert_csv(engine, 'county_fips', county_fips_file, if_exists='replace', delimiter='|')
-
+    return bulk_load_csv(engine, table_name, file_path, if_exists=if_exists, delimiter=delimiter, encoding='ISO-8859-1')
+
+def tn_table_sources():
+    files = {
+        'collision': "vwCollision.txt",
+        'person': "vwPerson.txt",
+        'person_drug': "vwPersonDrug.txt",
+        'unit': "vwUnit.txt",
+        'person_detail': "vwPersonDetail.txt",
+        'county_fips': "COUNTY_FIPS.csv",
+    }
+    return {
+        table: {'files': [os.path.join(DATA_DIR, name)], 'delimiter': '|', 'encoding': 'ISO-8859-1'}
+        for table, name in files.items()
+    }
+
+def load_all_tn_data(max_workers=MAX_WORKERS):
+    engine = connect_database(pool_size=max_workers)
+
+    stats, _ = load_tables_parallel(engine, tn_table_sources(), max_workers=max_workers)
+
+    print_throughput_report(stats)
     print("All TN files loaded successfully into MySQL.")
 
-
 # ========== MAIN ==========
 if __name__ == '__main__':
     create_database()
@@ -0,0 +1,308 @@
+# Pluggable SQL backends for the harmonization in merger.py.
+# Each backend runs the same merge queries; the handful of dialect-specific
+# expressions (date construction, datetime casts, row hashes, CREATE TABLE AS) go through
+# the helpers below.
+#
+#   mysql  - the existing MySQL/MariaDB server (tables loaded by *_DB.py)
+#   duckdb - embedded columnar engine reading the raw files / Parquet / Arrow cache in-process
+#   sqlite - embedded row store, tables loaded with loader.load_tables_parallel
+import os
+import hashlib
+import pandas as pd
+from sqlalchemy import create_engine, event, inspect, text
+
+DEFAULT_BACKEND = os.environ.get('CRASH_DB_BACKEND', 'mysql')
+EMBEDDED_DIR = './datasets'
+# MySQL/MariaDB can only index TEXT/BLOB columns on a prefix
+INDEX_PREFIX_LENGTH = 64
+
+# ========== MYSQL ==========
+class MySQLBackend:
+    name = 'mysql'
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    @classmethod
+    def from_config(cls, config, db_name):
+        url = f"mysql+pymysql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{db_name}"
+        return cls(create_engine(url, pool_recycle=3600, future=True))
+
+    # ----- dialect helpers -----
+    def date_from_year_month(self, year, month):
+        return f"STR_TO_DATE(CONCAT({year}, '-', LPAD({month}, 2, '0'), '-01'), '%Y-%m-%d')"
+
+    def to_datetime(self, expr):
+        return f"CAST({expr} AS DATETIME)"
+
+    def year_of(self, expr):
+        return f"YEAR({expr})"
+
+    def to_integer(self, expr):
+        return f"CAST({expr} AS SIGNED)"
+
+    def row_hash_sum(self, columns):
+        """Order-independent fingerprint of the rows: the sum of a per-row hash of columns, as text."""
+        # '=' marks a value, '-' a NULL, so NULL and the text 'N' (say) hash differently
+        row = ", ".join(f"COALESCE(CONCAT('=', CAST({c} AS CHAR)), '-')" for c in columns)
+        return f"CAST(SUM(CAST(CONV(LEFT(MD5(CONCAT_WS('|', {row})), 15), 16, 10) AS UNSIGNED)) AS CHAR)"
+
+    # ----- execution -----
+    def execute(self, *statements):
+        with self.engine.connect() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.commit()
+
+    def create_table_as(self, table_name, select_sql):
+        self.execute(f"DROP TABLE IF EXISTS {table_name}", f"CREATE TABLE {table_name} AS {select_sql}")
+
+    def column_types(self, table_name):
+        return {col['name']: col['type'] for col in inspect(self.engine).get_columns(table_name)}
+
+    def _index_column(self, column, column_type):
+        # to_sql stores strings as TEXT, which needs a key length to be indexed
+        if type(column_type).__name__.upper() in ('TEXT', 'MEDIUMTEXT', 'LONGTEXT', 'BLOB'):
+            return f"{column}({INDEX_PREFIX_LENGTH})"
+        return column
+
+    def create_index(self, table_name, index_name, columns):
+        types = self.column_types(table_name)
+        keys = ', '.join(self._index_column(col, types.get(col)) for col in columns)
+        self.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({keys})")
+
+    def add_key_column(self, table_name, column, expr, sql_type):
+        """Materialize expr as a column; rows appended since the last run are filled in."""
+        if column not in self.column_types(table_name):
+            self.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {sql_type}")
+        self.execute(f"UPDATE {table_name} SET {column} = {expr} WHERE {column} IS NULL")
+
+    def table_exists(self, table_name):
+        return inspect(self.engine).has_table(table_name)
+
+    def explain_issues(self, select_sql):
+        """Joined tables the planner reads with a full scan instead of an index or hash join."""
+        plan = self.read_sql(f"EXPLAIN {select_sql}")
+        issues = []
+        for i, row in enumerate(plan.to_dict('records')):
+            extra = str(row.get('Extra') or '')
+            if str(row.get('type')).upper() != 'ALL' or i == 0:
+                continue
+            if 'hash' in extra.lower() or 'BNLH' in extra:
+                continue
+            issues.append(f"full scan of {row.get('table')} (~{row.get('rows')} rows) {extra}".strip())
+        return issues
+
+    def read_sql(self, query, params=None):
+        with self.engine.connect() as conn:
+            return pd.read_sql(text(query), conn, params=params)
+
+    def iter_batches(self, query, batch_size, params=None):
+        """Yield DataFrames of at most batch_size rows from a server-side (unbuffered) cursor."""
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True, max_row_buffer=batch_size)
+            result = conn.execute(text(query), params or {})
+            columns = list(result.keys())
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield pd.DataFrame(rows, columns=columns)
+
+    def dispose(self):
+        self.engine.dispose()
+
+# ========== DUCKDB ==========
+class DuckDBBackend:
+    name = 'duckdb'
+
+    def __init__(self, database=':memory:', threads=None):
+        import duckdb
+
+        self.con = duckdb.connect(database)
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        self._arrow_sources = []
+        self._scans = {}
+
+    def date_from_year_month(self, year, month):
+        return f"make_date(CAST({year} AS INTEGER), CAST({month} AS INTEGER), 1)"
+
+    def to_datetime(self, expr):
+        return f"TRY_CAST({expr} AS TIMESTAMP)"
+
+    def year_of(self, expr):
+        return f"year(TRY_CAST({expr} AS TIMESTAMP))"
+
+    def to_integer(self, expr):
+        return f"TRY_CAST({expr} AS INTEGER)"
+
+    def row_hash_sum(self, columns):
+        # hash() is a UBIGINT, its SUM a HUGEINT; text keeps every digit through pandas
+        return f"CAST(SUM(hash({', '.join(columns)})) AS VARCHAR)"
+
+    def execute(self, *statements):
+        # Several statements run as one transaction, like the single-connection MySQL path
+        if len(statements) > 1:
+            self.con.execute("BEGIN TRANSACTION")
+        try:
+            for statement in statements:
+                self.con.execute(statement)
+        except Exception:
+            if len(statements) > 1:
+                self.con.execute("ROLLBACK")
+            raise
+        if len(statements) > 1:
+            self.con.execute("COMMIT")
+
+    def create_table_as(self, table_name, select_sql):
+        self.execute(f"CREATE OR REPLACE TABLE {table_name} AS {select_sql}")
+
+    def create_index(self, table_name, index_name, columns):
+        # Joins are hash joins over columnar scans; ART indexes would only slow the build
+        pass
+
+    def table_exists(self, table_name):
+        return self.con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ? AND table_type = 'BASE TABLE'", [table_name]
+        ).fetchone()[0] > 0
+
+    def add_key_column(self, table_name, column, expr, sql_type):
+        columns = set(self.con.execute(f"SELECT * FROM {table_name} LIMIT 0").df().columns)
+        if table_name in self._scans:
+            # Source tables are views over the files: compute the key in the view itself
+            if column not in columns:
+                self._scans[table_name] = f"SELECT *, CAST({expr} AS {sql_type}) AS {column} FROM ({self._scans[table_name]})"
+                self.execute(f"CREATE OR REPLACE VIEW {table_name} AS {self._scans[table_name]}")
+            return
+        if column not in columns:
+            self.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {sql_type}")
+        self.execute(f"UPDATE {table_name} SET {column} = {expr} WHERE {column} IS NULL")
+
+    def explain_issues(self, select_sql):
+        """Joins DuckDB runs as nested loops / cross products rather than hash joins."""
+        plan = "\n".join(self.con.execute(f"EXPLAIN {select_sql}").df()['explain_value'])
+        return [f"{op} in plan" for op in ('NESTED_LOOP_JOIN', 'BLOCKWISE_NL_JOIN', 'CROSS_PRODUCT') if op in plan]
+
+    def read_sql(self, query, params=None):
+        return self.con.execute(query, params or []).df()
+
+    def iter_batches(self, query, batch_size, params=None):
+        reader = self.con.execute(query, params or []).fetch_record_batch(batch_size)
+        for batch in reader:
+            yield batch.to_pandas()
+
+    def register_sources(self, sources, use_cache=True):
+        """Expose each source table as a view over its files, without loading them.
+
+        sources is the {table: {'files': [...] | 'parquet': dir, 'delimiter', 'encoding'}}
+        mapping returned by pa/sc/tn_table_sources().
+        """
+        for table_name, source in sources.items():
+            if 'parquet' in source:
+                path = os.path.join(os.path.abspath(source['parquet']), '**', '*.parquet')
+                # The year partition column filters the scan but is not part of the table
+                scan = f"SELECT * EXCLUDE (year) FROM read_parquet('{path}', hive_partitioning = true)"
+                if source.get('years') is not None:
+                    scan += f" WHERE year IN ({', '.join(str(int(y)) for y in source['years'])})"
+            else:
+                scans = [self._file_scan(table_name, i, f, source, use_cache) for i, f in enumerate(source['files'])]
+                scan = " UNION ALL BY NAME ".join(scans)
+            self._scans[table_name] = scan
+            self.execute(f"CREATE OR REPLACE VIEW {table_name} AS {scan}")
+
+    def _file_scan(self, table_name, i, file_path, source, use_cache):
+        if use_cache or file_path.endswith(".xlsx"):
+            # Zero-copy scan over the memory-mapped Arrow copy from cache.py
+            from cache import cached_table, read_raw
+
+            read_kwargs = {}
+            if file_path.endswith(".csv") and source.get('delimiter', ',') != ',':
+                read_kwargs['delimiter'] = source['delimiter']
+            name = f"_{table_name}_src{i}"
+            arrow_table = cached_table(file_path, **read_kwargs)
+            if arrow_table is None:
+                # Not cacheable (mixed-type columns): scan the raw frame instead
+                arrow_table = read_raw(file_path, **read_kwargs)
+            self._arrow_sources.append(arrow_table)
+            self.con.register(name, arrow_table)
+            return f"SELECT * FROM {name}"
+        delimiter = source.get('delimiter', ',')
+        encoding = ", encoding = 'latin-1'" if source.get('encoding') else ""
+        return f"SELECT * FROM read_csv('{os.path.abspath(file_path)}', delim = '{delimiter}', header = true{encoding})"
+
+    def dispose(self):
+        self.con.close()
+
+# ========== SQLITE ==========
+def _sqlite_row_hash(*values):
+    # 32 bits, so SUM over a year stays within SQLite's 64-bit integers
+    return int.from_bytes(hashlib.blake2b(repr(values).encode(), digest_size=4).digest(), 'big')
+
+class SQLiteBackend(MySQLBackend):
+    name = 'sqlite'
+
+    def __init__(self, engine):
+        super().__init__(engine)
+        # SQLite has no hash function; register one on every new connection
+        event.listen(engine, 'connect', lambda con, _: con.create_function('row_hash', -1, _sqlite_row_hash, deterministic=True))
+
+    @classmethod
+    def from_path(cls, path):
+        return cls(create_engine(f"sqlite:///{path}", future=True))
+
+    def date_from_year_month(self, year, month):
+        return f"printf('%04d-%02d-01', {year}, {month})"
+
+    def to_datetime(self, expr):
+        return f"datetime({expr})"
+
+    def year_of(self, expr):
+        return f"CAST(strftime('%Y', {expr}) AS INTEGER)"
+
+    def to_integer(self, expr):
+        return f"CAST({expr} AS INTEGER)"
+
+    def row_hash_sum(self, columns):
+        return f"CAST(SUM(row_hash({', '.join(columns)})) AS TEXT)"
+
+    def _index_column(self, column, column_type):
+        return column
+
+    def explain_issues(self, select_sql):
+        """SCAN steps after the driving table, and indexes SQLite has to build per query."""
+        plan = self.read_sql(f"EXPLAIN QUERY PLAN {select_sql}")
+        steps = [d for d in plan['detail'] if d.startswith(('SCAN', 'SEARCH'))]
+        issues = [f"full scan: {d}" for d in steps[1:] if d.startswith('SCAN')]
+        issues += [f"no stored index: {d}" for d in steps if 'AUTOMATIC' in d]
+        return issues
+
+    def register_sources(self, sources, use_cache=True):
+        from loader import load_tables_parallel
+
+        load_tables_parallel(self.engine, sources)
+
+# ========== FACTORY ==========
+def connect_backend(kind, db_name, mysql_config=None, sources=None):
+    """Open the harmonization backend for one state database.
+
+    For the embedded engines, sources (from *_table_sources()) are attached
+    first so the merge queries see the same table names as on MySQL.
+    """
+    if kind == 'mysql':
+        return MySQLBackend.from_config(mysql_config, db_name)
+    if kind == 'duckdb':
+        backend = DuckDBBackend(os.path.join(EMBEDDED_DIR, f"{db_name}.duckdb"))
+    elif kind == 'sqlite':
+        backend = SQLiteBackend.from_path(os.path.join(EMBEDDED_DIR, f"{db_name}.sqlite"))
+    else:
+        raise ValueError(f"Unknown backend {kind}")
+    if sources:
+        backend.register_sources(sources)
+    return backend
+
+def as_backend(engine_or_backend):
+    """Accept either a backend or a plain SQLAlchemy engine (treated as MySQL)."""
+    if hasattr(engine_or_backend, 'create_table_as'):
+        return engine_or_backend
+    return MySQLBackend(engine_or_backend)
@@ -0,0 +1,241 @@
+# Columnar cache for the raw state extracts.
+# The first read of a CSV/TXT/XLSX file stores an Arrow IPC copy under CACHE_DIR,
+# keyed by the SHA-256 of the source contents (plus any read kwargs). Later reads
+# memory-map that copy instead of parsing text or Excel again. A changed source
+# hashes to a new key, and its stale copy is dropped. Frames Arrow cannot store
+# without changing their values (mixed-type object columns, e.g. Excel codes that
+# are sometimes numeric) are not cached and are always read raw.
+#
+#   python Santhosh/cache.py warm ./datasets/PA ./datasets/SC ./datasets/TN
+#   python Santhosh/cache.py prune
+#   python Santhosh/cache.py status
+import os
+import json
+import time
+import hashlib
+import argparse
+import pandas as pd
+
+CACHE_DIR = './datasets/.cache'
+MANIFEST_FILE = 'manifest.json'
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.txt')
+
+# ========== RAW READERS ==========
+def read_raw(file_path, **read_kwargs):
+    if file_path.endswith(".csv"):
+        return pd.read_csv(file_path, **read_kwargs, low_memory=False)
+    elif file_path.endswith(".xlsx"):
+        return pd.read_excel(file_path, **read_kwargs)
+    elif file_path.endswith(".txt"):
+        return pd.read_csv(file_path, delimiter="|", **read_kwargs, encoding='ISO-8859-1', low_memory=False)
+    else:
+        raise ValueError(f"Unsupported file format for {file_path}")
+
+# ========== MANIFEST ==========
+def _manifest_path():
+    return os.path.join(CACHE_DIR, MANIFEST_FILE)
+
+def load_manifest():
+    try:
+        with open(_manifest_path(), "r", encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{_manifest_path()}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, _manifest_path())
+
+def file_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _kwargs_digest(read_kwargs):
+    if not read_kwargs:
+        return 'raw'
+    # repr keeps types such as dtype={'col': str} stable across runs
+    return hashlib.sha256(repr(sorted(read_kwargs.items())).encode()).hexdigest()[:16]
+
+def _entry_files(entry):
+    # A None variant marks a frame that is not cacheable
+    return [os.path.join(CACHE_DIR, name) for name in entry.get('variants', {}).values() if name]
+
+def source_entry(file_path, manifest):
+    """Return the manifest entry for file_path, rehashing only when size or mtime changed."""
+    key = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    entry = manifest.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry
+
+    sha = file_hash(file_path)
+    if entry and entry['sha256'] == sha:
+        entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        return entry
+
+    # Source contents changed: drop the stale columnar copies
+    if entry:
+        for path in _entry_files(entry):
+            if os.path.exists(path):
+                os.remove(path)
+    entry = {'sha256': sha, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'variants': {}}
+    manifest[key] = entry
+    return entry
+
+# ========== ARROW IO ==========
+def _to_arrow(df):
+    """The frame as an Arrow table, or None if Arrow can't hold it unchanged."""
+    import pyarrow as pa
+
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+def write_arrow(table, path):
+    import pyarrow as pa
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def read_arrow(path):
+    """Memory-map an Arrow IPC file; column buffers are paged in lazily by the OS."""
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+# ========== CACHED LOADING ==========
+def _cached(file_path, read_kwargs):
+    """(memory-mapped table, None) for a cacheable file, else (None, the raw frame)."""
+    manifest = load_manifest()
+    entry = source_entry(file_path, manifest)
+    variant = _kwargs_digest(read_kwargs)
+    if variant in entry['variants'] and entry['variants'][variant] is None:
+        save_manifest(manifest)
+        return None, read_raw(file_path, **read_kwargs)
+    name = entry['variants'].get(variant)
+    if name and os.path.exists(os.path.join(CACHE_DIR, name)):
+        save_manifest(manifest)
+        return read_arrow(os.path.join(CACHE_DIR, name)), None
+
+    start = time.perf_counter()
+    df = read_raw(file_path, **read_kwargs)
+    table = _to_arrow(df)
+    if table is None:
+        # Storing it would turn e.g. numeric cells of a text column into strings
+        entry['variants'][variant] = None
+        save_manifest(manifest)
+        print(f"Not caching {os.path.basename(file_path)}: it has mixed-type columns")
+        return None, df
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    name = f"{entry['sha256']}-{variant}.arrow"
+    write_arrow(table, os.path.join(CACHE_DIR, name))
+    entry['variants'][variant] = name
+    save_manifest(manifest)
+    print(f"Cached {os.path.basename(file_path)} as Arrow in {time.perf_counter() - start:.2f}s")
+    return read_arrow(os.path.join(CACHE_DIR, name)), None
+
+def cached_table(file_path, **read_kwargs):
+    """Return the memory-mapped Arrow table for file_path, converting it on first use.
+
+    None if the file is not cacheable; read it with read_raw instead.
+    """
+    return _cached(file_path, read_kwargs)[0]
+
+def peek_cached_table(file_path):
+    """Return the cached raw-variant table if it is present and fresh, without converting."""
+    manifest = load_manifest()
+    entry = manifest.get(os.path.abspath(file_path))
+    if not entry or not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+        return None
+    name = entry['variants'].get('raw')
+    if not name or not os.path.exists(os.path.join(CACHE_DIR, name)):
+        return None
+    return read_arrow(os.path.join(CACHE_DIR, name))
+
+def load_dataset(file_path, use_cache=True, **read_kwargs):
+    if not use_cache:
+        return read_raw(file_path, **read_kwargs)
+    table, df = _cached(file_path, read_kwargs)
+    return df if table is None else table.to_pandas()
+
+# ========== CLI ==========
+def _dataset_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(SUPPORTED_EXTENSIONS):
+                    yield os.path.join(path, name)
+        elif path.endswith(SUPPORTED_EXTENSIONS):
+            yield path
+
+def warm(paths):
+    for file_path in _dataset_files(paths):
+        try:
+            cached_table(file_path)
+        except Exception as e:
+            print(f"Error caching {file_path}: {e}")
+
+def prune(drop_all=False):
+    """Remove entries whose source is gone or changed, plus files no entry references."""
+    manifest = load_manifest()
+    for key in list(manifest):
+        entry = manifest[key]
+        stale = drop_all or not os.path.exists(key)
+        if not stale:
+            stat = os.stat(key)
+            stale = entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns
+        if stale:
+            for path in _entry_files(entry):
+                if os.path.exists(path):
+                    os.remove(path)
+            del manifest[key]
+            print(f"Pruned {key}")
+
+    referenced = {os.path.basename(p) for entry in manifest.values() for p in _entry_files(entry)}
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name != MANIFEST_FILE and name not in referenced:
+                os.remove(os.path.join(CACHE_DIR, name))
+                print(f"Removed orphaned {name}")
+    save_manifest(manifest)
+
+def status():
+    manifest = load_manifest()
+    total = 0
+    for key, entry in sorted(manifest.items()):
+        size = sum(os.path.getsize(p) for p in _entry_files(entry) if os.path.exists(p))
+        total += size
+        print(f"{key}: {len(entry['variants'])} variant(s), {size / 1e6:.1f} MB cached, sha256 {entry['sha256'][:12]}")
+    print(f"Total cache size: {total / 1e6:.1f} MB in {CACHE_DIR}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm or prune the columnar cache of raw state extracts.")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    warm_cmd = commands.add_parser('warm', help="convert source files (or directories) to Arrow")
+    warm_cmd.add_argument('paths', nargs='+')
+    prune_cmd = commands.add_parser('prune', help="drop entries for changed or missing sources")
+    prune_cmd.add_argument('--all', action='store_true', help="empty the whole cache")
+    commands.add_parser('status', help="list cached sources")
+    args = parser.parse_args()
+
+    CACHE_DIR = args.cache_dir
+    if args.command == 'warm':
+        warm(args.paths)
+    elif args.command == 'prune':
+        prune(drop_all=args.all)
+    else:
+        status()
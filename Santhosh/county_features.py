@@ -0,0 +1,87 @@
+# County x year feature table for county_level_prediction, computed from crash rows
+# with native reductions only. Columns are read as float arrays, so a missing sex
+# or severity counts as "not male" / "not fatal", as it does for the float columns
+# read_sql returns from MySQL. test_county_features.py checks both paths against the
+# original lambda-based groupby.
+import numpy as np
+import pandas as pd
+
+GROUP_KEYS = ['county_name', 'year']
+FEATURE_COLUMNS = ['total_crashes', 'opioid_crashes', 'avg_driver_age', 'prop_male',
+                   'fatal_crash_rate', 'serious_injury_rate', 'avg_severity_score']
+
+def _values(df, column):
+    return df[column].to_numpy(dtype=float, na_value=np.nan)
+
+def _indicators(df):
+    """Float indicator / value columns every feature is a plain sum or mean of."""
+    opioid = _values(df, 'opioid_flag')
+    age = _values(df, 'driver_age')
+    severity = _values(df, 'severity_level')
+    return {
+        'total': ~np.isnan(opioid),
+        'opioid': np.nan_to_num(opioid),
+        'age': np.nan_to_num(age),
+        'age_n': ~np.isnan(age),
+        'male': _values(df, 'driver_sex') == 0,
+        'fatal': severity == 1,
+        'serious': severity == 2,
+        'severity': np.nan_to_num(severity),
+        'severity_n': ~np.isnan(severity),
+    }
+
+def _features(keys, size, sums, opioid_dtype):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        features = pd.DataFrame({
+            'total_crashes': sums['total'].astype(np.int64),
+            'opioid_crashes': sums['opioid'].astype(opioid_dtype),
+            'avg_driver_age': np.where(sums['age_n'] > 0, sums['age'] / sums['age_n'], np.nan),
+            'prop_male': sums['male'] / size,
+            'fatal_crash_rate': sums['fatal'] / size,
+            'serious_injury_rate': sums['serious'] / size,
+            'avg_severity_score': np.where(sums['severity_n'] > 0, sums['severity'] / sums['severity_n'], np.nan),
+        })
+    return pd.concat([keys.reset_index(drop=True), features], axis=1)
+
+def _opioid_dtype(df):
+    return np.int64 if pd.api.types.is_integer_dtype(df['opioid_flag'].dtype) else np.float64
+
+# ========== GROUPBY PATH ==========
+def county_features_groupby(df):
+    """One native groupby sum over the indicator columns."""
+    indicators = pd.DataFrame({name: values.astype(float) for name, values in _indicators(df).items()})
+    indicators['size'] = 1.0
+    for key in GROUP_KEYS:
+        indicators[key] = df[key].to_numpy()
+    sums = indicators.groupby(GROUP_KEYS, sort=True).sum()
+    return _features(sums.index.to_frame(index=False), sums['size'].to_numpy(),
+                     {name: sums[name].to_numpy() for name in sums.columns}, _opioid_dtype(df))
+
+# ========== BINCOUNT PATH ==========
+def county_features_bincount(df):
+    """Integer-code county and year, then one np.bincount per indicator."""
+    county_codes, counties = pd.factorize(df['county_name'], sort=True)
+    year_codes, years = pd.factorize(df['year'], sort=True)
+    cells = county_codes.astype(np.int64) * len(years) + year_codes
+    # Rows with a missing county or year drop out, as in groupby
+    valid = (county_codes >= 0) & (year_codes >= 0)
+    keep = slice(None) if valid.all() else valid
+    cells = cells[keep]
+    n_cells = len(counties) * len(years)
+
+    size = np.bincount(cells, minlength=n_cells)
+    present = np.flatnonzero(size)
+    sums = {
+        name: np.bincount(cells, weights=values[keep], minlength=n_cells)[present]
+        for name, values in _indicators(df).items()
+    }
+    keys = pd.DataFrame({
+        'county_name': np.asarray(counties)[present // len(years)],
+        'year': np.asarray(years)[present % len(years)],
+    })
+    return _features(keys, size[present], sums, _opioid_dtype(df))
+
+def county_features(df, method='bincount'):
+    if method == 'bincount':
+        return county_features_bincount(df)
+    return county_features_groupby(df)
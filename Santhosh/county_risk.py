@@ -0,0 +1,84 @@
+# Scoring stage between the county-level models and the pres/ simulations.
+# The county model each state's last training run used scores every county-year in
+# that state's rollup, and the results go into one compact table (state and
+# county as categoricals, int16 year, float32 risk) that pres/main.py loads and
+# simulates in bulk. States without a registered model fall back to the
+# county_scores.csv written when the model was fitted.
+#
+#   python Santhosh/county_risk.py                # score PA, SC and TN
+#   python Santhosh/county_risk.py --states pa sc --model XGBoost
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from crash_data import load_rollup
+from feature_store import MISSING_VALUE
+from model_registry import latest_entry, load_fit, latest_county_scores
+from rollup import county_year_summary
+
+RISK_TABLE_PATH = './scripts/pred/county_risk.parquet'
+STATES = ['pa', 'sc', 'tn']
+
+def compact_risk_table(df):
+    """state, county_name, year, risk with the narrowest dtypes that hold them."""
+    return pd.DataFrame({
+        'state': df['state'].astype('category'),
+        'county_name': df['county_name'].astype('category'),
+        'year': df['year'].astype(np.int16),
+        'risk': df['risk'].astype(np.float32),
+    })
+
+# ========== SCORING ==========
+def score_state(prefix, model='RandomForest'):
+    """Risk score of every county-year of a state from the county model its last run used, or None."""
+    entry = latest_entry(prefix, 'county', model)
+    if entry is None:
+        scores = latest_county_scores(prefix, model)
+        return None if scores is None else scores.assign(state=prefix.upper())
+
+    fitted = load_fit(entry['key'])['model']
+    summary = county_year_summary(load_rollup(prefix))
+    X = summary[entry['features']].to_numpy(dtype=np.float32, na_value=np.nan)
+    X[np.isnan(X)] = MISSING_VALUE
+    return pd.DataFrame({
+        'state': prefix.upper(),
+        'county_name': summary['county_name'],
+        'year': summary['year'],
+        'risk': fitted.predict_proba(X)[:, 1],
+    })
+
+def score_county_risk(states=STATES, model='RandomForest', path=RISK_TABLE_PATH):
+    start = time.perf_counter()
+    frames = []
+    for prefix in states:
+        scores = score_state(prefix, model)
+        if scores is None:
+            print(f"No registered {model} county model for {prefix.upper()}; skipping.")
+            continue
+        frames.append(scores)
+    if not frames:
+        return None
+    table = compact_risk_table(pd.concat(frames, ignore_index=True))
+    table.to_parquet(path, index=False)
+    print(f"Scored {len(table):,} county-years in {table['state'].nunique()} states in {time.perf_counter() - start:.2f}s -> {path}")
+    return table
+
+# ========== CONSUMERS ==========
+def load_risk_table(path=RISK_TABLE_PATH):
+    try:
+        return pd.read_parquet(path)
+    except FileNotFoundError:
+        return None
+
+def latest_year_risk(table):
+    """One row per state and county: its most recent scored year."""
+    latest = table.sort_values('year', kind='stable').drop_duplicates(['state', 'county_name'], keep='last')
+    return latest.sort_values(['state', 'county_name']).reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every county-year with the registered county models.")
+    parser.add_argument('--states', nargs='+', default=STATES)
+    parser.add_argument('--model', default='RandomForest')
+    args = parser.parse_args()
+    score_county_risk(args.states, args.model)
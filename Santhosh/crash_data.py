@@ -0,0 +1,103 @@
+# Shared read path for the harmonized {prefix}_processed tables.
+# desc/, pred/ and pres/ scripts all fetch through load_processed(), which keeps
+# one pooled backend per state database and one projected DataFrame per state,
+# so a reporting run reads each processed table once.
+import os
+import time
+from backends import DEFAULT_BACKEND, connect_backend
+from rollup import age_rollup_from_frame, age_rollup_table, rollup_from_frame, rollup_table
+
+# ========== DATABASE CONNECTION ==========
+MYSQL_CONFIG = {
+    'host': 'localhost',
+    'port': 3306,
+    'user': 'root',
+    'password': 'Ranchero0',
+}
+
+# Union of the columns the descriptive and predictive scripts use
+ANALYSIS_COLUMNS = ['year', 'county_name', 'severity_level', 'driver_age', 'driver_sex', 'opioid_flag']
+
+# CRASH_USE_ROLLUP=0 makes consumers aggregate crash rows again instead of reading {prefix}_rollup
+USE_ROLLUP = os.environ.get('CRASH_USE_ROLLUP', '1') == '1'
+
+_backends = {}
+_frames = {}
+_rollups = {}
+_age_rollups = {}
+
+def get_backend(prefix, kind=DEFAULT_BACKEND):
+    """Return the shared backend (one engine and connection pool) for a state database."""
+    key = (prefix, kind)
+    if key not in _backends:
+        _backends[key] = connect_backend(kind, f"{prefix}_crash_db", mysql_config=MYSQL_CONFIG)
+    return _backends[key]
+
+def _column_sql(backend, column):
+    if column == 'year':
+        return f"{backend.year_of('crash_date')} AS year"
+    return column
+
+# ========== PROCESSED TABLE FETCH ==========
+def load_processed(prefix, columns=None):
+    """Return the requested columns of {prefix}_processed, querying the database at most once per run.
+
+    The first call fetches ANALYSIS_COLUMNS (plus anything else asked for);
+    later calls are served from memory unless they need a column not yet fetched.
+    """
+    columns = list(columns or ANALYSIS_COLUMNS)
+    cached = _frames.get(prefix)
+    if cached is None or not set(columns) <= set(cached.columns):
+        known = list(cached.columns) if cached is not None else []
+        wanted = list(dict.fromkeys(ANALYSIS_COLUMNS + known + columns))
+        backend = get_backend(prefix)
+        start = time.perf_counter()
+        cached = backend.read_sql(f"SELECT {', '.join(_column_sql(backend, c) for c in wanted)} FROM {prefix}_processed")
+        _frames[prefix] = cached
+        print(f"Loaded {prefix}_processed: {len(cached):,} rows x {len(wanted)} columns in {time.perf_counter() - start:.2f}s")
+    return cached[columns]
+
+def iter_processed(prefix, columns, batch_rows):
+    """Yield columns of {prefix}_processed in DataFrames of at most batch_rows rows, without caching them."""
+    backend = get_backend(prefix)
+    query = f"SELECT {', '.join(_column_sql(backend, c) for c in columns)} FROM {prefix}_processed"
+    yield from backend.iter_batches(query, batch_rows)
+
+def _load_cells(cache, prefix, table, from_frame):
+    if prefix not in cache:
+        backend = get_backend(prefix)
+        start = time.perf_counter()
+        if backend.table_exists(table):
+            cache[prefix] = backend.read_sql(f"SELECT * FROM {table}")
+        else:
+            print(f"{table} not found; aggregating {prefix}_processed instead")
+            cache[prefix] = from_frame(load_processed(prefix))
+        print(f"Loaded {table}: {len(cache[prefix]):,} cells in {time.perf_counter() - start:.2f}s")
+    return cache[prefix]
+
+def load_rollup(prefix):
+    """Return the {prefix}_rollup cells, memoized like load_processed.
+
+    Databases harmonized before the rollup existed fall back to computing the
+    same cells from the processed rows.
+    """
+    return _load_cells(_rollups, prefix, rollup_table(prefix), rollup_from_frame)
+
+def load_age_rollup(prefix):
+    """Return the exact per-age counts of {prefix}_age_rollup, with the same fallback."""
+    return _load_cells(_age_rollups, prefix, age_rollup_table(prefix), age_rollup_from_frame)
+
+def clear_cache(prefix=None):
+    for cache in (_frames, _rollups, _age_rollups):
+        if prefix:
+            cache.pop(prefix, None)
+        else:
+            cache.clear()
+
+def close_all():
+    for backend in _backends.values():
+        backend.dispose()
+    _backends.clear()
+    _frames.clear()
+    _rollups.clear()
+    _age_rollups.clear()
@@ -1,52 +1,108 @@
 import os
-import pandas as pd
+import sys
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sqlalchemy import create_engine, text
+
+# Shared modules (crash_data, backends) live one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crash_data import USE_ROLLUP, get_backend, load_age_rollup, load_processed, load_rollup
 
 # Ensure directories exist
 os.makedirs("./scripts/desc/figures", exist_ok=True)
 os.makedirs("./scripts/desc/statistics", exist_ok=True)
 
-# ========== DATABASE CONNECTION ==========
-MYSQL_CONFIG = {
-    'host': 'localhost',
-    'port': 3306,
-    'user': 'root',
-    'password': 'Ranchero0',
-}
-
-def connect_database(DB_NAME):
-    url = f"mysql+pymysql://{MYSQL_CONFIG['user']}:{MYSQL_CONFIG['password']}@{MYSQL_CONFIG['host']}:{MYSQL_CONFIG['port']}/{DB_NAME}"
-    engine = create_engine(url, pool_recycle=3600, future=True)
-    return engine
+# CRASH_STATS_IN_DB=1 computes the summary with GROUP BY queries instead of fetching crash rows
+AGGREGATE_IN_DB = os.environ.get('CRASH_STATS_IN_DB', '0') == '1'
+OPIOID_FATAL_SERIOUS = "opioid_flag = 1 AND severity_level IN (1, 2)"
 
 # ========== FUNCTION 1: Generate Statistics ==========
-def generate_opioid_crash_statistics(dbPrefix):
-    engine = connect_database(f"{dbPrefix}_crash_db")
-    query = text(f"""
-        SELECT 
-            YEAR(crash_date) AS year, 
-            county_name, 
-            severity_level,
-            driver_age,
-            driver_sex
-        FROM {dbPrefix}_processed
-        WHERE opioid_flag = 1
-          AND severity_level IN (1, 2)
+def describe_histogram(values, counts):
+    """Series.describe() of the data a (value, count) histogram stands for, without expanding it."""
+    order = np.argsort(values)
+    values, counts = np.asarray(values, dtype=float)[order], np.asarray(counts, dtype=float)[order]
+    n = counts.sum()
+    if n == 0:
+        return {'count': 0.0, 'mean': np.nan, 'std': np.nan, 'min': np.nan, '25%': np.nan, '50%': np.nan, '75%': np.nan, 'max': np.nan}
+    mean = (values * counts).sum() / n
+    std = np.sqrt((counts * (values - mean) ** 2).sum() / (n - 1)) if n > 1 else np.nan
+    # Same linear interpolation as Series.quantile: position q * (n - 1) in the sorted data
+    upper_index = np.cumsum(counts) - 1
+    def quantile(q):
+        position = q * (n - 1)
+        lower = values[np.searchsorted(upper_index, np.floor(position))]
+        upper = values[np.searchsorted(upper_index, np.ceil(position))]
+        return lower + (position - np.floor(position)) * (upper - lower)
+    summary = {'count': n, 'mean': mean, 'std': std, 'min': values[0], '25%': quantile(0.25), '50%': quantile(0.5), '75%': quantile(0.75), 'max': values[-1]}
+    return {key: float(value) for key, value in summary.items()}
+
+def opioid_summary_in_db(dbPrefix):
+    """Year x county counts, an age histogram and sex counts, aggregated by the database."""
+    backend = get_backend(dbPrefix)
+    table = f"{dbPrefix}_processed"
+    year = backend.year_of('crash_date')
+    counts = backend.read_sql(f"""
+        SELECT {year} AS year, county_name, COUNT(*) AS count
+        FROM {table}
+        WHERE {OPIOID_FATAL_SERIOUS}
+        GROUP BY {year}, county_name
     """)
-    
-    with engine.connect() as conn:
-        df = pd.read_sql(query, conn)
+    ages = backend.read_sql(f"SELECT driver_age, COUNT(*) AS n FROM {table} WHERE {OPIOID_FATAL_SERIOUS} AND driver_age IS NOT NULL GROUP BY driver_age")
+    sexes = backend.read_sql(f"SELECT driver_sex, COUNT(*) AS n FROM {table} WHERE {OPIOID_FATAL_SERIOUS} AND driver_sex IS NOT NULL GROUP BY driver_sex")
+    print(f"Fetched {len(counts) + len(ages) + len(sexes)} summary rows for {table}")
+
+    summary = {
+        "Total Cases": int(counts['count'].sum()),
+        "Cases by Year": counts.dropna(subset=['year']).groupby('year')['count'].sum().sort_index().to_dict(),
+        "Top 10 Counties": counts.groupby('county_name')['count'].sum().sort_values(ascending=False, kind='stable').head(10).to_dict(),
+        "Driver Age Summary": describe_histogram(ages['driver_age'], ages['n']),
+        "Driver Sex Distribution": sexes.set_index('driver_sex')['n'].sort_values(ascending=False, kind='stable').to_dict(),
+    }
+    return summary, counts
+
+def opioid_summary_from_rollup(dbPrefix):
+    """The same summary read off the {prefix}_rollup and {prefix}_age_rollup cells built during harmonization."""
+    rollup = load_rollup(dbPrefix)
+    cells = rollup[(rollup['opioid_flag'] == 1) & rollup['severity_level'].isin([1, 2])]
+    counts = cells.groupby(['year', 'county_name'], dropna=False)['n'].sum().reset_index(name='count')
+    age_cells = load_age_rollup(dbPrefix)
+    age_cells = age_cells[(age_cells['opioid_flag'] == 1) & age_cells['severity_level'].isin([1, 2])]
+    ages = age_cells.groupby('driver_age')['n'].sum().reset_index()
+    sexes = cells.groupby('driver_sex')['n'].sum()
 
-    # Save summary statistics
     summary = {
-        "Total Cases": len(df),
-        "Cases by Year": df['year'].value_counts().sort_index().to_dict(),
-        "Top 10 Counties": df['county_name'].value_counts().head(10).to_dict(),
-        "Driver Age Summary": df['driver_age'].describe().to_dict(),
-        "Driver Sex Distribution": df['driver_sex'].value_counts().to_dict()
+        "Total Cases": int(counts['count'].sum()),
+        "Cases by Year": counts.dropna(subset=['year']).groupby('year')['count'].sum().sort_index().to_dict(),
+        "Top 10 Counties": counts.groupby('county_name')['count'].sum().sort_values(ascending=False, kind='stable').head(10).to_dict(),
+        "Driver Age Summary": describe_histogram(ages['driver_age'], ages['n']),
+        "Driver Sex Distribution": sexes.sort_values(ascending=False, kind='stable').to_dict(),
     }
+    return summary, counts
+
+# in_database (CRASH_STATS_IN_DB=1) wins over the rollup, which is on by default;
+# CRASH_USE_ROLLUP=0 with neither set falls back to filtering the crash rows
+def generate_opioid_crash_statistics(dbPrefix, in_database=AGGREGATE_IN_DB, use_rollup=USE_ROLLUP):
+    if in_database:
+        if use_rollup:
+            print(f"{dbPrefix}: in-database aggregation requested, skipping {dbPrefix}_rollup")
+        # Only the county x year grid travels; the plots below accept its count column
+        summary, df = opioid_summary_in_db(dbPrefix)
+    elif use_rollup:
+        summary, df = opioid_summary_from_rollup(dbPrefix)
+    else:
+        # Filter the shared per-state load instead of querying the table again
+        processed = load_processed(dbPrefix)
+        mask = (processed['opioid_flag'] == 1) & processed['severity_level'].isin([1, 2])
+        df = processed.loc[mask, ['year', 'county_name', 'severity_level', 'driver_age', 'driver_sex']].reset_index(drop=True)
+
+        # Save summary statistics
+        summary = {
+            "Total Cases": len(df),
+            "Cases by Year": df['year'].value_counts().sort_index().to_dict(),
+            "Top 10 Counties": df['county_name'].value_counts().head(10).to_dict(),
+            "Driver Age Summary": df['driver_age'].describe().to_dict(),
+            "Driver Sex Distribution": df['driver_sex'].value_counts().to_dict()
+        }
 
     # Save to file
     stats_path = f"./scripts/desc/statistics/{dbPrefix}_opioid_fatal_serious_stats.txt"
@@ -62,7 +118,10 @@ def generate_opioid_crash_statistics(dbPrefix):
 
 # ========== FUNCTION 2: Plot Yearly Trend ==========
 def plot_yearly_trend(df, dbPrefix):
-    yearly_counts = df.groupby('year').size().reset_index(name='count')
+    if 'count' in df.columns:
+        yearly_counts = df.groupby('year')['count'].sum().reset_index()
+    else:
+        yearly_counts = df.groupby('year').size().reset_index(name='count')
     plt.figure(figsize=(10,6))
     sns.lineplot(data=yearly_counts, x='year', y='count', marker='o', palette=sns.color_palette("viridis", as_cmap=True))
     plt.title(f"{dbPrefix.upper()} - Opioid-Related Fatal and Serious Crashes Over Years")
@@ -79,7 +138,10 @@ def plot_yearly_trend(df, dbPrefix):
 
 # ========== FUNCTION 3: Plot Top Counties ==========
 def plot_top_counties(df, dbPrefix):
-    top_counties = df['county_name'].value_counts().head(10).reset_index()
+    if 'count' in df.columns:
+        top_counties = df.groupby('county_name')['count'].sum().sort_values(ascending=False, kind='stable').head(10).reset_index()
+    else:
+        top_counties = df['county_name'].value_counts().head(10).reset_index()
     top_counties.columns = ['county_name', 'count']
     plt.figure(figsize=(12,8))
     sns.barplot(data=top_counties, x='county_name', y='count', palette=sns.color_palette("viridis"), hue='county_name')
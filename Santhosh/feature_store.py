@@ -0,0 +1,53 @@
+# Compact feature matrices for the prediction scripts.
+# Features are written once into a C-contiguous float32 array (optionally a .npy
+# memory map that worker processes share), with the rows already permuted into
+# train-then-test order. The train/test sets are then plain slices (views),
+# and they hold the same rows in the same order as
+# train_test_split(..., test_size, random_state) would produce.
+import resource
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+MISSING_VALUE = -1
+
+def split_order(n_rows, test_size=0.3, random_state=42):
+    """Row order putting train_test_split's train rows first, then its test rows."""
+    train_idx, test_idx = train_test_split(np.arange(n_rows), test_size=test_size, random_state=random_state)
+    return np.concatenate([train_idx, test_idx]), len(train_idx)
+
+def build_feature_matrix(df, features, target, test_size=0.3, random_state=42, path=None):
+    """Return (X float32, y int8, n_train) with rows permuted so train/test are slices.
+
+    Missing feature values become MISSING_VALUE, like fillna(-1). With path the
+    arrays are .npy memory maps (path + '_X.npy' / '_y.npy') instead of RAM.
+    """
+    order, n_train = split_order(len(df), test_size, random_state)
+    if path is None:
+        X = np.empty((len(df), len(features)), dtype=np.float32)
+        y = np.empty(len(df), dtype=np.int8)
+    else:
+        X = np.lib.format.open_memmap(f"{path}_X.npy", mode='w+', dtype=np.float32, shape=(len(df), len(features)))
+        y = np.lib.format.open_memmap(f"{path}_y.npy", mode='w+', dtype=np.int8, shape=(len(df),))
+
+    # One column at a time, so no float64 copy of the whole frame is ever built
+    for j, feature in enumerate(features):
+        values = df[feature].to_numpy(dtype=np.float32, na_value=np.nan)[order]
+        values[np.isnan(values)] = MISSING_VALUE
+        X[:, j] = values
+    y[:] = df[target].to_numpy(dtype=np.int8)[order]
+
+    if path is not None:
+        X.flush()
+        y.flush()
+    return X, y, n_train
+
+def load_feature_matrix(path):
+    """Read-only memory maps of a matrix written by build_feature_matrix(path=...)."""
+    return np.load(f"{path}_X.npy", mmap_mode='r'), np.load(f"{path}_y.npy", mmap_mode='r')
+
+def train_test_views(X, y, n_train):
+    return X[:n_train], X[n_train:], y[:n_train], y[n_train:]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,401 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import pandas as pd
+from sqlalchemy import text
+from cache import peek_cached_table
+
+# ========== LOADER CONFIG ==========
+CHUNK_SIZE = 100000     # rows per chunk on the chunked path
+SAMPLE_ROWS = 100000    # rows used to infer the table schema
+MAX_WORKERS = min(5, os.cpu_count() or 1)
+
+# ========== UTILITY FUNCTIONS ==========
+def stream_csv_chunks(file_path, delimiter=',', encoding=None, chunksize=CHUNK_SIZE):
+    """Yield bounded DataFrame chunks from a CSV or pipe-delimited file."""
+    reader = pd.read_csv(file_path, delimiter=delimiter, encoding=encoding, chunksize=chunksize, low_memory=False)
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+def iter_dataset_chunks(file_path, chunksize=CHUNK_SIZE, **read_kwargs):
+    """Yield bounded chunks from any supported dataset file (CSV, pipe-delimited TXT or XLSX)."""
+    # A warm columnar cache entry is sliced instead of re-parsing the source
+    table = peek_cached_table(file_path)
+    if table is not None:
+        for offset in range(0, table.num_rows, chunksize):
+            yield _cast_frame(table.slice(offset, chunksize).to_pandas(), read_kwargs.get('dtype'))
+        return
+    if file_path.endswith(".csv"):
+        yield from pd.read_csv(file_path, chunksize=chunksize, low_memory=False, **read_kwargs)
+    elif file_path.endswith(".txt"):
+        yield from pd.read_csv(file_path, delimiter="|", encoding='ISO-8859-1', chunksize=chunksize, low_memory=False, **read_kwargs)
+    elif file_path.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, ())
+            columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == chunksize:
+                    yield _xlsx_frame(batch, columns, read_kwargs.get('dtype'))
+                    batch = []
+            if batch:
+                yield _xlsx_frame(batch, columns, read_kwargs.get('dtype'))
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Unsupported file format for {file_path}")
+
+def _xlsx_frame(rows, columns, dtype=None):
+    return _cast_frame(pd.DataFrame(rows, columns=columns).infer_objects(), dtype)
+
+def _cast_frame(df, dtype=None):
+    for col, col_type in (dtype or {}).items():
+        if col in df.columns:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(col_type))
+    return df
+
+def sample_schema(file_path, delimiter=',', encoding=None, nrows=SAMPLE_ROWS):
+    """Return an empty DataFrame carrying the columns and dtypes inferred from the first nrows."""
+    return pd.read_csv(file_path, delimiter=delimiter, encoding=encoding, nrows=nrows, low_memory=False).head(0)
+
+def detect_line_terminator(file_path):
+    with open(file_path, 'rb') as f:
+        first_line = f.readline()
+    return '\\r\\n' if first_line.endswith(b'\r\n') else '\\n'
+
+def quote_identifier(name):
+    return "`" + str(name).replace("`", "``") + "`"
+
+def parquet_is_fresh(parquet_dir, csv_files):
+    """True if parquet_dir exists and was written after every one of csv_files."""
+    if not os.path.isdir(parquet_dir):
+        return False
+    parts = [os.path.join(root, f) for root, _, files in os.walk(parquet_dir) for f in files if f.endswith('.parquet')]
+    if not parts:
+        return False
+    newest_csv = max((os.path.getmtime(f) for f in csv_files if os.path.exists(f)), default=0)
+    return max(os.path.getmtime(f) for f in parts) >= newest_csv
+
+# ========== BULK PATHS ==========
+def _load_mysql(engine, table_name, file_path, schema, if_exists, delimiter, encoding):
+    # The schema comes from a bounded sample; the rows themselves never pass through
+    # pandas. LOAD DATA streams the file to the server, and NULLIF maps empty fields
+    # to NULL the same way read_csv maps them to NaN.
+    schema.to_sql(table_name, con=engine, if_exists=if_exists, index=False)
+
+    charset = 'latin1' if encoding and encoding.upper() in ('ISO-8859-1', 'LATIN1', 'LATIN-1') else 'utf8mb4'
+    variables = [f"@c{i}" for i in range(len(schema.columns))]
+    assignments = ", ".join(f"{quote_identifier(col)} = NULLIF({var}, '')" for col, var in zip(schema.columns, variables))
+    query = f"""
+        LOAD DATA LOCAL INFILE '{os.path.abspath(file_path).replace("'", "''")}'
+        INTO TABLE {quote_identifier(table_name)}
+        CHARACTER SET {charset}
+        FIELDS TERMINATED BY '{delimiter}' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+        LINES TERMINATED BY '{detect_line_terminator(file_path)}'
+        IGNORE 1 LINES
+        ({", ".join(variables)})
+        SET {assignments}
+    """
+    with engine.begin() as conn:
+        result = conn.execute(text(query))
+    return result.rowcount
+
+def _load_parquet(engine, table_name, dataset_dir, if_exists, years, chunksize):
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive')
+    scan_filter = ds.field('year').isin(list(years)) if years is not None else None
+    # The year partition column only exists in the merge layout, not in the source tables
+    columns = [name for name in dataset.schema.names if name != 'year']
+    rows = 0
+    for batch in dataset.to_batches(columns=columns, filter=scan_filter, batch_size=chunksize):
+        chunk = batch.to_pandas()
+        mode = if_exists if rows == 0 else 'append'
+        if engine.dialect.name == 'mysql':
+            # Reuse the LOAD DATA path through a bounded temp file per batch
+            with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as tmp:
+                chunk.to_csv(tmp, index=False)
+            try:
+                _load_mysql(engine, table_name, tmp.name, chunk.head(0), mode, ',', None)
+            finally:
+                os.remove(tmp.name)
+        else:
+            with engine.begin() as conn:
+                chunk.to_sql(table_name, con=conn, if_exists=mode, index=False)
+        rows += len(chunk)
+    return rows
+
+def _load_duckdb(engine, table_name, file_path, if_exists, delimiter, encoding):
+    source = (
+        f"read_csv('{os.path.abspath(file_path).replace(chr(39), chr(39) * 2)}', delim='{delimiter}', header=true"
+        + (", encoding='latin-1'" if encoding else "")
+        + ")"
+    )
+    with engine.begin() as conn:
+        if if_exists == 'replace':
+            conn.execute(text(f'CREATE OR REPLACE TABLE "{table_name}" AS SELECT * FROM {source}'))
+            return conn.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+        exists = conn.execute(
+            text("SELECT COUNT(*) FROM information_schema.tables WHERE table_name = :t"), {'t': table_name}
+        ).scalar()
+        if not exists:
+            conn.execute(text(f'CREATE TABLE "{table_name}" AS SELECT * FROM {source}'))
+            return conn.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+        return conn.execute(text(f'INSERT INTO "{table_name}" SELECT * FROM {source}')).rowcount
+
+def _load_chunked(engine, table_name, file_path, if_exists, delimiter, encoding, chunksize):
+    # Generic fallback (e.g. SQLite): one chunk in memory at a time, all chunks in a
+    # single transaction so the driver's executemany is not committed per batch.
+    rows = 0
+    with engine.begin() as conn:
+        for chunk in stream_csv_chunks(file_path, delimiter=delimiter, encoding=encoding, chunksize=chunksize):
+            chunk.to_sql(table_name, con=conn, if_exists=if_exists if rows == 0 else 'append', index=False)
+            rows += len(chunk)
+        if rows == 0:
+            sample_schema(file_path, delimiter, encoding).to_sql(table_name, con=conn, if_exists=if_exists, index=False)
+    return rows
+
+# ========== STREAMING LOADER ==========
+def bulk_load_csv(engine, table_name, file_path, if_exists='append', delimiter=',', encoding=None, chunksize=CHUNK_SIZE, schema=None):
+    """Load a delimited file through the database's native bulk path and return throughput stats."""
+    start = time.perf_counter()
+    dialect = engine.dialect.name
+    if dialect == 'mysql':
+        if schema is None:
+            schema = sample_schema(file_path, delimiter, encoding)
+        rows = _load_mysql(engine, table_name, file_path, schema, if_exists, delimiter, encoding)
+    elif dialect == 'duckdb':
+        rows = _load_duckdb(engine, table_name, file_path, if_exists, delimiter, encoding)
+    else:
+        rows = _load_chunked(engine, table_name, file_path, if_exists, delimiter, encoding, chunksize)
+    seconds = time.perf_counter() - start
+
+    size = os.path.getsize(file_path)
+    stats = {
+        'table': table_name,
+        'file': os.path.basename(file_path),
+        'rows': int(rows),
+        'bytes': size,
+        'seconds': seconds,
+        'rows_per_s': rows / seconds if seconds > 0 else float('inf'),
+        'mb_per_s': size / 1e6 / seconds if seconds > 0 else float('inf'),
+    }
+    print(f"Loaded {stats['rows']} rows into {table_name} in {seconds:.2f}s "
+          f"({stats['rows_per_s']:,.0f} rows/s, {stats['mb_per_s']:.1f} MB/s)")
+    return stats
+
+def bulk_load_parquet(engine, table_name, dataset_dir, if_exists='append', years=None, chunksize=CHUNK_SIZE):
+    """Load a year-partitioned Parquet dataset, skipping partitions outside years."""
+    start = time.perf_counter()
+    rows = _load_parquet(engine, table_name, dataset_dir, if_exists, years, chunksize)
+    seconds = time.perf_counter() - start
+    size = dataset_size(dataset_dir, years)
+    stats = {
+        'table': table_name,
+        'file': os.path.basename(dataset_dir.rstrip(os.sep)),
+        'rows': int(rows),
+        'bytes': size,
+        'seconds': seconds,
+        'rows_per_s': rows / seconds if seconds > 0 else float('inf'),
+        'mb_per_s': size / 1e6 / seconds if seconds > 0 else float('inf'),
+    }
+    print(f"Loaded {stats['rows']} rows into {table_name} in {seconds:.2f}s "
+          f"({stats['rows_per_s']:,.0f} rows/s, {stats['mb_per_s']:.1f} MB/s)")
+    return stats
+
+def dataset_size(path, years=None):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        partition = os.path.basename(root)
+        if years is not None and partition.startswith('year=') and partition[5:] not in {str(y) for y in years}:
+            continue
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+def print_throughput_report(stats_list):
+    if not stats_list:
+        return
+    report = pd.DataFrame(stats_list)
+    summary = report.groupby('table', sort=False).agg(
+        files=('file', 'count'),
+        rows=('rows', 'sum'),
+        bytes=('bytes', 'sum'),
+        seconds=('seconds', 'sum'),
+    )
+    summary['mb'] = summary.pop('bytes') / 1e6
+    summary['rows_per_s'] = summary['rows'] / summary['seconds']
+    summary['mb_per_s'] = summary['mb'] / summary['seconds']
+    print("Throughput report:")
+    print(summary.round(2).to_string())
+    return summary
+
+# ========== PARALLEL INGESTION ==========
+def _load_table(engine, table_name, source, schema_futures):
+    start = time.perf_counter()
+    stats = []
+    if 'parquet' in source:
+        print(f"Loading {os.path.basename(source['parquet'])} into {table_name} table...")
+        stats.append(bulk_load_parquet(engine, table_name, source['parquet'], if_exists='replace', years=source.get('years')))
+        return stats, time.perf_counter() - start
+    for i, file_path in enumerate(source['files']):
+        schema = schema_futures[i].result() if schema_futures else None
+        print(f"Loading {os.path.basename(file_path)} into {table_name} table...")
+        stats.append(bulk_load_csv(
+            engine, table_name, file_path,
+            if_exists='replace' if i == 0 else 'append',
+            delimiter=source.get('delimiter', ','),
+            encoding=source.get('encoding'),
+            schema=schema,
+        ))
+    return stats, time.perf_counter() - start
+
+def _source_size(source):
+    if 'parquet' in source:
+        return dataset_size(source['parquet'], source.get('years'))
+    return sum(os.path.getsize(f) for f in source['files'])
+
+def load_tables_parallel(engine, sources, max_workers=MAX_WORKERS):
+    """Load independent tables concurrently.
+
+    sources maps table name -> {'files': [...], 'delimiter': ..., 'encoding': ...}.
+    Schema sampling (the only pandas parsing on the native bulk paths) runs in a
+    process pool; the bulk writes run in threads, each holding its own pooled
+    connection, so the engine's pool_size should be at least max_workers.
+    """
+    if engine.dialect.name == 'sqlite':
+        # SQLite takes a database-wide write lock, concurrent writers only queue up
+        max_workers = 1
+    # Largest tables first so the longest load starts immediately
+    order = sorted(sources, key=lambda t: -_source_size(sources[t]))
+
+    start = time.perf_counter()
+    all_stats, wall_times = [], {}
+    with ProcessPoolExecutor(max_workers=max_workers) as parse_pool, ThreadPoolExecutor(max_workers=max_workers) as write_pool:
+        futures = {}
+        for table in order:
+            source = sources[table]
+            schema_futures = None
+            if engine.dialect.name == 'mysql' and 'parquet' not in source:
+                schema_futures = [
+                    parse_pool.submit(sample_schema, f, source.get('delimiter', ','), source.get('encoding'))
+                    for f in source['files']
+                ]
+            futures[write_pool.submit(_load_table, engine, table, source, schema_futures)] = table
+        for future in as_completed(futures):
+            stats, seconds = future.result()
+            all_stats.extend(stats)
+            wall_times[futures[future]] = seconds
+    total = time.perf_counter() - start
+
+    # Per-table times overlap and include contention between the loads, so they
+    # are not a serial baseline; time a max_workers=1 run for that
+    print("Per-table wall time (concurrent):")
+    for table in order:
+        print(f"  {table:<16} {wall_times[table]:8.2f}s")
+    print(f"Total wall time {total:.2f}s with {max_workers} workers")
+    return all_stats, wall_times
+
+# ========== STREAMING MERGE ==========
+def year_from_filename(file_path):
+    match = re.search(r"(20\d{2})", os.path.basename(file_path))
+    if not match:
+        raise ValueError(f"Could not find a year in {file_path}")
+    return int(match.group(1))
+
+class _KindDrift(Exception):
+    """A chunk holds values its column's pinned kind cannot represent."""
+    def __init__(self, column, kind):
+        super().__init__(f"{column} -> {kind}")
+        self.column, self.kind = column, kind
+
+def _parquet_frame(chunk, kinds):
+    # Pin every chunk to the probed dtype kinds so all row groups share one schema;
+    # a value that does not fit raises _KindDrift with the next wider kind
+    chunk = chunk.copy()
+    for col, kind in kinds.items():
+        if kind in ('integer', 'numeric'):
+            try:
+                values = pd.to_numeric(chunk[col])
+            except (ValueError, TypeError):
+                raise _KindDrift(col, 'object')
+            if kind == 'integer':
+                known = values.dropna().astype('float64')
+                if not (known == known.round()).all():
+                    raise _KindDrift(col, 'numeric')
+                chunk[col] = values.astype('Int64')
+            else:
+                chunk[col] = values.astype('float64')
+        elif kind == 'datetime':
+            try:
+                chunk[col] = pd.to_datetime(chunk[col])
+            except (ValueError, TypeError):
+                raise _KindDrift(col, 'object')
+        else:
+            chunk[col] = chunk[col].astype('string')
+    return chunk
+
+def _write_parquet_merge(files, output_path, columns, kinds, read_kwargs, chunksize):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    rows = 0
+    for file_path in files:
+        year = year_from_filename(file_path)
+        stem = os.path.splitext(os.path.basename(file_path))[0].replace(' ', '_')
+        for i, chunk in enumerate(iter_dataset_chunks(file_path, chunksize=chunksize, **read_kwargs)):
+            chunk = chunk[columns]
+            table = pa.Table.from_pandas(_parquet_frame(chunk, kinds), preserve_index=False)
+            table = table.append_column('year', pa.array([year] * len(chunk), pa.int16()))
+            pq.write_to_dataset(table, output_path, partition_cols=['year'], basename_template=f"{stem}-{i}-{{i}}.parquet")
+            rows += len(chunk)
+        print(f"Appended {os.path.basename(file_path)} ({rows} rows so far)")
+    return rows
+
+def stream_merge(files, output_path, schema, read_kwargs=None, output_format='csv', chunksize=CHUNK_SIZE):
+    """Append each file to output_path chunk by chunk; only one chunk is ever held in memory.
+
+    output_format='parquet' writes a hive-partitioned dataset (year=YYYY/...) with the
+    year taken from each input file name, so loads can skip whole years.
+    """
+    read_kwargs = read_kwargs or {}
+    columns = schema['columns']
+    if output_format == 'parquet':
+        # Columns the probe found drifting between files are forced to text; integer
+        # columns stay integers (nullable Int64) instead of widening to float64
+        forced = read_kwargs.get('dtype', {})
+        integers = set(schema.get('integers', ()))
+        kinds = {c: ('object' if c in forced else 'integer' if k == 'numeric' and c in integers else k) for c, k in schema['dtypes'].items()}
+        while True:
+            try:
+                return _write_parquet_merge(files, output_path, columns, kinds, read_kwargs, chunksize)
+            except _KindDrift as drift:
+                # The probe only saw the first rows of one file: widen the column and
+                # rewrite, so every row group keeps one schema
+                print(f"{drift.column} holds values the probe did not see; rewriting it as {drift.kind}")
+                kinds[drift.column] = drift.kind
+    if output_format != 'csv':
+        raise ValueError(f"Unsupported merge output format {output_format}")
+
+    rows = 0
+    header = True
+    for file_path in files:
+        for chunk in iter_dataset_chunks(file_path, chunksize=chunksize, **read_kwargs):
+            chunk = chunk[columns]
+            chunk.to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            rows += len(chunk)
+        print(f"Appended {os.path.basename(file_path)} ({rows} rows so far)")
+    return rows
@@ -1,7 +1,11 @@
 import os
-import pandas as pd
-import pymysql
-from sqlalchemy import create_engine, text
+import gzip
+import time
+import hashlib
+from datetime import datetime
+from sqlalchemy import create_engine
+from backends import DEFAULT_BACKEND, as_backend, connect_backend
+from rollup import refresh_rollup
 
 # ========== MYSQL CONFIG ==========
 MYSQL_CONFIG = {
@@ -19,13 +23,79 @@ def connect_database(DB_NAME):
     engine = create_engine(url, pool_recycle=3600, future=True)
     return engine
 
-def create_pa_processed_table(engine):
-    merge_query = """
-    CREATE OR REPLACE TABLE pa_processed AS
+def state_sources(prefix):
+    # Raw table layout per state, shared with the loaders in *_DB.py
+    if prefix == 'pa':
+        from PA_DB import pa_table_sources
+        return pa_table_sources()
+    if prefix == 'sc':
+        from SC_DB import sc_table_sources
+        return sc_table_sources()
+    from TN_DB import tn_table_sources
+    return tn_table_sources()
+
+def connect_state_backend(prefix, kind=DEFAULT_BACKEND):
+    # MySQL already holds the loaded tables; embedded engines attach the raw files
+    sources = None if kind == 'mysql' else state_sources(prefix)
+    return connect_backend(kind, f"{prefix}_crash_db", mysql_config=MYSQL_CONFIG, sources=sources)
+
+# ========== HARMONIZATION QUERIES ==========
+# grain='person' keeps the original fan-out joins (one row per person / drug test);
+# grain='crash' collapses person- and drug-level rows to one per crash first.
+GRAINS = ('person', 'crash')
+
+def _where(conditions):
+    conditions = [c for c in conditions if c]
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+def _per_crash(table, key, columns, order_by, flags=None):
+    """One row per crash key: the first row by order_by, plus any-match flags over all rows."""
+    flags = flags or {}
+    flag_columns = "".join(f",\n                MAX(CASE WHEN {condition} THEN 1 ELSE 0 END) OVER (PARTITION BY {key}) AS {name}" for name, condition in flags.items())
+    return f"""(
+        SELECT {', '.join([key] + columns + list(flags))}
+        FROM (
+            SELECT {', '.join([key] + columns)}{flag_columns},
+                ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY {order_by}) AS rn
+            FROM {table}
+        ) ranked
+        WHERE rn = 1
+    )"""
+
+# Crash grain: the columns that number a crash's units / persons in each source
+# table, in sort order (names differ between extracts, so the first ones found are
+# used). The primary driver is the lowest-numbered row, as in PA; a recorded age
+# only breaks ties, so the choice never depends on how old anyone is.
+DRIVER_SEQUENCE = {
+    'sc': ('statewide_unit', ['unit_number', 'unit_num', 'unit_nbr', 'unit_no']),
+    'tn': ('person_detail', ['UnitNbr', 'UnitNmb', 'PersonNbr', 'PersonNmb', 'PersonSeqNbr']),
+}
+
+def _sequence_columns(backend, prefix):
+    table, candidates = DRIVER_SEQUENCE[prefix]
+    columns = set(backend.read_sql(f"SELECT * FROM {table} LIMIT 0").columns)
+    return [c for c in candidates if c in columns]
+
+def _driver_order(backend, prefix, age_column):
+    table, candidates = DRIVER_SEQUENCE[prefix]
+    sequence = _sequence_columns(backend, prefix)
+    if not sequence:
+        raise ValueError(f"{table} has none of {candidates}; the crash grain needs a unit or person number to pick the driver")
+    return ", ".join(sequence + [f"CASE WHEN {age_column} IS NULL THEN 1 ELSE 0 END"])
+
+def pa_crash_date(backend):
+    return backend.date_from_year_month('c.CRASH_YEAR', 'c.CRASH_MONTH')
+
+def pa_processed_select(backend, where=None, grain='person'):
+    person = "person"
+    if grain == 'crash':
+        # Primary driver: a driver (PERSON_TYPE 1) before passengers, then the lowest unit
+        person = _per_crash('person', 'CRN', ['AGE', 'SEX'], "CASE WHEN PERSON_TYPE = 1 THEN 0 ELSE 1 END, UNIT_NUM")
+    return f"""
     SELECT
         c.CRN AS crash_id,
         'PA' AS state,
-        STR_TO_DATE(CONCAT(c.CRASH_YEAR, '-', LPAD(c.CRASH_MONTH, 2, '0'), '-01'), '%Y-%m-%d') AS crash_date,
+        {pa_crash_date(backend)} AS crash_date,
         cf.COUNTYFP AS county_fips,
         cf.COUNTYNAME AS county_name,
         c.FATAL_COUNT AS fatalities,
@@ -44,35 +114,47 @@ def create_pa_processed_table(engine):
         END AS driver_sex
     FROM crash c
     LEFT JOIN flag f ON c.CRN = f.CRN
-    LEFT JOIN person p ON c.CRN = p.CRN
+    LEFT JOIN {person} p ON c.CRN = p.CRN
     LEFT JOIN county_fips cf ON c.COUNTY = cf.COUNTYFP
-    ;
+    {_where([where])}
     """
-    with engine.connect() as conn:
-        # Create indexes
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_crash_crn ON crash(CRN);"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_flag_crn ON flag(CRN);"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_person_crn ON person(CRN);"))
-
-        # Merge data into pa_processed table
-        conn.execute(text(merge_query))
-        conn.commit()
-
-def create_sc_processed_table(engine):
-    merge_query = """
-    CREATE OR REPLACE TABLE sc_processed AS
+
+def _fingerprint(backend, year, source, columns):
+    # Every column the select reads goes into the row hash, so any edit changes the year's checksum
+    return f"SELECT {year} AS yr, COUNT(*), {backend.row_hash_sum(columns)} FROM {source} GROUP BY {year}"
+
+def pa_fingerprint_queries(backend):
+    year = f"COALESCE({backend.year_of(pa_crash_date(backend))}, 0)"
+    return [
+        _fingerprint(backend, year, "crash c", ['c.CRN', 'c.CRASH_YEAR', 'c.CRASH_MONTH', 'c.COUNTY', 'c.FATAL_COUNT', 'c.INJURY_COUNT', 'c.MAX_SEVERITY_LEVEL']),
+        _fingerprint(backend, year, "flag f JOIN crash c ON c.CRN = f.CRN", ['f.CRN', 'f.OPIOID_RELATED', 'f.DRUG_RELATED', 'f.ALCOHOL_RELATED']),
+        _fingerprint(backend, year, "person p JOIN crash c ON c.CRN = p.CRN", ['p.CRN', 'p.AGE', 'p.SEX', 'p.PERSON_TYPE', 'p.UNIT_NUM']),
+    ]
+
+def sc_processed_select(backend, where=None, grain='person'):
+    unit = "statewide_unit"
+    opioid, any_drug, alcohol = "u.drug_test_results = 'O'", "u.drug_test_results = 'Y'", "u.alcohol_test_results > 0.0"
+    if grain == 'crash':
+        # Any unit with a positive test flags the crash; the primary driver is the lowest-numbered unit
+        unit = _per_crash('statewide_unit', 'crash_number', ['driver_age', 'driver_sex'], _driver_order(backend, 'sc', 'driver_age'), {
+            'opioid_any': "drug_test_results = 'O'",
+            'drug_any': "drug_test_results = 'Y'",
+            'alcohol_any': "alcohol_test_results > 0.0",
+        })
+        opioid, any_drug, alcohol = "u.opioid_any = 1", "u.drug_any = 1", "u.alcohol_any = 1"
+    return f"""
     SELECT
         s.crash_number AS crash_id,
         'SC' AS state,
-        CAST(s.date AS DATETIME) AS crash_date,
+        {backend.to_datetime('s.date')} AS crash_date,
         cf.COUNTYFP AS county_fips,
         cf.COUNTYNAME AS county_name,
         s.persons_killed AS fatalities,
         s.persons_injured AS injuries,
         (s.persons_killed + s.persons_injured + s.fatal_injury + s.suspected_serious_injury + s.suspected_minor_injury + s.possible_injury + s.no_apparent_injury) AS severity_level,
-        CASE WHEN u.drug_test_results = 'O' THEN 1 ELSE 0 END AS opioid_flag,
-        CASE WHEN u.drug_test_results = 'Y' THEN 1 ELSE 0 END AS any_drug_flag,
-        CASE WHEN u.alcohol_test_results > 0.0 THEN 1 ELSE 0 END AS alcohol_flag,
+        CASE WHEN {opioid} THEN 1 ELSE 0 END AS opioid_flag,
+        CASE WHEN {any_drug} THEN 1 ELSE 0 END AS any_drug_flag,
+        CASE WHEN {alcohol} THEN 1 ELSE 0 END AS alcohol_flag,
         CASE WHEN u.driver_age < 21 THEN 1 ELSE 0 END AS young_driver_flag,
         CASE WHEN u.driver_age >= 65 THEN 1 ELSE 0 END AS mature_driver_flag,
         u.driver_age AS driver_age,
@@ -82,82 +164,363 @@ def create_sc_processed_table(engine):
             ELSE NULL
         END AS driver_sex
     FROM statewide s
-    LEFT JOIN statewide_unit u ON s.crash_number = u.crash_number
-    LEFT JOIN county_fips cf ON TRIM(REPLACE(s.county, 'County', '')) = TRIM(REPLACE(cf.COUNTYNAME, 'County', ''))
-    WHERE cf.STATE = 'SC';
+    LEFT JOIN {unit} u ON s.crash_number = u.crash_number
+    LEFT JOIN county_fips cf ON s.county_key = cf.county_key
+    {_where(["cf.STATE = 'SC'", where])}
+    """
+
+def sc_fingerprint_queries(backend):
+    year = f"COALESCE({backend.year_of(backend.to_datetime('s.date'))}, 0)"
+    return [
+        _fingerprint(backend, year, "statewide s", ['s.crash_number', 's.date', 's.county', 's.persons_killed', 's.persons_injured', 's.fatal_injury',
+                                                    's.suspected_serious_injury', 's.suspected_minor_injury', 's.possible_injury', 's.no_apparent_injury']),
+        _fingerprint(backend, year, "statewide_unit u JOIN statewide s ON s.crash_number = u.crash_number",
+                     ['u.crash_number', 'u.driver_age', 'u.driver_sex', 'u.drug_test_results', 'u.alcohol_test_results']
+                     + [f"u.{c}" for c in _sequence_columns(backend, 'sc')]),
+    ]
+
+def tn_processed_select(backend, where=None, grain='person'):
+    drug, detail, opioid = "person_drug", "person_detail", "pd.DrugTestResultCde = '04'"
+    if grain == 'crash':
+        # Drug tests and person details are collapsed separately, so they no longer multiply each other
+        drug = """(
+        SELECT MstrRecNbrTxt, MAX(CASE WHEN DrugTestResultCde = '04' THEN 1 ELSE 0 END) AS opioid_any
+        FROM person_drug
+        GROUP BY MstrRecNbrTxt
+    )"""
+        # The driver is the first person of the first unit; passengers are listed after
+        detail = _per_crash('person_detail', 'MstrRecNbrTxt', ['AgeNmb', 'GenderTxt'], _driver_order(backend, 'tn', 'AgeNmb'))
+        opioid = "pd.opioid_any = 1"
+    return f"""
+    SELECT
+        c.MstrRecNbrTxt AS crash_id,
+        'TN' AS state,
+        {backend.to_datetime('c.CollisionDte')} AS crash_date,
+        cf.COUNTYFP AS county_fips,
+        cf.COUNTYNAME AS county_name,
+        c.NbrFatalitiesNmb AS fatalities,
+        c.NbrInjuredNmb AS injuries,
+        (c.NbrFatalitiesNmb + c.NbrInjuredNmb) AS severity_level,
+        CASE WHEN {opioid} THEN 1 ELSE 0 END AS opioid_flag,
+        CASE WHEN c.DrugInd = 'Y' THEN 1 ELSE 0 END AS any_drug_flag,
+        CASE WHEN c.AlcoholInd = 'Y' THEN 1 ELSE 0 END AS alcohol_flag,
+        CASE WHEN pd_detail.AgeNmb < 21 THEN 1 ELSE 0 END AS young_driver_flag,
+        CASE WHEN pd_detail.AgeNmb >= 65 THEN 1 ELSE 0 END AS mature_driver_flag,
+        pd_detail.AgeNmb AS driver_age,
+        CASE 
+            WHEN pd_detail.GenderTxt = 'M' THEN 0
+            WHEN pd_detail.GenderTxt = 'F' THEN 1
+            ELSE NULL
+        END AS driver_sex
+    FROM collision c
+    LEFT JOIN {drug} pd ON c.MstrRecNbrTxt = pd.MstrRecNbrTxt
+    LEFT JOIN {detail} pd_detail ON c.MstrRecNbrTxt = pd_detail.MstrRecNbrTxt
+    LEFT JOIN county_fips cf ON c.county_fips_key = cf.COUNTYFP
+    {_where(["cf.STATE = 'TN'", where])}
+    """
+
+def tn_fingerprint_queries(backend):
+    year = f"COALESCE({backend.year_of(backend.to_datetime('c.CollisionDte'))}, 0)"
+    return [
+        _fingerprint(backend, year, "collision c", ['c.MstrRecNbrTxt', 'c.CollisionDte', 'c.CountyStateCde', 'c.NbrFatalitiesNmb', 'c.NbrInjuredNmb', 'c.DrugInd', 'c.AlcoholInd']),
+        _fingerprint(backend, year, "person_drug pd JOIN collision c ON c.MstrRecNbrTxt = pd.MstrRecNbrTxt", ['pd.MstrRecNbrTxt', 'pd.DrugTestResultCde']),
+        _fingerprint(backend, year, "person_detail pd_detail JOIN collision c ON c.MstrRecNbrTxt = pd_detail.MstrRecNbrTxt",
+                     ['pd_detail.MstrRecNbrTxt', 'pd_detail.AgeNmb', 'pd_detail.GenderTxt']
+                     + [f"pd_detail.{c}" for c in _sequence_columns(backend, 'tn')]),
+    ]
+
+# Per-state harmonization layout: select builder, the source expression the
+# crash_date (and so the year partition) comes from, and per-year fingerprints.
+STATE_HARMONIZATION = {
+    'pa': {'table': 'pa_processed', 'select': pa_processed_select, 'date': pa_crash_date, 'fingerprints': pa_fingerprint_queries},
+    'sc': {'table': 'sc_processed', 'select': sc_processed_select, 'date': lambda b: b.to_datetime('s.date'), 'fingerprints': sc_fingerprint_queries},
+    'tn': {'table': 'tn_processed', 'select': tn_processed_select, 'date': lambda b: b.to_datetime('c.CollisionDte'), 'fingerprints': tn_fingerprint_queries},
+}
+
+# ========== JOIN KEY PREPARATION ==========
+def _county_key(column):
+    return f"UPPER(TRIM(REPLACE({column}, 'County', '')))"
+
+# Join keys that need normalizing are materialized as columns first, so every
+# join in the merge is a plain equality on an indexed (or hashable) column.
+JOIN_KEYS = {
+    'pa': {
+        'columns': [],
+        'indexes': [
+            ('crash', 'idx_crash_crn', ['CRN']),
+            ('flag', 'idx_flag_crn', ['CRN']),
+            ('person', 'idx_person_crn', ['CRN']),
+            ('county_fips', 'idx_county_fips_fp', ['COUNTYFP']),
+        ],
+    },
+    'sc': {
+        'columns': [
+            ('statewide', 'county_key', lambda b: _county_key('county'), 'VARCHAR(64)'),
+            ('county_fips', 'county_key', lambda b: _county_key('COUNTYNAME'), 'VARCHAR(64)'),
+        ],
+        'indexes': [
+            ('statewide', 'idx_crash_number', ['crash_number']),
+            ('statewide_unit', 'idx_crash_number_unit', ['crash_number']),
+            ('statewide', 'idx_statewide_county_key', ['county_key']),
+            ('county_fips', 'idx_county_fips_key', ['STATE', 'county_key']),
+        ],
+    },
+    'tn': {
+        'columns': [
+            # CountyStateCde is text while COUNTYFP is numeric; a cross-type compare can't use an index
+            ('collision', 'county_fips_key', lambda b: b.to_integer('CountyStateCde'), 'INTEGER'),
+        ],
+        'indexes': [
+            ('collision', 'idx_mstrrecnbrtxt_collision', ['MstrRecNbrTxt']),
+            ('person_drug', 'idx_mstrrecnbrtxt_person_drug', ['MstrRecNbrTxt']),
+            ('person_detail', 'idx_mstrrecnbrtxt_person_detail', ['MstrRecNbrTxt']),
+            ('county_fips', 'idx_county_fips_state_fp', ['STATE', 'COUNTYFP']),
+        ],
+    },
+}
+
+def prepare_join_keys(backend, prefix, grain='person'):
+    """Materialize normalized join keys, build their indexes, and report what the planner still scans."""
+    start = time.perf_counter()
+    spec = JOIN_KEYS[prefix]
+    for table_name, column, expr, sql_type in spec['columns']:
+        backend.add_key_column(table_name, column, expr(backend), sql_type)
+    for table_name, index_name, columns in spec['indexes']:
+        backend.create_index(table_name, index_name, columns)
+    print(f"Prepared {prefix.upper()} join keys in {time.perf_counter() - start:.2f}s")
+
+    issues = backend.explain_issues(STATE_HARMONIZATION[prefix]['select'](backend, grain=grain))
+    if issues:
+        print(f"EXPLAIN {STATE_HARMONIZATION[prefix]['table']}: {len(issues)} join(s) without an index or hash join")
+        for issue in issues:
+            print(f"  {issue}")
+    else:
+        print(f"EXPLAIN {STATE_HARMONIZATION[prefix]['table']}: all joins use an index or hash join")
+    return issues
+
+# ========== PROCESSED TABLES ==========
+def create_pa_processed_table(backend, incremental=False, grain='person'):
+    backend = as_backend(backend)
+    prepare_join_keys(backend, 'pa', grain)
+
+    # Merge data into pa_processed table
+    years = build_processed_table(backend, 'pa', incremental, grain)
+    refresh_rollup(backend, 'pa', years if incremental else None)
+
+def create_sc_processed_table(backend, incremental=False, grain='person'):
+    backend = as_backend(backend)
+    prepare_join_keys(backend, 'sc', grain)
+
+    years = build_processed_table(backend, 'sc', incremental, grain)
+    refresh_rollup(backend, 'sc', years if incremental else None)
+
+def create_tn_processed_table(backend, incremental=False, grain='person'):
+    backend = as_backend(backend)
+    prepare_join_keys(backend, 'tn', grain)
+
+    years = build_processed_table(backend, 'tn', incremental, grain)
+    refresh_rollup(backend, 'tn', years if incremental else None)
+
+# ========== INCREMENTAL HARMONIZATION ==========
+WATERMARK_TABLE = 'harmonize_watermarks'
+
+def ensure_watermark_table(backend):
+    backend.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+            state VARCHAR(8) NOT NULL,
+            partition_year INTEGER NOT NULL,
+            source_checksum VARCHAR(64) NOT NULL,
+            row_count BIGINT,
+            harmonized_at VARCHAR(32),
+            PRIMARY KEY (state, partition_year)
+        )
+    """)
+
+def source_checksums(backend, prefix, grain='person'):
+    """Fingerprint every year partition of a state's source tables.
+
+    Each query returns (year, row count, sum of a hash over every column the
+    select reads) per year; county_fips feeds every year since a lookup change
+    touches all of them, and so does the grain.
     """
-        
-    with engine.connect() as conn:
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_crash_number ON statewide(crash_number)"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_crash_number_unit ON statewide_unit(crash_number)"))
-
-        conn.execute(text(merge_query))
-        conn.commit()
-
-def create_tn_processed_table(engine):
-    with engine.connect() as conn:
-        # conn.execute(text("CREATE INDEX IF NOT EXISTS idx_mstrrecnbrtxt_collision ON collision(MstrRecNbrTxt)"))
-        # conn.execute(text("CREATE INDEX IF NOT EXISTS idx_mstrrecnbrtxt_person ON person(MstrRecNbrTxt)"))
-        # conn.execute(text("CREATE INDEX IF NOT EXISTS idx_mstrrecnbrtxt_person_drug ON person_drug(MstrRecNbrTxt)"))
-        # conn.execute(text("CREATE INDEX IF NOT EXISTS idx_mstrrecnbrtxt_unit ON unit(MstrRecNbrTxt)"))
-
-        merge_query = """
-        CREATE OR REPLACE TABLE tn_processed AS
-        SELECT
-            c.MstrRecNbrTxt AS crash_id,
-            'TN' AS state,
-            CAST(c.CollisionDte AS DATETIME) AS crash_date,
-            cf.COUNTYFP AS county_fips,
-            cf.COUNTYNAME AS county_name,
-            c.NbrFatalitiesNmb AS fatalities,
-            c.NbrInjuredNmb AS injuries,
-            (c.NbrFatalitiesNmb + c.NbrInjuredNmb) AS severity_level,
-            CASE WHEN pd.DrugTestResultCde = '04' THEN 1 ELSE 0 END AS opioid_flag,
-            CASE WHEN c.DrugInd = 'Y' THEN 1 ELSE 0 END AS any_drug_flag,
-            CASE WHEN c.AlcoholInd = 'Y' THEN 1 ELSE 0 END AS alcohol_flag,
-            CASE WHEN pd_detail.AgeNmb < 21 THEN 1 ELSE 0 END AS young_driver_flag,
-            CASE WHEN pd_detail.AgeNmb >= 65 THEN 1 ELSE 0 END AS mature_driver_flag,
-            pd_detail.AgeNmb AS driver_age,
-            CASE 
-                WHEN pd_detail.GenderTxt = 'M' THEN 0
-                WHEN pd_detail.GenderTxt = 'F' THEN 1
-                ELSE NULL
-            END AS driver_sex
-        FROM collision c
-        LEFT JOIN person_drug pd ON c.MstrRecNbrTxt = pd.MstrRecNbrTxt
-        LEFT JOIN person_detail pd_detail ON c.MstrRecNbrTxt = pd_detail.MstrRecNbrTxt
-        LEFT JOIN county_fips cf ON c.CountyStateCde = cf.COUNTYFP
-        WHERE cf.STATE = 'TN';
-        """
-
-        conn.execute(text(merge_query))
-        conn.commit()
+    per_year = {}
+    for query in STATE_HARMONIZATION[prefix]['fingerprints'](backend):
+        for row in backend.read_sql(query).itertuples(index=False):
+            per_year.setdefault(int(row[0]), []).append(tuple(str(v) for v in row[1:]))
+    lookup = tuple(str(v) for v in backend.read_sql(f"SELECT COUNT(*), {backend.row_hash_sum(['STATE', 'COUNTYFP', 'COUNTYNAME'])} FROM county_fips").iloc[0])
+    return {
+        year: hashlib.sha256(repr((parts, lookup, grain)).encode()).hexdigest()
+        for year, parts in per_year.items()
+    }
+
+def load_watermarks(backend, prefix):
+    df = backend.read_sql(f"SELECT partition_year, source_checksum FROM {WATERMARK_TABLE} WHERE state = '{prefix}'")
+    return dict(zip(df['partition_year'].astype(int), df['source_checksum']))
+
+def save_watermarks(backend, prefix, checksums, years):
+    table = STATE_HARMONIZATION[prefix]['table']
+    year = f"COALESCE({backend.year_of('crash_date')}, 0)"
+    counts = backend.read_sql(f"SELECT {year} AS yr, COUNT(*) AS n FROM {table} GROUP BY {year}")
+    counts = dict(zip(counts['yr'].astype(int), counts['n'].astype(int)))
+    stamp = datetime.now().isoformat(timespec='seconds')
+    statements = [f"DELETE FROM {WATERMARK_TABLE} WHERE state = '{prefix}' AND partition_year IN ({', '.join(str(int(y)) for y in years)})"] if years else []
+    for y in years:
+        if y in checksums:
+            statements.append(
+                f"INSERT INTO {WATERMARK_TABLE} (state, partition_year, source_checksum, row_count, harmonized_at) "
+                f"VALUES ('{prefix}', {int(y)}, '{checksums[y]}', {counts.get(y, 0)}, '{stamp}')"
+            )
+    if statements:
+        backend.execute(*statements)
+
+def build_processed_table(backend, prefix, incremental=False, grain='person'):
+    """Build {prefix}_processed, either from scratch or only for changed year partitions."""
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain {grain}; expected one of {GRAINS}")
+    spec = STATE_HARMONIZATION[prefix]
+    start = time.perf_counter()
+    ensure_watermark_table(backend)
+    checksums = source_checksums(backend, prefix, grain)
+
+    if not incremental or not backend.table_exists(spec['table']):
+        backend.create_table_as(spec['table'], spec['select'](backend, grain=grain))
+        backend.execute(f"DELETE FROM {WATERMARK_TABLE} WHERE state = '{prefix}'")
+        save_watermarks(backend, prefix, checksums, sorted(checksums))
+        print(f"Rebuilt {spec['table']} ({len(checksums)} year partitions) in {time.perf_counter() - start:.2f}s")
+        return sorted(checksums)
+
+    known = load_watermarks(backend, prefix)
+    changed = sorted(y for y, checksum in checksums.items() if known.get(y) != checksum)
+    removed = sorted(set(known) - set(checksums))
+    if not changed and not removed:
+        print(f"{spec['table']} is up to date ({len(checksums)} year partitions)")
+        return []
+
+    source_year = f"COALESCE({backend.year_of(spec['date'](backend))}, 0)"
+    target_year = f"COALESCE({backend.year_of('crash_date')}, 0)"
+    statements = []
+    for y in changed + removed:
+        statements.append(f"DELETE FROM {spec['table']} WHERE {target_year} = {int(y)}")
+    for y in changed:
+        statements.append(f"INSERT INTO {spec['table']} {spec['select'](backend, where=f'{source_year} = {int(y)}', grain=grain)}")
+    backend.execute(*statements)
 
+    if removed:
+        backend.execute(f"DELETE FROM {WATERMARK_TABLE} WHERE state = '{prefix}' AND partition_year IN ({', '.join(str(int(y)) for y in removed)})")
+    save_watermarks(backend, prefix, checksums, changed)
+    print(f"Refreshed {spec['table']} years {changed} (dropped {removed}) in {time.perf_counter() - start:.2f}s")
+    return changed + removed
+
+def compare_grains(backend, prefix):
+    """Build the fan-out and crash-grain versions side by side and report rows, build time and driver ages."""
+    spec = STATE_HARMONIZATION[prefix]
+    report = {}
+    for grain in GRAINS:
+        scratch = f"{spec['table']}_{grain}_grain"
+        start = time.perf_counter()
+        backend.create_table_as(scratch, spec['select'](backend, grain=grain))
+        seconds = time.perf_counter() - start
+        counts = backend.read_sql(f"""
+            SELECT COUNT(*) AS n, COUNT(DISTINCT crash_id) AS crashes, AVG(driver_age) AS mean_age, AVG(young_driver_flag) AS young
+            FROM {scratch}
+        """).iloc[0]
+        backend.execute(f"DROP TABLE {scratch}")
+        report[grain] = {'rows': int(counts['n']), 'crashes': int(counts['crashes']), 'seconds': seconds,
+                         'mean_driver_age': float(counts['mean_age']), 'young_driver_share': float(counts['young'])}
+
+    fanout, crash = report['person'], report['crash']
+    print(f"{spec['table']} join grain comparison:")
+    for grain, stats in report.items():
+        print(f"  {grain:<8} {stats['rows']:>12,} rows for {stats['crashes']:,} crashes in {stats['seconds']:.2f}s, "
+              f"mean driver age {stats['mean_driver_age']:.1f}, young drivers {stats['young_driver_share']:.1%}")
+    print(f"  crash grain keeps {crash['rows'] / max(fanout['rows'], 1):.1%} of the fan-out rows, "
+          f"{fanout['seconds'] / max(crash['seconds'], 1e-9):.2f}x build speed")
+    return report
 
 # ========== EXPORT TO CSV ==========
-def export_pa_processed_to_csv(engine, OUTPUT_CSV, table_name):
-    query = f"SELECT * FROM {table_name}"
-    df = pd.read_sql(query, con=engine)
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"Exported final {table_name}.csv to {OUTPUT_CSV}")
+EXPORT_BATCH_SIZE = 100000
+
+def _shard_paths(output_path, shards):
+    if shards == 1:
+        return [output_path]
+    folder, name = os.path.split(output_path)
+    stem, dot, extension = name.partition('.')
+    return [os.path.join(folder, f"{stem}-{i:05d}-of-{shards:05d}{dot}{extension}") for i in range(shards)]
+
+class _CsvShard:
+    def __init__(self, path, compressed):
+        self.file = gzip.open(path, 'wt', newline='') if compressed else open(path, 'w', newline='')
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+class _ParquetShard:
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            # Columns that are all NULL in the first batch have no type yet; store them as text
+            schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in table.schema])
+            self.writer = pq.ParquetWriter(self.path, schema.remove_metadata())
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def export_processed_table(backend, output_path, table_name, fmt=None, batch_size=EXPORT_BATCH_SIZE, shards=1):
+    """Stream a processed table to csv, csv.gz or parquet in fixed-size batches.
+
+    Rows come from a server-side cursor (record batches on DuckDB), so memory is
+    bounded by batch_size regardless of table size. With shards > 1 the batches
+    are dealt round-robin into that many files.
+    """
+    backend = as_backend(backend)
+    fmt = fmt or ('parquet' if output_path.endswith('.parquet') else 'csv.gz' if output_path.endswith('.gz') else 'csv')
+    if fmt not in ('csv', 'csv.gz', 'parquet'):
+        raise ValueError(f"Unsupported export format {fmt}")
+    paths = _shard_paths(output_path, shards)
+    writers = [_ParquetShard(p) if fmt == 'parquet' else _CsvShard(p, fmt == 'csv.gz') for p in paths]
+
+    rows = 0
+    try:
+        for i, batch in enumerate(backend.iter_batches(f"SELECT * FROM {table_name}", batch_size)):
+            writers[i % shards].write(batch)
+            rows += len(batch)
+    finally:
+        for writer in writers:
+            writer.close()
+    print(f"Exported {rows} rows of {table_name} to {', '.join(paths)}")
+    return rows
+
+def export_pa_processed_to_csv(backend, OUTPUT_CSV, table_name):
+    # export_processed_table reports the export
+    return export_processed_table(backend, OUTPUT_CSV, table_name)
 
 if __name__ == "__main__":
-    # Process PA data
-    # engine = connect_database('pa_crash_db')
-    # create_pa_processed_table(engine)
-    # export_pa_processed_to_csv(engine, "./datasets/PA/PA_PROCESSED.csv", "pa_processed")
-    # engine.dispose()
-
-    # Process SC data
-    # engine = connect_database('sc_crash_db')
-    # create_sc_processed_table(engine)
-    # export_pa_processed_to_csv(engine, "./datasets/SC/SC_PROCESSED.csv", "sc_processed")
-    # engine.dispose()
-
-    # Process TN data
-    engine = connect_database('tn_crash_db')
-    create_tn_processed_table(engine)
-    export_pa_processed_to_csv(engine, "./datasets/TN/TN_PROCESSED.csv", "tn_processed")
-    engine.dispose()
-
-    
\ No newline at end of file
+    # CRASH_INCREMENTAL=1 only re-harmonizes year partitions whose sources changed
+    INCREMENTAL = os.environ.get('CRASH_INCREMENTAL', '0') == '1'
+    # CRASH_GRAIN=crash aggregates person/drug rows per crash before joining;
+    # CRASH_COMPARE_GRAINS=1 also reports both joins' row counts and build times.
+    GRAIN = os.environ.get('CRASH_GRAIN', 'person')
+    COMPARE_GRAINS = os.environ.get('CRASH_COMPARE_GRAINS', '0') == '1'
+    # CRASH_DB_BACKEND=duckdb (or sqlite) runs the whole harmonization in-process,
+    # reading the raw files / Arrow cache instead of a MySQL server.
+    for prefix, create_processed_table in [('pa', create_pa_processed_table), ('sc', create_sc_processed_table), ('tn', create_tn_processed_table)]:
+        backend = connect_state_backend(prefix)
+        create_processed_table(backend, incremental=INCREMENTAL, grain=GRAIN)
+        if COMPARE_GRAINS:
+            compare_grains(backend, prefix)
+        export_pa_processed_to_csv(backend, f"./datasets/{prefix.upper()}/{prefix.upper()}_PROCESSED.csv", f"{prefix}_processed")
+        backend.dispose()
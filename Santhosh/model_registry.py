@@ -0,0 +1,151 @@
+# Registry of fitted prediction models.
+# Each fit is stored under a key hashed from the training/test data, the feature
+# names and the model's class and hyperparameters: the fitted model (joblib), its
+# metrics, and the test-set predictions, plus (for county-level models) risk
+# scores for every county-year. Reruns on unchanged data load the entry instead
+# of refitting, and pres/main.py reads the latest county scores from here.
+# Every fit_or_load call, reused or not, also points current/<state>_<level>_<model>.json
+# at the entry it returned, so readers follow the last run rather than the last fit.
+import os
+import json
+import hashlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.metrics import classification_report, roc_auc_score
+
+REGISTRY_DIR = './scripts/pred/registry'
+# Threading does not change the fitted model, so it is left out of the key
+IGNORED_PARAMS = {'n_jobs', 'nthread', 'verbose'}
+
+def _entry_dir(key):
+    return os.path.join(REGISTRY_DIR, key)
+
+def _current_path(state, level, model):
+    return os.path.join(REGISTRY_DIR, 'current', f"{state}_{level}_{model}.json")
+
+# ========== KEYS ==========
+def _update_array(digest, values):
+    if isinstance(values, (pd.DataFrame, pd.Series)):
+        # Hash the values, not the memory of an object array (pointers differ between runs)
+        digest.update(repr(values.dtypes if isinstance(values, pd.DataFrame) else values.dtype).encode())
+        values = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    values = np.ascontiguousarray(values)
+    digest.update(str((values.dtype.str, values.shape)).encode())
+    digest.update(memoryview(values).cast('B'))
+
+def fit_key(model, X_train, X_test, y_train, y_test, features):
+    digest = hashlib.sha256()
+    for values in (X_train, X_test, y_train, y_test):
+        _update_array(digest, values)
+    params = {k: v for k, v in model.get_params().items() if k not in IGNORED_PARAMS}
+    digest.update(repr((type(model).__module__, type(model).__name__, sorted(params.items(), key=str), list(features))).encode())
+    return digest.hexdigest()[:32]
+
+# ========== ENTRIES ==========
+def list_entries():
+    """Metadata of every registered fit (one meta.json per entry folder, so concurrent writers never conflict)."""
+    entries = []
+    if os.path.isdir(REGISTRY_DIR):
+        for key in sorted(os.listdir(REGISTRY_DIR)):
+            try:
+                with open(os.path.join(REGISTRY_DIR, key, 'meta.json'), "r", encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                continue
+    return entries
+
+# ========== FIT / LOAD ==========
+def load_fit(key):
+    folder = _entry_dir(key)
+    if not os.path.exists(os.path.join(folder, 'meta.json')):
+        return None
+    with open(os.path.join(folder, 'meta.json'), "r", encoding='utf-8') as f:
+        meta = json.load(f)
+    predictions = np.load(os.path.join(folder, 'predictions.npz'))
+    return {
+        'key': key,
+        'model': joblib.load(os.path.join(folder, 'model.joblib')),
+        'y_pred': predictions['y_pred'],
+        'y_score': predictions['y_score'] if 'y_score' in predictions else None,
+        'meta': meta,
+        'cached': True,
+    }
+
+def save_fit(key, model, y_test, y_pred, y_score, meta):
+    folder = _entry_dir(key)
+    os.makedirs(folder, exist_ok=True)
+    joblib.dump(model, os.path.join(folder, 'model.joblib'))
+    arrays = {'y_test': np.asarray(y_test), 'y_pred': np.asarray(y_pred)}
+    if y_score is not None:
+        arrays['y_score'] = np.asarray(y_score)
+    np.savez_compressed(os.path.join(folder, 'predictions.npz'), **arrays)
+
+    meta = dict(meta, key=key, created=datetime.now().isoformat(timespec='seconds'))
+    meta['report'] = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+    meta['auc'] = float(roc_auc_score(y_test, y_score)) if y_score is not None and len(np.unique(y_test)) > 1 else None
+    # meta.json is written last: an entry only counts as registered once it exists
+    _write_json(os.path.join(folder, 'meta.json'), meta)
+    return meta
+
+def _write_json(path, payload):
+    # Write then rename, so a concurrent reader sees either the old file or the new one
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+def mark_current(state, level, model, key):
+    """Point state/level/model at the entry this run used."""
+    path = _current_path(state, level, model)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_json(path, {'key': key, 'used': datetime.now().isoformat(timespec='seconds')})
+
+def fit_or_load(model, X_train, X_test, y_train, y_test, state, level, name, features):
+    """Fit and register the model, or return the registered fit for identical inputs."""
+    key = fit_key(model, X_train, X_test, y_train, y_test, features)
+    entry = load_fit(key)
+    if entry is not None:
+        print(f"{state.upper()} {level} {name}: reusing registered fit {key}")
+        mark_current(state, level, name, key)
+        return entry
+
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    proba = model.predict_proba(X_test)
+    y_score = proba[:, 1] if proba.shape[1] > 1 else None
+    meta = save_fit(key, model, y_test, y_pred, y_score, {'state': state, 'level': level, 'model': name, 'features': list(features)})
+    mark_current(state, level, name, key)
+    return {'key': key, 'model': model, 'y_pred': y_pred, 'y_score': y_score, 'meta': meta, 'cached': False}
+
+# ========== COUNTY RISK SCORES ==========
+def save_county_scores(key, scores):
+    """scores: one row per county-year with county_name, year and risk."""
+    scores.to_csv(os.path.join(_entry_dir(key), 'county_scores.csv'), index=False)
+
+def has_county_scores(key):
+    return os.path.exists(os.path.join(_entry_dir(key), 'county_scores.csv'))
+
+def latest_entry(state, level, model):
+    """Metadata of the fit the last run used for state/level/model, or None.
+
+    Registries written before the current pointers existed fall back to the
+    most recently created entry.
+    """
+    try:
+        with open(_current_path(state, level, model), "r", encoding='utf-8') as f:
+            key = json.load(f)['key']
+        with open(os.path.join(_entry_dir(key), 'meta.json'), "r", encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+    entries = [entry for entry in list_entries() if (entry['state'], entry['level'], entry['model']) == (state, level, model)]
+    return max(entries, key=lambda entry: entry['created'], default=None)
+
+def latest_county_scores(state, model='RandomForest'):
+    """County-year risk scores of the county-level model the last run used, or None."""
+    entry = latest_entry(state, 'county', model)
+    if entry is None or not has_county_scores(entry['key']):
+        return None
+    return pd.read_csv(os.path.join(_entry_dir(entry['key']), 'county_scores.csv'))
@@ -1,65 +1,49 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sqlalchemy import create_engine, text
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, roc_auc_score
 
+# Shared modules (crash_data, backends) live one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crash_data import USE_ROLLUP, load_processed, load_rollup
+from rollup import county_year_summary
+from county_features import county_features
+from feature_store import build_feature_matrix, train_test_views
+from model_registry import fit_or_load, save_county_scores, has_county_scores
+from streaming import database_batches, stream_fit
+
+# CRASH_STREAM_DRIVER=1 fits the driver level out of core (SGD logistic regression over
+# streamed batches) instead of a random forest on the full in-memory matrix
+STREAM_DRIVER = os.environ.get('CRASH_STREAM_DRIVER', '0') == '1'
+
 # Ensure directories exist
 os.makedirs("./scripts/pred/figures", exist_ok=True)
 os.makedirs("./scripts/pred/statistics", exist_ok=True)
 
-# ========== DATABASE CONNECTION ==========
-MYSQL_CONFIG = {
-    'host': 'localhost',
-    'port': 3306,
-    'user': 'root',
-    'password': 'Ranchero0',
-}
-
-def connect_database(DB_NAME):
-    url = f"mysql+pymysql://{MYSQL_CONFIG['user']}:{MYSQL_CONFIG['password']}@{MYSQL_CONFIG['host']}:{MYSQL_CONFIG['port']}/{DB_NAME}"
-    engine = create_engine(url, pool_recycle=3600, future=True)
-    return engine
-
 # ========== FUNCTION 1: Prepare Data ==========
 def prepare_predictive_data(dbPrefix):
-    engine = connect_database(f"{dbPrefix}_crash_db")
-    query = text(f"""
-        SELECT 
-            YEAR(crash_date) AS year, 
-            county_name, 
-            severity_level,
-            driver_age,
-            driver_sex,
-            opioid_flag
-        FROM {dbPrefix}_processed
-    """)
-    
-    with engine.connect() as conn:
-        df = pd.read_sql(query, conn)
-    
-    return df
+    return load_processed(dbPrefix, ['year', 'county_name', 'severity_level', 'driver_age', 'driver_sex', 'opioid_flag'])
 
 # ========== FUNCTION 2: Driver-Level Prediction ==========
 def driver_level_prediction(df, dbPrefix):
     features = ['year', 'driver_age', 'driver_sex', 'severity_level']
-    X = df[features].fillna(-1)
-    y = df['opioid_flag']
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-
-    y_pred = model.predict(X_test)
+    # float32 matrix in train-then-test row order: the split is two slices, not copies
+    X, y, n_train = build_feature_matrix(df, features, 'opioid_flag')
+    X_train, X_test, y_train, y_test = train_test_views(X, y, n_train)
+    # Reuses the registered fit when data, features and parameters are unchanged
+    fit = fit_or_load(RandomForestClassifier(n_estimators=100, random_state=42),
+                      X_train, X_test, y_train, y_test, dbPrefix, 'driver', 'RandomForest', features)
+    model, y_pred = fit['model'], fit['y_pred']
     report = classification_report(y_test, y_pred, output_dict=True)
 
-    try:
-        auc = roc_auc_score(y_test, model.predict_proba(X_test)[:,1])
-    except IndexError:
+    if fit['y_score'] is not None:
+        auc = roc_auc_score(y_test, fit['y_score'])
+    else:
         auc = "AUC not available (only one class present)"
 
     # Save classification report
@@ -78,17 +62,29 @@ def driver_level_prediction(df, dbPrefix):
     plt.savefig(f"./scripts/pred/figures/{dbPrefix}_driver_level_feature_importance.png")
     plt.close()
 
+def driver_level_streaming(dbPrefix):
+    features = ['year', 'driver_age', 'driver_sex', 'severity_level']
+    results = stream_fit(lambda: database_batches(dbPrefix, features, 'opioid_flag'), features, 'opioid_flag', ['SGDLogistic'])
+    y_test, y_pred, y_score = results['SGDLogistic']
+    report = classification_report(y_test, y_pred, output_dict=True)
+
+    if len(np.unique(y_test)) > 1:
+        auc = roc_auc_score(y_test, y_score)
+    else:
+        auc = "AUC not available (only one class present)"
+
+    with open(f"./scripts/pred/statistics/{dbPrefix}_driver_level_report.txt", "w") as f:
+        f.write(f"AUC: {auc}\n")
+        f.write(pd.DataFrame(report).transpose().to_string())
+
 # ========== FUNCTION 3: County-Level Prediction ==========
-def county_level_prediction(df, dbPrefix):
-    county_summary = df.groupby(['county_name', 'year']).agg(
-        total_crashes=('opioid_flag', 'count'),
-        opioid_crashes=('opioid_flag', 'sum'),
-        avg_driver_age=('driver_age', 'mean'),
-        prop_male=('driver_sex', lambda x: (x==0).mean()),
-        fatal_crash_rate=('severity_level', lambda x: (x==1).mean()),
-        serious_injury_rate=('severity_level', lambda x: (x==2).mean()),
-        avg_severity_score=('severity_level', 'mean')
-    ).reset_index()
+def county_level_prediction(df, dbPrefix, use_rollup=USE_ROLLUP):
+    if use_rollup:
+        # Same features, summed from the county x year rollup built during harmonization
+        county_summary = county_year_summary(load_rollup(dbPrefix))
+    else:
+        # Indicator columns reduced with np.bincount over integer-coded county-years
+        county_summary = county_features(df)
     print(f"County for {dbPrefix.upper()} has {len(county_summary)} records.")
 
     if county_summary.empty:
@@ -111,15 +107,18 @@ def county_level_prediction(df, dbPrefix):
         auc = "AUC not available (only one class present)"
     else:
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
         print(f"Model training for {dbPrefix.upper()} county prediction.")
-        model.fit(X_train, y_train)
+        fit = fit_or_load(RandomForestClassifier(n_estimators=100, random_state=42),
+                          X_train, X_test, y_train, y_test, dbPrefix, 'county', 'RandomForest', features)
+        model, y_pred = fit['model'], fit['y_pred']
+        if not has_county_scores(fit['key']):
+            # Risk score of every county-year, read back by pres/main.py
+            save_county_scores(fit['key'], county_summary[['county_name', 'year']].assign(risk=model.predict_proba(X)[:,1]))
 
-        y_pred = model.predict(X_test)
         print(f"Model prediction for {dbPrefix.upper()} county prediction.")
         report = classification_report(y_test, y_pred, output_dict=True)
         print(f"Model evaluation for {dbPrefix.upper()} county prediction.")
-        auc = roc_auc_score(y_test, model.predict_proba(X_test)[:,1])
+        auc = roc_auc_score(y_test, fit['y_score'])
         print(f"AUC for {dbPrefix.upper()} county prediction: {auc}")
         
         with open(f"./scripts/pred/statistics/{dbPrefix}_county_level_report.txt", "w") as f:
@@ -143,8 +142,13 @@ def county_level_prediction(df, dbPrefix):
 # ========== MAIN EXECUTION ==========
 if __name__ == "__main__":
     for prefix in ['pa', 'sc']:
-        df = prepare_predictive_data(prefix)
-        driver_level_prediction(df, prefix)
+        if STREAM_DRIVER:
+            driver_level_streaming(prefix)
+            # The rollup path needs no crash rows, so nothing is loaded into memory
+            df = None if USE_ROLLUP else prepare_predictive_data(prefix)
+        else:
+            df = prepare_predictive_data(prefix)
+            driver_level_prediction(df, prefix)
         print(f"Starting county level prediction for {prefix.upper()}")
         county_level_prediction(df, prefix)
         print(f"Completed county level prediction for {prefix.upper()}")
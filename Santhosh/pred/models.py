@@ -1,50 +1,34 @@
 import os
+import sys
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sqlalchemy import create_engine, text
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from xgboost import XGBClassifier
 from sklearn.metrics import classification_report, roc_auc_score, confusion_matrix, roc_curve, precision_recall_curve
 
+# Shared modules (crash_data, backends) live one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crash_data import USE_ROLLUP, load_processed, load_rollup
+from rollup import county_year_summary
+from county_features import county_features
+from feature_store import split_order, build_feature_matrix, load_feature_matrix, train_test_views, peak_rss_mb
+from model_registry import fit_or_load, save_county_scores, has_county_scores
+from streaming import STREAM_BATCH_ROWS, STREAMING_MODELS, database_batches, parquet_batches, stream_fit
+
 # Ensure directories exist
 os.makedirs("./scripts/pred/figures", exist_ok=True)
 os.makedirs("./scripts/pred/statistics", exist_ok=True)
 
-# ========== DATABASE CONNECTION ==========
-MYSQL_CONFIG = {
-    'host': 'localhost',
-    'port': 3306,
-    'user': 'root',
-    'password': 'Ranchero0',
-}
-
-def connect_database(DB_NAME):
-    url = f"mysql+pymysql://{MYSQL_CONFIG['user']}:{MYSQL_CONFIG['password']}@{MYSQL_CONFIG['host']}:{MYSQL_CONFIG['port']}/{DB_NAME}"
-    engine = create_engine(url, pool_recycle=3600, future=True)
-    return engine
-
 # ========== FUNCTION: Prepare Data ==========
 def prepare_predictive_data(dbPrefix):
-    engine = connect_database(f"{dbPrefix}_crash_db")
-    query = text(f"""
-        SELECT 
-            YEAR(crash_date) AS year, 
-            county_name, 
-            severity_level,
-            driver_age,
-            driver_sex,
-            opioid_flag
-        FROM {dbPrefix}_processed
-    """)
-    
-    with engine.connect() as conn:
-        df = pd.read_sql(query, conn)
-    
-    return df
+    return load_processed(dbPrefix, ['year', 'county_name', 'severity_level', 'driver_age', 'driver_sex', 'opioid_flag'])
 
 # ========== FUNCTION: Plot Utilities ==========
 def plot_confusion_matrix(y_true, y_pred, title, path):
@@ -72,89 +56,186 @@ def plot_roc_curve(y_true, y_score, title, path):
     plt.savefig(path)
     plt.close()
 
+# ========== FUNCTION: Models ==========
+MODEL_NAMES = ['RandomForest', 'LogisticRegression', 'XGBoost']
+# Rough relative training cost, used to start the longest jobs first
+MODEL_COST = {'RandomForest': 10, 'XGBoost': 3, 'LogisticRegression': 1}
+DRIVER_FEATURES = ['year', 'driver_age', 'driver_sex', 'severity_level']
+COUNTY_FEATURES = ['year', 'avg_driver_age', 'prop_male', 'fatal_crash_rate', 'serious_injury_rate', 'avg_severity_score']
+
+def make_model(name, threads=None):
+    """threads=None lets RandomForest/XGBoost use every core; the training grid passes 1."""
+    if name == 'RandomForest':
+        return RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=threads or -1)
+    if name == 'LogisticRegression':
+        return LogisticRegression(max_iter=1000, random_state=42)
+    return XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42, n_jobs=threads)
+
+def fit_and_report(name, model, X_train, X_test, y_train, y_test, dbPrefix, level, features, score_rows=None):
+    """score_rows=(X, keys) also registers the model's risk score for every county-year row."""
+    # Reruns on identical data, features and hyperparameters reuse the registered fit
+    fit = fit_or_load(model, X_train, X_test, y_train, y_test, dbPrefix, level, name, features)
+    model, y_pred, y_score = fit['model'], fit['y_pred'], fit['y_score']
+    if score_rows is not None and not has_county_scores(fit['key']):
+        X_all, keys = score_rows
+        save_county_scores(fit['key'], keys.assign(risk=model.predict_proba(X_all)[:,1]))
+    return write_report(name, y_test, y_pred, y_score, dbPrefix, level)
+
+def write_report(name, y_test, y_pred, y_score, dbPrefix, level):
+    report = classification_report(y_test, y_pred, output_dict=True)
+    auc = roc_auc_score(y_test, y_score)
+
+    with open(f"./scripts/pred/statistics/{dbPrefix}_{level}_level_{name}_report2.txt", "w") as f:
+        f.write(f"AUC: {auc}\n")
+        f.write(pd.DataFrame(report).transpose().to_string())
+
+    plot_confusion_matrix(y_test, y_pred, f"{dbPrefix.upper()} {level.capitalize()} Level {name} Confusion Matrix", f"./scripts/pred/figures/{dbPrefix}_{level}_level_{name}_confusion2.png")
+    plot_roc_curve(y_test, y_score, f"{dbPrefix.upper()} {level.capitalize()} Level {name} ROC Curve", f"./scripts/pred/figures/{dbPrefix}_{level}_level_{name}_roc2.png")
+    return auc
+
 # ========== FUNCTION: Driver-Level Prediction ==========
 def driver_level_prediction(df, dbPrefix):
-    features = ['year', 'driver_age', 'driver_sex', 'severity_level']
-    X = df[features].fillna(-1)
-    y = df['opioid_flag']
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-
-    models = {
-        'RandomForest': RandomForestClassifier(n_estimators=100, random_state=42),
-        'LogisticRegression': LogisticRegression(max_iter=1000, random_state=42),
-        'XGBoost': XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42)
-    }
-
-    for name, model in models.items():
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
-        y_score = model.predict_proba(X_test)[:,1]
-
-        report = classification_report(y_test, y_pred, output_dict=True)
-        auc = roc_auc_score(y_test, y_score)
-
-        with open(f"./scripts/pred/statistics/{dbPrefix}_driver_level_{name}_report2.txt", "w") as f:
-            f.write(f"AUC: {auc}\n")
-            f.write(pd.DataFrame(report).transpose().to_string())
-
-        plot_confusion_matrix(y_test, y_pred, f"{dbPrefix.upper()} Driver Level {name} Confusion Matrix", f"./scripts/pred/figures/{dbPrefix}_driver_level_{name}_confusion2.png")
-        plot_roc_curve(y_test, y_score, f"{dbPrefix.upper()} Driver Level {name} ROC Curve", f"./scripts/pred/figures/{dbPrefix}_driver_level_{name}_roc2.png")
+    # float32 matrix in train-then-test row order: the split below is two slices, not copies
+    X, y, n_train = build_feature_matrix(df, DRIVER_FEATURES, 'opioid_flag')
+    X_train, X_test, y_train, y_test = train_test_views(X, y, n_train)
+
+    for name in MODEL_NAMES:
+        fit_and_report(name, make_model(name), X_train, X_test, y_train, y_test, dbPrefix, 'driver', DRIVER_FEATURES)
+    print(f"{dbPrefix.upper()} driver level: {X.nbytes / 1e6:.1f} MB feature matrix, peak RSS {peak_rss_mb():.0f} MB")
+
+def driver_level_streaming(dbPrefix, parquet_path=None, batch_rows=STREAM_BATCH_ROWS, model_names=STREAMING_MODELS):
+    """Out-of-core driver level: partial_fit learners over streamed batches, same reports as above."""
+    start = time.perf_counter()
+    if parquet_path:
+        batches = lambda: parquet_batches(parquet_path, DRIVER_FEATURES, 'opioid_flag', batch_rows)
+    else:
+        batches = lambda: database_batches(dbPrefix, DRIVER_FEATURES, 'opioid_flag', batch_rows)
+    results = stream_fit(batches, DRIVER_FEATURES, 'opioid_flag', model_names)
+    for name, (y_test, y_pred, y_score) in results.items():
+        auc = write_report(name, y_test, y_pred, y_score, dbPrefix, 'driver')
+        print(f"{dbPrefix.upper()} driver {name:<12} AUC {auc:.3f}")
+    print(f"{dbPrefix.upper()} streamed driver level in {time.perf_counter() - start:.2f}s "
+          f"({batch_rows:,}-row batches), peak RSS {peak_rss_mb():.0f} MB")
 
 # ========== FUNCTION: County-Level Prediction ==========
-def county_level_prediction(df, dbPrefix):
-    county_summary = df.groupby(['county_name', 'year']).agg(
-        total_crashes=('opioid_flag', 'count'),
-        opioid_crashes=('opioid_flag', 'sum'),
-        avg_driver_age=('driver_age', 'mean'),
-        prop_male=('driver_sex', lambda x: (x==0).mean()),
-        fatal_crash_rate=('severity_level', lambda x: (x==1).mean()),
-        serious_injury_rate=('severity_level', lambda x: (x==2).mean()),
-        avg_severity_score=('severity_level', 'mean')
-    ).reset_index()
+def county_level_data(df, dbPrefix, use_rollup=USE_ROLLUP):
+    """County x year features with the opioid_risk label, or None when there is nothing to train on."""
+    if use_rollup:
+        # Same features, summed from the county x year rollup built during harmonization
+        county_summary = county_year_summary(load_rollup(dbPrefix))
+    else:
+        # Indicator columns reduced with np.bincount over integer-coded county-years
+        county_summary = county_features(df)
 
     if county_summary.empty:
         print(f"No data for {dbPrefix.upper()} county prediction.")
-        return
+        return None
 
     dynamic_threshold = min(0.10, (county_summary['opioid_crashes'].sum() / county_summary['total_crashes'].sum()))
-    county_summary['opioid_risk'] = (county_summary['opioid_crashes'] / county_summary['total_crashes']) > dynamic_threshold
-
-    features = ['year', 'avg_driver_age', 'prop_male', 'fatal_crash_rate', 'serious_injury_rate', 'avg_severity_score']
-    X = county_summary[features].fillna(-1)
-    y = county_summary['opioid_risk'].astype(int)
+    county_summary['opioid_risk'] = ((county_summary['opioid_crashes'] / county_summary['total_crashes']) > dynamic_threshold).astype(int)
 
-    if y.nunique() == 1:
+    if county_summary['opioid_risk'].nunique() == 1:
         print(f"Only one class present for {dbPrefix.upper()} county prediction. Skipping models.")
-        return
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-
-    models = {
-        'RandomForest': RandomForestClassifier(n_estimators=100, random_state=42),
-        'LogisticRegression': LogisticRegression(max_iter=1000, random_state=42),
-        'XGBoost': XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42)
-    }
+        return None
+    return county_summary
 
-    for name, model in models.items():
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
-        y_score = model.predict_proba(X_test)[:,1]
+def county_keys(county_summary):
+    """county_name/year of each row of the county feature matrix (which is in split order)."""
+    order, _ = split_order(len(county_summary))
+    return county_summary[['county_name', 'year']].iloc[order].reset_index(drop=True)
 
-        report = classification_report(y_test, y_pred, output_dict=True)
-        auc = roc_auc_score(y_test, y_score)
-
-        with open(f"./scripts/pred/statistics/{dbPrefix}_county_level_{name}_report2.txt", "w") as f:
-            f.write(f"AUC: {auc}\n")
-            f.write(pd.DataFrame(report).transpose().to_string())
-
-        plot_confusion_matrix(y_test, y_pred, f"{dbPrefix.upper()} County Level {name} Confusion Matrix", f"./scripts/pred/figures/{dbPrefix}_county_level_{name}_confusion2.png")
-        plot_roc_curve(y_test, y_score, f"{dbPrefix.upper()} County Level {name} ROC Curve", f"./scripts/pred/figures/{dbPrefix}_county_level_{name}_roc2.png")
+def county_level_prediction(df, dbPrefix, use_rollup=USE_ROLLUP):
+    county_summary = county_level_data(df, dbPrefix, use_rollup)
+    if county_summary is None:
+        return
+    X, y, n_train = build_feature_matrix(county_summary, COUNTY_FEATURES, 'opioid_risk')
+    X_train, X_test, y_train, y_test = train_test_views(X, y, n_train)
+
+    keys = county_keys(county_summary)
+
+    for name in MODEL_NAMES:
+        fit_and_report(name, make_model(name), X_train, X_test, y_train, y_test, dbPrefix, 'county', COUNTY_FEATURES, score_rows=(X, keys))
+
+# ========== PARALLEL TRAINING GRID ==========
+TRAIN_WORKERS = int(os.environ.get('CRASH_TRAIN_WORKERS', os.cpu_count() or 1))
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+_worker_limits = None
+
+def _limit_worker_threads():
+    # One core per job: the pool supplies the parallelism, so BLAS/OpenMP must not add threads of their own
+    global _worker_limits
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = '1'
+    try:
+        from threadpoolctl import threadpool_limits
+        _worker_limits = threadpool_limits(1)
+    except ImportError:
+        pass
+
+def _train_job(dbPrefix, level, name, path, n_train):
+    start = time.perf_counter()
+    # Every worker maps the same float32 .npy pages read-only; train/test are slices of them
+    X, y = load_feature_matrix(path)
+    X_train, X_test, y_train, y_test = train_test_views(X, y, n_train)
+    if level == 'driver':
+        features, score_rows = DRIVER_FEATURES, None
+    else:
+        features, score_rows = COUNTY_FEATURES, (X, pd.read_csv(f"{path}_keys.csv"))
+    auc = fit_and_report(name, make_model(name, threads=1), X_train, X_test, y_train, y_test, dbPrefix, level, features, score_rows)
+    return auc, time.perf_counter() - start
+
+def run_training_grid(states, levels=('driver', 'county'), model_names=MODEL_NAMES, max_workers=TRAIN_WORKERS):
+    """Train every state x level x model in a process pool and report the end-to-end time."""
+    start = time.perf_counter()
+    folder = tempfile.mkdtemp(prefix='crash_features_')
+    results = {}
+    try:
+        jobs = []
+        for prefix in states:
+            df = prepare_predictive_data(prefix)
+            for level in levels:
+                if level == 'driver':
+                    frame, features, target = df, DRIVER_FEATURES, 'opioid_flag'
+                else:
+                    frame, features, target = county_level_data(df, prefix), COUNTY_FEATURES, 'opioid_risk'
+                if frame is None:
+                    continue
+                path = os.path.join(folder, f"{prefix}_{level}")
+                _, _, n_train = build_feature_matrix(frame, features, target, path=path)
+                if level == 'county':
+                    county_keys(frame).to_csv(f"{path}_keys.csv", index=False)
+                jobs += [(len(frame) * MODEL_COST[name], prefix, level, name, (path, n_train)) for name in model_names]
+        jobs.sort(reverse=True)
+        prep_seconds = time.perf_counter() - start
+
+        workers = max(1, min(max_workers, len(jobs)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_limit_worker_threads) as pool:
+            futures = {pool.submit(_train_job, prefix, level, name, *matrix): (prefix, level, name) for _, prefix, level, name, matrix in jobs}
+            for future in as_completed(futures):
+                prefix, level, name = futures[future]
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Error training {prefix.upper()} {level} {name}: {e}")
+                    continue
+                auc, seconds = results[futures[future]]
+                print(f"{prefix.upper()} {level:<6} {name:<18} AUC {auc:.3f} in {seconds:.2f}s")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    wall = time.perf_counter() - start
+    busy = sum(seconds for _, seconds in results.values())
+    print(f"Trained {len(results)} models in {wall:.2f}s end to end "
+          f"(data prep {prep_seconds:.2f}s, {busy:.2f}s of training on {workers} workers, "
+          f"{busy / max(wall - prep_seconds, 1e-9):.2f}x)")
+    return results
 
 # ========== MAIN EXECUTION ==========
 if __name__ == "__main__":
-    for prefix in ['tn', 'pa', 'sc']:
-        df = prepare_predictive_data(prefix)
-        driver_level_prediction(df, prefix)
-        county_level_prediction(df, prefix)
-
+    # CRASH_STREAM_DRIVER=1 trains the driver level out of core instead of from an in-memory matrix
+    if os.environ.get('CRASH_STREAM_DRIVER', '0') == '1':
+        for prefix in ['tn', 'pa', 'sc']:
+            driver_level_streaming(prefix)
+        run_training_grid(['tn', 'pa', 'sc'], levels=('county',))
+    else:
+        run_training_grid(['tn', 'pa', 'sc'])
@@ -1,101 +1,124 @@
 import os
+import sys
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# Shared modules (county_risk) live one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from county_risk import load_risk_table, latest_year_risk
+from scenarios import run_scenarios
+
 # Ensure directories exist
 os.makedirs("./scripts/pres/figures", exist_ok=True)
 os.makedirs("./scripts/pres/statistics", exist_ok=True)
 
-# Load predicted county-level risk scores manually or from file
-# Example placeholder: you should replace with actual results
+# Predicted county-level risk scores come from the county risk table written by
+# county_risk.py (see load_county_risk); these placeholders are only used for a
+# state that has not been scored yet
 predicted_county_risk = {
     'PA': {'CountyA': 0.85, 'CountyB': 0.42, 'CountyC': 0.76},
     'TN': {'CountyX': 0.67, 'CountyY': 0.43, 'CountyZ': 0.52},
     'SC': {'CountyM': 0.59, 'CountyN': 0.29, 'CountyO': 0.73}
 }
 
+# Premium bar charts show the highest-premium counties only; the CSVs keep every county
+PLOT_COUNTIES = 40
+
+def load_county_risk(states=tuple(predicted_county_risk)):
+    """One row per state and county (state, county_name, risk) from each county's latest scored year."""
+    table = load_risk_table()
+    frames = [] if table is None else [latest_year_risk(table)[['state', 'county_name', 'risk']]]
+    scored = set() if table is None else set(table['state'].astype(str))
+    missing = [state for state in states if state not in scored]
+    if missing:
+        print(f"No county risk scores for {', '.join(missing)}, using placeholder risk scores.")
+        placeholder = pd.DataFrame(predicted_county_risk)[missing].stack().dropna()
+        frames.append(placeholder.rename_axis(['county_name', 'state']).rename('risk').reset_index()[['state', 'county_name', 'risk']])
+    return pd.concat(frames, ignore_index=True).astype({'state': str, 'county_name': str})
+
 # ========== FUNCTION 1: Premium Adjustment Simulation ==========
-def simulate_premium_adjustment(state, county_risk, base_premium=1000, risk_threshold=0.5, adjustment_rate=0.1):
-    premiums = {}
-    for county, risk in county_risk.items():
-        if risk > risk_threshold:
-            premiums[county] = base_premium * (1 + adjustment_rate)
-        else:
-            premiums[county] = base_premium
-
-    df = pd.DataFrame.from_dict(premiums, orient='index', columns=['AdjustedPremium'])
+def simulate_premium_adjustment(county_risk, base_premium=1000, risk_threshold=0.5, adjustment_rate=0.1):
+    """county_risk: one row per state and county with its risk score; all counties are priced at once."""
+    df = county_risk[['state', 'county_name']].copy()
+    df['AdjustedPremium'] = np.where(county_risk['risk'].to_numpy() > risk_threshold, base_premium * (1 + adjustment_rate), base_premium)
     df['OriginalPremium'] = base_premium
     df['Delta'] = df['AdjustedPremium'] - df['OriginalPremium']
-    df = df.sort_values('Delta', ascending=False)
-
-    df.to_csv(f"./scripts/pres/statistics/{state}_premium_adjustment.csv")
-
-    # Plot
-    plt.figure(figsize=(10,6))
-    sns.barplot(x=df.index, y=df['AdjustedPremium'], palette='viridis')
-    plt.title(f"{state} - Adjusted Premiums by County")
-    plt.xlabel("County")
-    plt.ylabel("Adjusted Premium ($)")
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    plt.savefig(f"./scripts/pres/figures/{state}_premium_adjustment.png")
-    plt.close()
+    df = df.sort_values(['state', 'Delta'], ascending=[True, False], kind='stable')
+
+    for state, counties in df.groupby('state', sort=False):
+        counties = counties.set_index('county_name').drop(columns='state').rename_axis(None)
+        counties.to_csv(f"./scripts/pres/statistics/{state}_premium_adjustment.csv")
+
+        # Plot
+        top = counties.nlargest(PLOT_COUNTIES, 'AdjustedPremium', keep='first')
+        plt.figure(figsize=(10,6))
+        sns.barplot(x=top.index, y=top['AdjustedPremium'], palette='viridis')
+        plt.title(f"{state} - Adjusted Premiums by County")
+        plt.xlabel("County")
+        plt.ylabel("Adjusted Premium ($)")
+        plt.xticks(rotation=45, ha='right')
+        plt.tight_layout()
+        plt.savefig(f"./scripts/pres/figures/{state}_premium_adjustment.png")
+        plt.close()
+    return df
 
 # ========== FUNCTION 2: Coverage Restriction Simulation ==========
-def simulate_coverage_restriction(state, county_risk, risk_threshold=0.5):
-    total_counties = len(county_risk)
-    restricted_counties = sum(1 for risk in county_risk.values() if risk > risk_threshold)
-
-    restricted_ratio = restricted_counties / total_counties
-
-    result = {
-        'TotalCounties': total_counties,
-        'RestrictedCounties': restricted_counties,
-        'RestrictedRatio': restricted_ratio
-    }
-
-    with open(f"./scripts/pres/statistics/{state}_coverage_restriction.txt", "w") as f:
-        for k, v in result.items():
-            f.write(f"{k}: {v}\n")
-
-    # Pie Chart
-    plt.figure(figsize=(6,6))
-    plt.pie([restricted_counties, total_counties-restricted_counties],
-            labels=['Restricted', 'Unrestricted'],
-            autopct='%1.1f%%',
-            colors=sns.color_palette('viridis', 2))
-    plt.title(f"{state} - Coverage Restriction Impact")
-    plt.tight_layout()
-    plt.savefig(f"./scripts/pres/figures/{state}_coverage_restriction.png")
-    plt.close()
+def simulate_coverage_restriction(county_risk, risk_threshold=0.5):
+    summary = county_risk.assign(restricted=county_risk['risk'] > risk_threshold).groupby('state').agg(
+        TotalCounties=('restricted', 'size'),
+        RestrictedCounties=('restricted', 'sum'),
+    )
+    summary['RestrictedRatio'] = summary['RestrictedCounties'] / summary['TotalCounties']
+
+    for state, result in summary.iterrows():
+        total_counties, restricted_counties = int(result['TotalCounties']), int(result['RestrictedCounties'])
+        with open(f"./scripts/pres/statistics/{state}_coverage_restriction.txt", "w") as f:
+            f.write(f"TotalCounties: {total_counties}\n")
+            f.write(f"RestrictedCounties: {restricted_counties}\n")
+            f.write(f"RestrictedRatio: {result['RestrictedRatio']}\n")
+
+        # Pie Chart
+        plt.figure(figsize=(6,6))
+        plt.pie([restricted_counties, total_counties-restricted_counties],
+                labels=['Restricted', 'Unrestricted'],
+                autopct='%1.1f%%',
+                colors=sns.color_palette('viridis', 2))
+        plt.title(f"{state} - Coverage Restriction Impact")
+        plt.tight_layout()
+        plt.savefig(f"./scripts/pres/figures/{state}_coverage_restriction.png")
+        plt.close()
+    return summary
 
 # ========== FUNCTION 3: Safety Campaign Simulation ==========
-def simulate_safety_campaign(state, county_risk, risk_low=0.3, risk_high=0.5, expected_reduction_rate=0.1, avg_claim_cost=50000):
-    moderate_risk_counties = [county for county, risk in county_risk.items() if risk_low <= risk <= risk_high]
-    savings = len(moderate_risk_counties) * avg_claim_cost * expected_reduction_rate
-
-    result = {
-        'ModerateRiskCounties': len(moderate_risk_counties),
-        'EstimatedSavings': savings
-    }
-
-    with open(f"./scripts/pres/statistics/{state}_safety_campaign.txt", "w") as f:
-        for k, v in result.items():
-            f.write(f"{k}: {v}\n")
-
-    # Simple bar chart
-    plt.figure(figsize=(6,4))
-    sns.barplot(x=['Savings'], y=[savings], palette='viridis')
-    plt.title(f"{state} - Estimated Savings from Safety Campaign")
-    plt.ylabel("Estimated Savings ($)")
-    plt.tight_layout()
-    plt.savefig(f"./scripts/pres/figures/{state}_safety_campaign.png")
-    plt.close()
+def simulate_safety_campaign(county_risk, risk_low=0.3, risk_high=0.5, expected_reduction_rate=0.1, avg_claim_cost=50000):
+    moderate = county_risk['risk'].between(risk_low, risk_high)
+    summary = moderate.groupby(county_risk['state']).sum().rename('ModerateRiskCounties').to_frame()
+    summary['EstimatedSavings'] = summary['ModerateRiskCounties'] * avg_claim_cost * expected_reduction_rate
+
+    for state, result in summary.iterrows():
+        savings = result['EstimatedSavings']
+        with open(f"./scripts/pres/statistics/{state}_safety_campaign.txt", "w") as f:
+            f.write(f"ModerateRiskCounties: {int(result['ModerateRiskCounties'])}\n")
+            f.write(f"EstimatedSavings: {savings}\n")
+
+        # Simple bar chart
+        plt.figure(figsize=(6,4))
+        sns.barplot(x=['Savings'], y=[savings], palette='viridis')
+        plt.title(f"{state} - Estimated Savings from Safety Campaign")
+        plt.ylabel("Estimated Savings ($)")
+        plt.tight_layout()
+        plt.savefig(f"./scripts/pres/figures/{state}_safety_campaign.png")
+        plt.close()
+    return summary
 
 # ========== MAIN EXECUTION ==========
 if __name__ == "__main__":
-    for state, county_risk in predicted_county_risk.items():
-        simulate_premium_adjustment(state, county_risk)
-        simulate_coverage_restriction(state, county_risk)
-        simulate_safety_campaign(state, county_risk)
+    county_risk = load_county_risk()
+    simulate_premium_adjustment(county_risk)
+    simulate_coverage_restriction(county_risk)
+    simulate_safety_campaign(county_risk)
+
+    # Sensitivity sweep: distribution of every metric over the scenario grid and risk draws
+    run_scenarios(county_risk).to_csv("./scripts/pres/statistics/scenario_summary.csv", index=False)
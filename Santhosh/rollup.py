@@ -0,0 +1,135 @@
+# County x year rollup of each {prefix}_processed table.
+# One row per (year, county, severity, driver sex, driver age band, opioid flag)
+# cell with row counts and driver-age sums, built by merger.py right after the
+# harmonization and refreshed for the same year partitions. The descriptive stats,
+# county-level models and simulations read these cells instead of crash rows.
+# {prefix}_age_rollup keeps exact per-age counts next to it (there are only about
+# a hundred distinct driver ages), so age quartiles stay exact too.
+import time
+import numpy as np
+import pandas as pd
+
+ROLLUP_DIMENSIONS = ['year', 'county_name', 'severity_level', 'driver_sex', 'age_band', 'opioid_flag']
+# Lower bound of each driver-age band; 21 and 65 match the young/mature driver flags
+AGE_BANDS = [0, 16, 21, 25, 35, 45, 55, 65, 75]
+
+AGE_DIMENSIONS = ['year', 'severity_level', 'opioid_flag', 'driver_age']
+
+def rollup_table(prefix):
+    return f"{prefix}_rollup"
+
+def age_rollup_table(prefix):
+    return f"{prefix}_age_rollup"
+
+# ========== SQL BUILD ==========
+def age_band_sql(column='driver_age'):
+    steps = " ".join(f"WHEN {column} < {upper} THEN {lower}" for lower, upper in zip(AGE_BANDS, AGE_BANDS[1:]))
+    return f"CASE WHEN {column} IS NULL THEN NULL {steps} ELSE {AGE_BANDS[-1]} END"
+
+def rollup_select(backend, prefix, where=None):
+    year = backend.year_of('crash_date')
+    band = age_band_sql()
+    return f"""
+    SELECT
+        {year} AS year,
+        county_name,
+        severity_level,
+        driver_sex,
+        {band} AS age_band,
+        opioid_flag,
+        COUNT(*) AS n,
+        COUNT(driver_age) AS age_n,
+        SUM(driver_age) AS age_sum,
+        SUM(driver_age * driver_age) AS age_sq_sum,
+        MIN(driver_age) AS age_min,
+        MAX(driver_age) AS age_max
+    FROM {prefix}_processed
+    {f"WHERE {where}" if where else ""}
+    GROUP BY {year}, county_name, severity_level, driver_sex, {band}, opioid_flag
+    """
+
+def age_rollup_select(backend, prefix, where=None):
+    year = backend.year_of('crash_date')
+    conditions = " AND ".join(["driver_age IS NOT NULL"] + ([where] if where else []))
+    return f"""
+    SELECT
+        {year} AS year,
+        severity_level,
+        opioid_flag,
+        driver_age,
+        COUNT(*) AS n
+    FROM {prefix}_processed
+    WHERE {conditions}
+    GROUP BY {year}, severity_level, opioid_flag, driver_age
+    """
+
+def _refresh_cells(backend, prefix, table, select, years):
+    start = time.perf_counter()
+    if years is None or not backend.table_exists(table):
+        backend.create_table_as(table, select(backend, prefix))
+        print(f"Built {table} in {time.perf_counter() - start:.2f}s")
+        return
+    if not years:
+        return
+    source_year = f"COALESCE({backend.year_of('crash_date')}, 0)"
+    statements = [f"DELETE FROM {table} WHERE COALESCE(year, 0) = {int(y)}" for y in years]
+    statements += [f"INSERT INTO {table} {select(backend, prefix, where=f'{source_year} = {int(y)}')}" for y in years]
+    backend.execute(*statements)
+    print(f"Refreshed {table} years {list(years)} in {time.perf_counter() - start:.2f}s")
+
+def refresh_rollup(backend, prefix, years=None):
+    """Rebuild {prefix}_rollup and {prefix}_age_rollup, or with years only replace those year partitions."""
+    _refresh_cells(backend, prefix, rollup_table(prefix), rollup_select, years)
+    _refresh_cells(backend, prefix, age_rollup_table(prefix), age_rollup_select, years)
+
+# ========== PANDAS BUILD ==========
+def rollup_from_frame(df):
+    """The same cells computed from processed rows (year, county_name, ..., opioid_flag, driver_age)."""
+    age = df['driver_age'].astype(float)
+    bands = pd.cut(age, AGE_BANDS + [np.inf], right=False, labels=AGE_BANDS).astype(float)
+    cells = df.assign(age_band=bands, age_sq=age * age)
+    return cells.groupby(ROLLUP_DIMENSIONS, dropna=False).agg(
+        n=('opioid_flag', 'size'),
+        age_n=('driver_age', 'count'),
+        age_sum=('driver_age', 'sum'),
+        age_sq_sum=('age_sq', 'sum'),
+        age_min=('driver_age', 'min'),
+        age_max=('driver_age', 'max'),
+    ).reset_index()
+
+def age_rollup_from_frame(df):
+    """The {prefix}_age_rollup counts computed from processed rows."""
+    aged = df[df['driver_age'].notna()]
+    return aged.groupby(AGE_DIMENSIONS, dropna=False).size().reset_index(name='n')
+
+# ========== CONSUMER VIEWS ==========
+def county_year_summary(rollup):
+    """The county x year features of county_level_prediction, summed from rollup cells."""
+    cells = rollup.dropna(subset=['county_name', 'year'])
+    n = cells['n'].astype(float)
+    severity = cells['severity_level']
+    known_severity = severity.notna()
+    parts = pd.DataFrame({
+        'county_name': cells['county_name'],
+        'year': cells['year'].astype(int),
+        'total_crashes': n,
+        'opioid_crashes': n * (cells['opioid_flag'] == 1),
+        'age_sum': cells['age_sum'].astype(float).fillna(0),
+        'age_n': cells['age_n'].astype(float),
+        'male': n * (cells['driver_sex'] == 0),
+        'fatal': n * (severity == 1),
+        'serious': n * (severity == 2),
+        'severity_sum': (severity.astype(float) * n).where(known_severity, 0),
+        'severity_n': n.where(known_severity, 0),
+    })
+    sums = parts.groupby(['county_name', 'year']).sum()
+    summary = pd.DataFrame({
+        'total_crashes': sums['total_crashes'].astype(int),
+        'opioid_crashes': sums['opioid_crashes'].astype(int),
+        'avg_driver_age': sums['age_sum'] / sums['age_n'].replace(0, np.nan),
+        'prop_male': sums['male'] / sums['total_crashes'],
+        'fatal_crash_rate': sums['fatal'] / sums['total_crashes'],
+        'serious_injury_rate': sums['serious'] / sums['total_crashes'],
+        'avg_severity_score': sums['severity_sum'] / sums['severity_n'].replace(0, np.nan),
+    })
+    return summary.reset_index()
@@ -0,0 +1,28 @@
+# Runs the descriptive statistics and the driver/county models for every state
+# in one process, so each {prefix}_processed table is fetched once (crash_data.py)
+# and shared by all of them. The county models' scores are then collected into
+# the county risk table that pres/main.py simulates on.
+import time
+from crash_data import load_processed, close_all
+from desc.main import generate_opioid_crash_statistics, plot_yearly_trend, plot_top_counties
+from pred.models import driver_level_prediction, county_level_prediction
+from county_risk import score_county_risk
+
+STATES = ['tn', 'pa', 'sc']
+
+def run_state(prefix):
+    df_opioid = generate_opioid_crash_statistics(prefix)
+    plot_yearly_trend(df_opioid, prefix)
+    plot_top_counties(df_opioid, prefix)
+
+    df = load_processed(prefix)
+    driver_level_prediction(df, prefix)
+    county_level_prediction(df, prefix)
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    for prefix in STATES:
+        run_state(prefix)
+    score_county_risk(STATES)
+    close_all()
+    print(f"Reports for {', '.join(s.upper() for s in STATES)} finished in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,124 @@
+# Monte Carlo scenario engine for the pres/ simulations.
+# Evaluates every combination of (risk_threshold, adjustment_rate,
+# expected_reduction_rate, avg_claim_cost) against n_draws perturbed copies of
+# each state's county risk scores, as array operations:
+#
+#   - each county risk is placed between the sorted thresholds with one searchsorted,
+#     and a bincount + cumsum per draw gives how many counties are at or below every
+#     threshold: (draws x thresholds) count matrices instead of a per-county loop
+#   - every scenario then only indexes those counts and scales them, so the
+#     metrics are (draws x scenarios) arrays summarised along the draw axis
+#
+# Metrics follow pres/main.py: restricted ratio, total premium increase and safety
+# campaign savings, with the campaign's upper bound equal to the surcharge threshold.
+#
+#   python Santhosh/scenarios.py                      # default grid on the county risk table
+#   python Santhosh/scenarios.py --draws 5000 --counties 3200   # synthetic counties, no table
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# Model uncertainty of a county score: normal noise with this sd on the logit scale
+RISK_DRAW_SD = 0.5
+QUANTILES = [0.05, 0.5, 0.95]
+
+DEFAULT_GRID = {
+    'risk_threshold': np.linspace(0.3, 0.7, 9),
+    'adjustment_rate': np.linspace(0.05, 0.25, 5),
+    'expected_reduction_rate': np.linspace(0.05, 0.2, 4),
+    'avg_claim_cost': np.array([25000, 50000, 75000, 100000]),
+}
+
+def scenario_grid(risk_threshold, adjustment_rate, expected_reduction_rate, avg_claim_cost):
+    """Every combination of the parameter values, one row per scenario."""
+    axes = np.meshgrid(risk_threshold, adjustment_rate, expected_reduction_rate, avg_claim_cost, indexing='ij')
+    return pd.DataFrame({name: axis.ravel() for name, axis in zip(DEFAULT_GRID, axes)})
+
+def draw_risk(risk, n_draws, sd=RISK_DRAW_SD, rng=None):
+    """(n_draws, counties) risks, perturbed on the logit scale.
+
+    sd=0 returns the scores unchanged, so the deterministic pres/main.py scenario is reproduced exactly.
+    """
+    risk = np.asarray(risk, dtype=np.float64)
+    if sd == 0:
+        return np.tile(risk, (n_draws, 1))
+    rng = rng or np.random.default_rng(42)
+    p = np.clip(risk, 1e-6, 1 - 1e-6)
+    draws = np.log(p / (1 - p)) + sd * rng.standard_normal((n_draws, len(p)))
+    return 1 / (1 + np.exp(-draws))
+
+def _count_at_most(draws, thresholds):
+    """(n_draws, thresholds) number of counties with risk <= each (sorted) threshold."""
+    n_draws = len(draws)
+    # Index of the first threshold each risk is <= to; len(thresholds) when above all of them
+    slot = np.searchsorted(thresholds, draws, side='left')
+    cells = np.arange(n_draws)[:, None] * (len(thresholds) + 1) + slot
+    counts = np.bincount(cells.ravel(), minlength=n_draws * (len(thresholds) + 1))
+    return counts.reshape(n_draws, -1)[:, :-1].cumsum(axis=1)
+
+def evaluate_state(risk, grid, n_draws=1000, base_premium=1000, risk_low=0.3, sd=RISK_DRAW_SD, rng=None):
+    """{metric: (n_draws, scenarios) array} for one state's county risks."""
+    draws = draw_risk(risk, n_draws, sd, rng)
+    n_counties = draws.shape[1]
+    thresholds, threshold_idx = np.unique(grid['risk_threshold'].to_numpy(), return_inverse=True)
+
+    at_most = _count_at_most(draws, thresholds)
+    below_low = (draws < risk_low).sum(axis=1, keepdims=True)
+    above = (n_counties - at_most)[:, threshold_idx]
+    moderate = np.maximum(at_most - below_low, 0)[:, threshold_idx]
+
+    return {
+        'restricted_ratio': above / n_counties,
+        'premium_increase': above * (base_premium * grid['adjustment_rate'].to_numpy()),
+        'campaign_savings': moderate * (grid['avg_claim_cost'].to_numpy() * grid['expected_reduction_rate'].to_numpy()),
+    }
+
+def summarise(metrics, grid):
+    summary = grid.copy()
+    for name, values in metrics.items():
+        summary[f"{name}_mean"] = values.mean(axis=0)
+        summary[f"{name}_std"] = values.std(axis=0)
+        for q, row in zip(QUANTILES, np.quantile(values, QUANTILES, axis=0)):
+            summary[f"{name}_p{int(q * 100):02d}"] = row
+    return summary
+
+def run_scenarios(county_risk, grid=None, n_draws=1000, base_premium=1000, risk_low=0.3, sd=RISK_DRAW_SD, seed=42):
+    """Distribution summary of every scenario for every state.
+
+    county_risk has one row per state and county with its risk score (as
+    pres/main.load_county_risk returns); grid defaults to DEFAULT_GRID.
+    """
+    grid = grid if grid is not None else scenario_grid(**DEFAULT_GRID)
+    rng = np.random.default_rng(seed)
+    summaries = []
+    for state, counties in county_risk.groupby('state', sort=True):
+        metrics = evaluate_state(counties['risk'].to_numpy(), grid, n_draws, base_premium, risk_low, sd, rng)
+        summaries.append(summarise(metrics, grid).assign(state=state, counties=len(counties)))
+    summary = pd.concat(summaries, ignore_index=True)
+    return summary[['state', 'counties'] + [c for c in summary.columns if c not in ('state', 'counties')]]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep of the pricing / campaign scenarios.")
+    parser.add_argument('--draws', type=int, default=1000)
+    parser.add_argument('--counties', type=int, help="simulate this many synthetic counties instead of the county risk table")
+    parser.add_argument('--output', default='./scripts/pres/statistics/scenario_summary.csv')
+    args = parser.parse_args()
+
+    if args.counties:
+        rng = np.random.default_rng(0)
+        county_risk = pd.DataFrame({'state': 'US', 'county_name': np.arange(args.counties), 'risk': rng.beta(2, 3, args.counties)})
+    else:
+        from county_risk import load_risk_table, latest_year_risk
+        table = load_risk_table()
+        if table is None:
+            raise SystemExit("No county risk table; run county_risk.py first or pass --counties.")
+        county_risk = latest_year_risk(table)
+
+    grid = scenario_grid(**DEFAULT_GRID)
+    start = time.perf_counter()
+    summary = run_scenarios(county_risk, grid, args.draws)
+    seconds = time.perf_counter() - start
+    summary.to_csv(args.output, index=False)
+    print(f"{len(grid):,} scenarios x {args.draws:,} draws over {len(county_risk):,} counties "
+          f"in {summary['state'].nunique()} states: {seconds:.2f}s -> {args.output}")
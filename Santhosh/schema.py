@@ -0,0 +1,83 @@
+import csv
+import pandas as pd
+
+# ========== SCHEMA PROBE CONFIG ==========
+SAMPLE_ROWS = 1000
+
+def _dtype_kind(dtype):
+    # int and float are compatible (an int column picks up NaN in another year)
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'datetime'
+    return 'object'
+
+def _is_integral(values):
+    if pd.api.types.is_bool_dtype(values.dtype) or not pd.api.types.is_numeric_dtype(values.dtype):
+        return False
+    known = values.dropna().astype('float64')
+    return bool((known == known.round()).all())
+
+# ========== HEADER + SAMPLE READERS ==========
+def _probe_delimited(file_path, delimiter, encoding, sample_rows):
+    with open(file_path, 'r', encoding=encoding or 'utf-8-sig', errors='replace', newline='') as f:
+        columns = next(csv.reader(f, delimiter=delimiter), [])
+    sample = pd.read_csv(file_path, delimiter=delimiter, encoding=encoding, nrows=sample_rows, low_memory=False)
+    return columns, sample
+
+def _probe_xlsx(file_path, sample_rows):
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the sheet XML instead of building the whole workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(min_row=1, max_row=sample_rows + 1, values_only=True)
+        header = next(rows, ())
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        sample = pd.DataFrame(list(rows), columns=columns).infer_objects()
+    finally:
+        workbook.close()
+    return columns, sample
+
+def probe_schema(file_path, sample_rows=SAMPLE_ROWS):
+    """Read only the header and the first sample_rows of a dataset file."""
+    if file_path.endswith(".csv"):
+        columns, sample = _probe_delimited(file_path, ',', None, sample_rows)
+    elif file_path.endswith(".xlsx"):
+        columns, sample = _probe_xlsx(file_path, sample_rows)
+    elif file_path.endswith(".txt"):
+        columns, sample = _probe_delimited(file_path, '|', 'ISO-8859-1', sample_rows)
+    else:
+        raise ValueError(f"Unsupported file format for {file_path}")
+    return {
+        'path': file_path,
+        'columns': columns,
+        'dtypes': {col: _dtype_kind(sample[col].dtype) for col in sample.columns},
+        # Numeric columns with only whole numbers in the sample (NaN aside), e.g. CRN
+        'integers': [col for col in sample.columns if _is_integral(sample[col])],
+    }
+
+# ========== CONSISTENCY CHECKS ==========
+def check_schemas(schemas, table_name):
+    """Raise on column mismatches and return the columns whose sampled dtype kind differs between files."""
+    base = schemas[0]
+    for schema in schemas[1:]:
+        if set(schema['columns']) != set(base['columns']):
+            missing = set(base['columns']) - set(schema['columns'])
+            extra = set(schema['columns']) - set(base['columns'])
+            raise ValueError(f"Column mismatch detected in {table_name}: {schema['path']} (missing {sorted(missing)}, extra {sorted(extra)})")
+
+    conflicts = {}
+    for col in base['columns']:
+        kinds = {schema['dtypes'].get(col) for schema in schemas}
+        if len(kinds) > 1:
+            conflicts[col] = sorted(k for k in kinds if k)
+    for col, kinds in conflicts.items():
+        print(f"Dtype mismatch in {table_name}.{col}: {kinds}; it will be read as text.")
+    return conflicts
+
+def merge_read_kwargs(schemas, table_name):
+    """Probe-derived read_csv/read_excel kwargs so every file parses to the same columns and dtypes."""
+    conflicts = check_schemas(schemas, table_name)
+    return {'dtype': {col: str for col in conflicts}} if conflicts else {}
@@ -0,0 +1,111 @@
+# Out-of-core training for the driver-level models.
+# Feature batches are streamed from {prefix}_processed (server-side cursor, or
+# DuckDB record batches) or from a Parquet export, and fitted with learners that
+# support partial_fit, so memory is bounded by the batch size rather than the
+# table size. Each row's train/test side comes from a seeded hash of its crash_id,
+# not from its position in the stream, so every pass sees the same split however
+# the database orders the rows (and all rows of one crash land on the same side).
+#
+#   1. scaler pass: StandardScaler.partial_fit on the training rows
+#   2. STREAM_EPOCHS passes of partial_fit (one for NaiveBayes, whose counts would double)
+#   3. test pass: only y_test / y_pred / y_score are kept (1 + 5 bytes per model per test row)
+import os
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+
+from crash_data import iter_processed
+from feature_store import MISSING_VALUE
+
+STREAM_BATCH_ROWS = int(os.environ.get('CRASH_STREAM_BATCH_ROWS', 250_000))
+STREAM_EPOCHS = int(os.environ.get('CRASH_STREAM_EPOCHS', 3))
+STREAMING_MODELS = ['SGDLogistic', 'NaiveBayes']
+SINGLE_PASS_MODELS = {'NaiveBayes'}
+CLASSES = np.array([0, 1])
+# Stable per-row key the train/test split is hashed from
+SPLIT_KEY = 'crash_id'
+
+def make_streaming_model(name):
+    if name == 'SGDLogistic':
+        # Logistic regression by SGD; averaging the weights damps the drift from year-ordered batches
+        return SGDClassifier(loss='log_loss', alpha=1e-4, average=True, random_state=42)
+    return GaussianNB()
+
+# ========== BATCH SOURCES ==========
+def database_batches(prefix, features, target, batch_rows=STREAM_BATCH_ROWS):
+    return iter_processed(prefix, list(dict.fromkeys(features + [target, SPLIT_KEY])), batch_rows)
+
+def parquet_batches(path, features, target, batch_rows=STREAM_BATCH_ROWS):
+    """Batches of a Parquet file or directory written by merger.export_processed_table."""
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet')
+    # The export has crash_date rather than the derived year column
+    derive_year = 'year' in features and 'year' not in dataset.schema.names
+    columns = [c for c in dict.fromkeys(features + [target, SPLIT_KEY]) if not (derive_year and c == 'year')]
+    if derive_year:
+        columns.append('crash_date')
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_rows):
+        df = batch.to_pandas()
+        if derive_year:
+            df['year'] = pd.to_datetime(df.pop('crash_date'), errors='coerce').dt.year
+        yield df
+
+# ========== STREAMED FIT ==========
+def _xy(batch, features, target):
+    X = batch[features].to_numpy(dtype=np.float32, na_value=np.nan)
+    X[np.isnan(X)] = MISSING_VALUE
+    return X, batch[target].to_numpy(dtype=np.int8)
+
+def _test_rows(keys, test_size, random_state):
+    # hash_pandas_object is deterministic for a given 16-byte key; keys go through str so
+    # an integer crash_id from the database and a text one from a CSV export agree
+    hashes = pd.util.hash_pandas_object(keys.astype(str), index=False, hash_key=f"{random_state:016d}")
+    return hashes.to_numpy() % 1_000_000 < test_size * 1_000_000
+
+def _split_batches(batches, features, target, test_size, random_state):
+    for batch in batches():
+        batch = batch[batch[target].notna()]
+        test = _test_rows(batch[SPLIT_KEY], test_size, random_state)
+        X, y = _xy(batch, features, target)
+        yield X[~test], y[~test], X[test], y[test]
+
+def stream_fit(batches, features, target, model_names=STREAMING_MODELS, epochs=STREAM_EPOCHS, test_size=0.3, random_state=42):
+    """Fit each model over the streamed batches and return {name: (y_test, y_pred, y_score)}.
+
+    batches is a zero-argument callable returning a fresh iterator of DataFrames
+    (e.g. lambda: database_batches('pa', features, target)); it is called once per pass.
+    """
+    def passes():
+        return _split_batches(batches, features, target, test_size, random_state)
+
+    scaler = StandardScaler()
+    for X_train, _, _, _ in passes():
+        if len(X_train):
+            scaler.partial_fit(X_train)
+
+    models = {name: make_streaming_model(name) for name in model_names}
+    shuffle = np.random.default_rng(random_state)
+    for epoch in range(epochs):
+        for X_train, y_train, _, _ in passes():
+            if not len(y_train):
+                continue
+            order = shuffle.permutation(len(y_train))
+            X_train, y_train = scaler.transform(X_train)[order], y_train[order]
+            for name, model in models.items():
+                if epoch == 0 or name not in SINGLE_PASS_MODELS:
+                    model.partial_fit(X_train, y_train, classes=CLASSES)
+
+    y_test, y_pred, y_score = [], {name: [] for name in models}, {name: [] for name in models}
+    for _, _, X_test, y in passes():
+        if not len(y):
+            continue
+        y_test.append(y)
+        X_test = scaler.transform(X_test)
+        for name, model in models.items():
+            y_pred[name].append(model.predict(X_test).astype(np.int8))
+            y_score[name].append(model.predict_proba(X_test)[:, 1].astype(np.float32))
+    y_test = np.concatenate(y_test)
+    return {name: (y_test, np.concatenate(y_pred[name]), np.concatenate(y_score[name])) for name in models}
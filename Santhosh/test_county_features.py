@@ -0,0 +1,44 @@
+# Regression check for county_features.py against the original lambda-based aggregation.
+#
+#   python -m pytest Santhosh/test_county_features.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from county_features import GROUP_KEYS, county_features_bincount, county_features_groupby
+
+def county_features_legacy(df):
+    """The original lambda-based aggregation from county_level_prediction."""
+    return df.groupby(GROUP_KEYS).agg(
+        total_crashes=('opioid_flag', 'count'),
+        opioid_crashes=('opioid_flag', 'sum'),
+        avg_driver_age=('driver_age', 'mean'),
+        prop_male=('driver_sex', lambda x: (x==0).mean()),
+        fatal_crash_rate=('severity_level', lambda x: (x==1).mean()),
+        serious_injury_rate=('severity_level', lambda x: (x==2).mean()),
+        avg_severity_score=('severity_level', 'mean')
+    ).reset_index()
+
+def synthetic_rows(n_rows, n_counties=67, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'year': rng.integers(2013, 2023, n_rows),
+        'county_name': np.array([f"County {i:02d}" for i in range(n_counties)], dtype=object)[rng.integers(0, n_counties, n_rows)],
+        'severity_level': np.where(rng.random(n_rows) < 0.02, np.nan, rng.integers(0, 9, n_rows)),
+        'driver_age': np.where(rng.random(n_rows) < 0.1, np.nan, rng.integers(15, 90, n_rows)),
+        'driver_sex': np.where(rng.random(n_rows) < 0.05, np.nan, rng.integers(0, 2, n_rows)),
+        'opioid_flag': (rng.random(n_rows) < 0.03).astype(int),
+    })
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('method', [county_features_groupby, county_features_bincount])
+def test_matches_legacy(method, seed):
+    df = synthetic_rows(50_000, seed=seed)
+    pd.testing.assert_frame_equal(method(df), county_features_legacy(df), check_dtype=False)
+
+@pytest.mark.parametrize('method', [county_features_groupby, county_features_bincount])
+def test_county_without_ages(method):
+    # A county-year with no known ages gets NaN, not a division error
+    df = synthetic_rows(1_000, n_counties=3)
+    df.loc[df['county_name'] == 'County 00', 'driver_age'] = np.nan
+    pd.testing.assert_frame_equal(method(df), county_features_legacy(df), check_dtype=False)